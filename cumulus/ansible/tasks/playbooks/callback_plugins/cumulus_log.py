@@ -24,8 +24,9 @@ class CallbackModule(CallbackBase):
         super(CallbackModule, self).__init__()
         self.current_task = None
         self.current_play = None
+        # A playbook can generate a large number of records so batch them
         self.logger = get_post_logger('cumulus_log', self.girder_token,
-                                      self.log_write_url)
+                                      self.log_write_url, buffered=True)
 
     @property
     def cluster_id(self):
@@ -110,3 +111,6 @@ class CallbackModule(CallbackBase):
     def playbook_on_stats(self, stats):
         if self.current_play is not None:
             self.log(FINISHED, self.current_play, type='play')
+
+        for handler in self.logger.handlers:
+            handler.flush()
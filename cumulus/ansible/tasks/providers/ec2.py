@@ -17,7 +17,7 @@
 ###############################################################################
 
 from cumulus.constants import VolumeState
-from jsonpath_rw import parse
+from cumulus.common.jsonpath import parse
 import boto3.ec2
 from itertools import groupby
 import json
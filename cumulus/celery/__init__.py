@@ -19,6 +19,8 @@
 
 from __future__ import absolute_import
 from celery import Celery
+from celery.signals import task_postrun
+from cumulus.logging import flush_buffered_handlers
 from cumulus.taskflow.utility import find_taskflow_modules
 from kombu.serialization import register
 import json
@@ -55,6 +57,9 @@ _routes = {
     'cumulus.tasks.job.monitor_jobs': {
         'queue': 'monitor'
     },
+    'cumulus.tasks.job.monitor_cluster_jobs': {
+        'queue': 'monitor'
+    },
     'cumulus.tasks.job.monitor_process': {
         'queue': 'monitor'
     },
@@ -84,3 +89,9 @@ monitor.config_from_object('cumulus.celery.monitorconfig')
 monitor.conf.update(
     CELERY_ROUTES=_routes
 )
+
+
+@task_postrun.connect
+def _flush_log_handlers(**kwargs):
+    # Make sure any buffered log records are sent when a task exits
+    flush_buffered_handlers()
@@ -23,7 +23,7 @@ import collections
 import cumulus
 import logging
 import six
-from cumulus.logging import RESTfulLogHandler
+from cumulus.logging import RESTfulLogHandler, BufferedRESTfulLogHandler
 
 
 def check_status(request):
@@ -56,12 +56,24 @@ def get_cluster_logger(cluster, girder_token):
     return get_post_logger(cluster['_id'], girder_token, cluster_url)
 
 
-def get_post_logger(name, girder_token, post_url):
+def get_post_logger(name, girder_token, post_url, buffered=False):
+    """
+    Get a logger that POSTs its records to post_url.
+
+    :param buffered: If True the records are queued and POSTed in batches
+                     from a background thread, otherwise each record is
+                     POSTed as it is logged.
+    """
     logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
     # Only add new new handler if we don't already have one.
     if not logger.handlers:
-        handler = RESTfulLogHandler(girder_token, post_url, logging.DEBUG)
+        if buffered:
+            handler = BufferedRESTfulLogHandler(girder_token, post_url,
+                                                logging.DEBUG)
+        else:
+            handler = RESTfulLogHandler(girder_token, post_url,
+                                        logging.DEBUG)
         logger.addHandler(handler)
 
     return logger
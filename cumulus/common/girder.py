@@ -20,14 +20,25 @@
 from __future__ import absolute_import
 import datetime
 from bson.objectid import ObjectId, InvalidId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
 
-from girder.api.rest import ModelImporter, RestException, getCurrentUser
-from girder.models.model_base import ValidationException
+from girder.api import access
+from girder.api.describe import Description
+from girder.api.docs import addModel
+from girder.api.rest import ModelImporter, RestException, getCurrentUser, \
+    getBodyJson, loadmodel
+from girder.models.model_base import Model, ValidationException
 from girder.constants import AccessType
 
 import cumulus
 from cumulus.constants import ClusterType
 
+_DUPLICATE_KEY = 11000
+
+# The maximum number of files that can be registered in a single request
+MAX_BULK_FILES = 1000
+
 
 def get_task_token(cluster=None):
     """
@@ -122,3 +133,360 @@ def check_group_membership(user, group):
     if 'groups' not in user or ObjectId(group_id) not in user['groups']:
         raise RestException('The user is not in the required group.',
                             code=403)
+
+
+def _import_key(folder_id, name):
+    return (str(folder_id), name)
+
+
+def _load_import_folders(user, files):
+    """
+    Check the files to import and load the folders they are being imported
+    into.
+
+    :returns Dict of folder id to folder.
+    """
+    folder_model = ModelImporter.model('folder')
+
+    folders = {}
+    for f in files:
+        for field in ('folderId', 'name', 'size', 'path'):
+            if field not in f:
+                raise RestException('Files must include %s.' % field,
+                                    code=400)
+        f['name'] = f['name'].strip()
+        if f['folderId'] not in folders:
+            folders[f['folderId']] = folder_model.load(
+                f['folderId'], user=user, level=AccessType.WRITE, exc=True)
+
+    return folders
+
+
+def _upsert_import_items(user, folders, files, now):
+    """
+    Find the items the files are to be imported into, creating any that don't
+    exist yet.
+
+    :returns Dict of (folder id, name) to item id.
+    """
+    item_model = ModelImporter.model('item')
+
+    # Find the items that already exist in the target folders
+    query = {
+        'folderId': {'$in': [folder['_id'] for folder in folders.values()]},
+        'name': {'$in': list({f['name'] for f in files})}
+    }
+    items = {}
+    for item in item_model.find(query, fields=['folderId', 'name']):
+        items[_import_key(item['folderId'], item['name'])] = item['_id']
+
+    new_items = {}
+    for f in files:
+        key = _import_key(f['folderId'], f['name'])
+        if key in items or key in new_items:
+            continue
+
+        folder = folders[f['folderId']]
+        # validate(...) sets the lowerName and makes sure the name doesn't
+        # clash with a sibling folder.
+        new_items[key] = item_model.validate({
+            'name': f['name'],
+            'description': '',
+            'folderId': folder['_id'],
+            'creatorId': user['_id'],
+            'baseParentType': folder['baseParentType'],
+            'baseParentId': folder['baseParentId'],
+            'created': now,
+            'updated': now,
+            'size': 0,
+            'meta': {}
+        })
+
+    if new_items:
+        # insert_many adds the _id to each document
+        item_model.collection.insert_many(list(new_items.values()))
+        for (key, item) in new_items.items():
+            items[key] = item['_id']
+
+    return items
+
+
+def _upsert_import_files(assetstore, user, items, files, now):
+    """
+    Create the files in their items, existing files with the same name are
+    updated to point to the new path.
+
+    :returns A tuple of a dict of (item id, name) to file id, and a dict of
+             item id to the size added to the item.
+    """
+    file_model = ModelImporter.model('file')
+
+    query = {
+        'itemId': {'$in': list(set(items.values()))},
+        'name': {'$in': list({f['name'] for f in files})}
+    }
+    file_ids = {}
+    for file in file_model.find(query, fields=['itemId', 'name']):
+        file_ids[(file['itemId'], file['name'])] = file['_id']
+
+    new_files = {}
+    updates = []
+    item_sizes = {}
+    for f in files:
+        item_id = items[_import_key(f['folderId'], f['name'])]
+        file_key = (item_id, f['name'])
+
+        if file_key in new_files:
+            continue
+
+        if file_key in file_ids:
+            updates.append(UpdateOne({'_id': file_ids[file_key]}, {
+                '$set': {
+                    'path': f['path'],
+                    'imported': True
+                }
+            }))
+            continue
+
+        size = int(f['size'])
+        new_files[file_key] = file_model.validate({
+            'created': now,
+            'itemId': item_id,
+            'assetstoreId': assetstore['_id'],
+            'creatorId': user['_id'],
+            'name': f['name'],
+            'mimeType': f.get('mimeType'),
+            'size': size,
+            'path': f['path'],
+            'imported': True
+        })
+        item_sizes[item_id] = item_sizes.get(item_id, 0) + size
+
+    if new_files:
+        file_model.collection.insert_many(list(new_files.values()))
+        for (file_key, file) in new_files.items():
+            file_ids[file_key] = file['_id']
+    if updates:
+        file_model.collection.bulk_write(updates, ordered=False)
+
+    return (file_ids, item_sizes)
+
+
+def _propagate_import_sizes(folders, items, files, item_sizes):
+    """
+    Update the sizes of the items files have been added to and propagate the
+    change up to their parents.
+    """
+    if not item_sizes:
+        return
+
+    ModelImporter.model('item').collection.bulk_write([
+        UpdateOne({'_id': item_id}, {'$inc': {'size': size}})
+        for (item_id, size) in item_sizes.items()
+    ], ordered=False)
+
+    item_sizes = dict(item_sizes)
+    folder_sizes = {}
+    for f in files:
+        folder_id = f['folderId']
+        item_id = items[_import_key(folder_id, f['name'])]
+        folder_sizes[folder_id] = folder_sizes.get(folder_id, 0) \
+            + item_sizes.pop(item_id, 0)
+
+    file_model = ModelImporter.model('file')
+    for (folder_id, size) in folder_sizes.items():
+        folder = folders[folder_id]
+        if size:
+            file_model.propagateSizeChange({
+                'folderId': folder['_id'],
+                'baseParentType': folder['baseParentType'],
+                'baseParentId': folder['baseParentId']
+            }, size, updateItemSize=False)
+
+
+def create_imported_files(assetstore, user, files):
+    """
+    Register a batch of files that already exist on a remote assetstore,
+    creating an item for each file. Items and files are written using bulk
+    inserts rather than being saved one at a time. Existing items and files
+    with the same name are reused, so registering the same files again is
+    safe.
+
+    :param assetstore: The assetstore the files are stored in.
+    :param user: The user registering the files.
+    :param files: List of dicts of the form {folderId, name, size, path,
+                  mimeType}.
+    :returns A list of {itemId, fileId} in the same order as files.
+    """
+    if not isinstance(files, list):
+        raise RestException('A list of files must be provided.', code=400)
+
+    if len(files) > MAX_BULK_FILES:
+        raise RestException('At most %d files can be registered at once.'
+                            % MAX_BULK_FILES, code=400)
+
+    now = datetime.datetime.utcnow()
+    folders = _load_import_folders(user, files)
+    items = _upsert_import_items(user, folders, files, now)
+    (file_ids, item_sizes) = _upsert_import_files(assetstore, user, items,
+                                                  files, now)
+    _propagate_import_sizes(folders, items, files, item_sizes)
+
+    results = []
+    for f in files:
+        item_id = items[_import_key(f['folderId'], f['name'])]
+        results.append({
+            'itemId': item_id,
+            'fileId': file_ids[(item_id, f['name'])]
+        })
+
+    return results
+
+
+_create_files_params = {
+    'id': 'CreateFilesParams',
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'required': ['folderId', 'name', 'size', 'path'],
+        'properties': {
+            'folderId': {'type': 'string',
+                         'description': 'The folder to create the item in.'},
+            'name': {'type': 'string',
+                     'description': 'The name of the item and file.'},
+            'size': {'type': 'number',
+                     'description': 'The size of the file.'},
+            'path': {'type': 'string',
+                     'description': 'The full path to the file.'},
+            'mimeType': {'type': 'string',
+                         'description': 'The mimeType of the file.'}
+        }
+    }
+}
+
+
+@access.user
+@loadmodel(model='assetstore')
+def create_files(assetstore, params):
+    files = getBodyJson()
+    user = getCurrentUser()
+
+    return create_imported_files(assetstore, user, files)
+
+
+create_files.description = (
+    Description('Create a batch of items and files in this assetstore, '
+                'returns the ids of the items and files created.')
+    .param('id', 'The the assetstore to create the files in',
+           required=True, paramType='path')
+    .param('body', 'The list of files to create.', required=True,
+           paramType='body', dataType='CreateFilesParams'))
+
+
+def add_create_files_route(resource, docs_resource):
+    """
+    Add the route used to register a batch of files to an assetstore's REST
+    resource.
+
+    :param resource: The assetstore resource.
+    :param docs_resource: The resource to document the parameters under.
+    """
+    addModel('CreateFilesParams', _create_files_params, docs_resource)
+    resource.route('POST', (':id', 'files', 'bulk'), create_files)
+
+
+class LogModel(Model):
+    """
+    Stores the log records of jobs, clusters, volumes, taskflows and tasks.
+    Each record is a separate document keyed by the type and id of the
+    resource it belongs to and a sequence number, rather than being pushed
+    onto an ever growing array in the resource document itself.
+    """
+
+    def initialize(self):
+        self.name = 'logs'
+        self.ensureIndices([
+            ([('resourceType', ASCENDING), ('resourceId', ASCENDING),
+              ('seq', ASCENDING)], {'unique': True})
+        ])
+
+    def validate(self, doc):
+        return doc
+
+    def _query(self, resource_type, resource_id):
+        return {
+            'resourceType': resource_type,
+            'resourceId': ObjectId(resource_id)
+        }
+
+    def append(self, resource_type, resource_id, record):
+        """
+        Append a record to a resource's log.
+
+        :param resource_type: The type of the resource, 'job', 'cluster' etc.
+        :param resource_id: The id of the resource.
+        :param record: The log record.
+        """
+        self.extend(resource_type, resource_id, [record])
+
+    def extend(self, resource_type, resource_id, records):
+        """
+        Append a list of records to a resource's log, using a single insert.
+
+        :param resource_type: The type of the resource, 'job', 'cluster' etc.
+        :param resource_id: The id of the resource.
+        :param records: The log records.
+        """
+        query = self._query(resource_type, resource_id)
+
+        while records:
+            last = self.findOne(query, fields=['seq'],
+                                sort=[('seq', DESCENDING)])
+            seq = last['seq'] + 1 if last else 0
+            docs = [dict(query, seq=seq + i, record=record)
+                    for (i, record) in enumerate(records)]
+
+            try:
+                self.collection.insert_many(docs, ordered=True)
+                records = []
+            except BulkWriteError as ex:
+                errors = ex.details.get('writeErrors', [])
+                if any(error['code'] != _DUPLICATE_KEY for error in errors):
+                    raise
+
+                # Records were appended concurrently, retry the ones that
+                # were not inserted with the next sequence numbers.
+                records = records[ex.details['nInserted']:]
+
+    def records(self, resource_type, resource_id, offset=0, limit=0):
+        """
+        Get the records in a resource's log.
+
+        :param resource_type: The type of the resource, 'job', 'cluster' etc.
+        :param resource_id: The id of the resource.
+        :param offset: The sequence number to start at.
+        :param limit: The maximum number of records to return, 0 for no limit.
+        :returns The list of records ordered by sequence number.
+        """
+        query = self._query(resource_type, resource_id)
+        query['seq'] = {
+            '$gte': offset
+        }
+
+        cursor = self.find(query, limit=limit, fields=['record'],
+                           sort=[('seq', ASCENDING)])
+
+        return [doc['record'] for doc in cursor]
+
+    def remove_records(self, resource_type, *resource_ids):
+        """
+        Remove all the records in the logs of one or more resources.
+        """
+        query = {
+            'resourceType': resource_type,
+            'resourceId': {
+                '$in': [ObjectId(id) for id in resource_ids]
+            }
+        }
+
+        self.collection.delete_many(query)
@@ -1,4 +1,63 @@
-from jsonpath_rw import parse
+import collections
+import re
+
+from jsonpath_rw import parse as _parse
+
+# Plain dotted paths, such as 'config.ssh.user', can be looked up directly
+# without going through the jsonpath parser.
+_dotted_path = re.compile(r'^[A-Za-z_]\w*(\.[A-Za-z_]\w*)*$')
+
+# The maximum number of compiled expressions to keep
+_max_cache_size = 1024
+_cache = {}
+
+Match = collections.namedtuple('Match', ['value'])
+
+
+class DottedPath(object):
+    """
+    A compiled plain dotted path. find(...) returns the same matches as the
+    equivalent jsonpath expression, without the overhead of walking a parse
+    tree.
+    """
+
+    def __init__(self, path):
+        self._keys = path.split('.')
+
+    def find(self, doc):
+        value = doc
+        for key in self._keys:
+            try:
+                value = value[key]
+            except (KeyError, TypeError, AttributeError):
+                return []
+
+        return [Match(value)]
+
+
+def parse(path):
+    """
+    Drop in replacement for jsonpath_rw.parse(...) that caches the compiled
+    expression, so constant paths are only parsed once. Plain dotted paths
+    are compiled into a DottedPath.
+
+    :param path: The jsonpath expression.
+    :returns The compiled expression, call find(doc) on it to get the matches.
+    """
+    expr = _cache.get(path)
+    if expr is None:
+        if _dotted_path.match(path):
+            expr = DottedPath(path)
+        else:
+            expr = _parse(path)
+
+        # Paths are nearly always constants, this just stops the cache growing
+        # without bound if they aren't.
+        if len(_cache) >= _max_cache_size:
+            _cache.clear()
+        _cache[path] = expr
+
+    return expr
 
 
 def get_property(path, doc, default=None):
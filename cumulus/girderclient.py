@@ -18,26 +18,59 @@
 ###############################################################################
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests_toolbelt import MultipartEncoder
 import os
 import json
 import argparse
 import sys
-import zipfile
-import tempfile
-import shutil
 import errno
 import time
 import re
+import shutil
+import threading
+from multiprocessing.pool import ThreadPool
 
 max_chunk_size = 1024 * 1024 * 64
+default_concurrency = 4
+download_chunk_size = 1024 * 1024
+default_cache_size = 1024 * 1024 * 1024 * 50
+default_retries = 3
 
 
 class GirderBase(object):
+    """
+    :param concurrency: The number of requests that will be made at the same
+                        time, used to size the session's connection pool.
+    """
 
-    def __init__(self, girder_token):
+    def __init__(self, girder_token, concurrency=1):
         self._girder_token = girder_token
         self._headers = {'Girder-Token': self._girder_token}
+        self._concurrency = max(1, concurrency)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=self._concurrency)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def _map(self, func, args):
+        """
+        Call func for each of args using a pool of concurrency threads.
+        """
+        if self._concurrency == 1 or len(args) < 2:
+            for arg in args:
+                func(arg)
+            return
+
+        pool = ThreadPool(min(self._concurrency, len(args)))
+        try:
+            # Iterate to raise the first error
+            for _ in pool.imap_unordered(func, args):
+                pass
+        finally:
+            pool.terminate()
+            pool.join()
 
     def check_status(self, request):
         if request.status_code != 200:
@@ -47,30 +80,48 @@ class GirderBase(object):
 
 
 class DirectoryUploader(GirderBase):
-
-    def __init__(self, girder_token, base_url, job_id):
+    """
+    Uploads the output of a job. Files are uploaded concurrently by a pool of
+    worker threads sharing a single keep-alive session. The chunks of a
+    single file have to be sent in order, so a failed chunk is retried from
+    the offset the server has received up to.
+
+    :param concurrency: The number of files to upload at the same time.
+    :param chunk_size: The maximum size of each chunk in bytes.
+    :param retries: The number of times to retry a failed chunk.
+    """
+
+    def __init__(self, girder_token, base_url, job_id,
+                 concurrency=default_concurrency, chunk_size=max_chunk_size,
+                 retries=default_retries):
         self._dir = dir
         self._base_url = base_url
         self._job_id = job_id
-        super(DirectoryUploader, self).__init__(girder_token)
+        self._chunk_size = chunk_size
+        self._retries = retries
+        super(DirectoryUploader, self).__init__(girder_token, concurrency)
 
     def run(self):
         job_url = '%s/jobs/%s' % (self._base_url, self._job_id)
 
-        r = requests.get(job_url, headers=self._headers)
+        r = self._session.get(job_url, headers=self._headers)
         self.check_status(r)
 
         job = r.json()
 
         start = time.time()
 
+        files = []
         for i in job['output']:
 
             if 'itemId' in i and 'path' in i:
                 item_id = i['itemId']
                 path_spec = i['path']
                 exclude_regex = i.get('exclude', None)
-                self._upload(item_id, path_spec, exclude_regex=exclude_regex)
+                files += self._files(item_id, path_spec,
+                                     exclude_regex=exclude_regex)
+
+        self._upload(files)
 
         end = time.time()
 
@@ -82,7 +133,30 @@ class DirectoryUploader(GirderBase):
             }
         }
 
-        r = requests.patch(job_url, json=updates, headers=self._headers)
+        r = self._session.patch(job_url, json=updates, headers=self._headers)
+        self.check_status(r)
+
+    def _upload_offset(self, upload_id):
+        r = self._session.get('%s/file/offset' % self._base_url,
+                              params={'uploadId': upload_id},
+                              headers=self._headers)
+        self.check_status(r)
+
+        return r.json()['offset']
+
+    def _upload_chunk(self, name, upload_id, offset, part):
+        m = MultipartEncoder(
+            fields=[('uploadId',  upload_id),
+                    ('offset', str(offset)),
+                    ('chunk', (name, part, 'application/octet-stream'))]
+
+        )
+
+        headers = self._headers.copy()
+        headers['Content-Type'] = m.content_type
+
+        r = self._session.post('%s/file/chunk' % self._base_url,
+                               data=m, headers=headers)
         self.check_status(r)
 
     def _upload_file(self, name, path, parent_id):
@@ -95,7 +169,7 @@ class DirectoryUploader(GirderBase):
             'size': datalen
         }
 
-        r = requests.post(
+        r = self._session.post(
             '%s/file' % self._base_url, params=params, headers=self._headers)
         self.check_status(r)
         obj = r.json()
@@ -106,33 +180,35 @@ class DirectoryUploader(GirderBase):
             raise Exception('Unexpected response: ' + json.dumps(obj))
 
         uploaded = 0
+        failures = 0
 
         with open(path, 'rb') as fp:
             while (uploaded != datalen):
 
-                chunk_size = datalen - uploaded
-                if chunk_size > max_chunk_size:
-                    chunk_size = max_chunk_size
-
+                chunk_size = min(datalen - uploaded, self._chunk_size)
                 part = fp.read(chunk_size)
 
-                m = MultipartEncoder(
-                    fields=[('uploadId',  upload_id),
-                            ('offset', str(uploaded)),
-                            ('chunk', (name, part, 'application/octet-stream'))]
-
-                )
-
-                headers = self._headers.copy()
-                headers['Content-Type'] = m.content_type
-
-                r = requests.post('%s/file/chunk' % self._base_url,
-                                  params=params, data=m, headers=headers)
-                self.check_status(r)
-
-                uploaded += chunk_size
-
-    def _upload(self, parent_id, path, exclude_regex=None):
+                try:
+                    self._upload_chunk(name, upload_id, uploaded, part)
+                    uploaded += chunk_size
+                except Exception:
+                    failures += 1
+                    if failures > self._retries:
+                        raise
+
+                    # Carry on from where the server got up to
+                    time.sleep(failures)
+                    uploaded = self._upload_offset(upload_id)
+                    fp.seek(uploaded)
+
+    def _upload_file_args(self, args):
+        self._upload_file(*args)
+
+    def _files(self, parent_id, path, exclude_regex=None):
+        """
+        Returns a list of (name, path, parent_id) for the files to upload.
+        """
+        files = []
         if os.path.isdir(path):
             for root, _, file_list in os.walk(path):
                 for filename in file_list:
@@ -145,19 +221,146 @@ class DirectoryUploader(GirderBase):
                     if exclude_regex and re.compile(exclude_regex).match(name):
                         continue
 
-                    self._upload_file(name, file_path, parent_id)
+                    files.append((name, file_path, parent_id))
+        else:
+            files.append((path, path, parent_id))
+
+        return files
+
+    def _upload(self, files):
+        self._map(self._upload_file_args, files)
+
+
+class InputCache(object):
+    """
+    A cache of downloaded Girder files shared by all the jobs run on a
+    cluster. Files are keyed by their id and content hash and are hard linked
+    into a job's directory, so inputs that haven't changed are only
+    downloaded once. Once the cache grows beyond max_size the least recently
+    used files are removed.
+
+    :param path: The cache directory.
+    :param max_size: The maximum size of the cache in bytes.
+    """
+
+    def __init__(self, path, max_size=default_cache_size):
+        self._path = path
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        try:
+            os.makedirs(path)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+
+    def _key(self, file):
+        # Fallback to the size and modification time if we don't have a hash
+        if 'sha512' in file:
+            version = file['sha512']
         else:
-            self._upload_file(path, path, parent_id)
+            version = '%s-%s' % (file['size'],
+                                 file.get('updated', file.get('created')))
+
+        return '%s-%s' % (file['_id'], re.sub(r'[^\w.-]', '_', version))
+
+    def _link(self, cache_path, dest_path):
+        if os.path.lexists(dest_path):
+            os.remove(dest_path)
+
+        try:
+            os.link(cache_path, dest_path)
+        except OSError:
+            # Most likely on another file system, so fallback to a copy
+            shutil.copyfile(cache_path, dest_path)
+
+    def fetch(self, file, dest_path, download):
+        """
+        Place a Girder file at dest_path, using the cached copy if we have
+        one.
+
+        :param file: The Girder file document.
+        :param dest_path: Where to place the file.
+        :param download: Function that will download the file to the path
+                         passed to it.
+        """
+        cache_path = os.path.join(self._path, self._key(file))
+
+        hit = os.path.exists(cache_path)
+        if hit:
+            # Mark as recently used
+            os.utime(cache_path, None)
+        else:
+            # Download to a temporary name so other jobs never see a partial
+            # file.
+            tmp_path = '%s.%d.%d.tmp' % (cache_path, os.getpid(),
+                                         threading.current_thread().ident)
+            try:
+                download(tmp_path)
+                # Make read only so a job can't modify the cached copy
+                # through its link.
+                os.chmod(tmp_path, 0o444)
+                os.rename(tmp_path, cache_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        self._link(cache_path, dest_path)
+
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def evict(self):
+        """
+        Remove the least recently used files until the cache is within its
+        maximum size.
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self._path):
+            if name.endswith('.tmp'):
+                continue
+
+            path = os.path.join(self._path, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        for (_, size, path) in sorted(entries):
+            if total <= self._max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
 
 
 class JobInputDownloader(GirderBase):
+    """
+    Downloads the input of a job. Files are streamed straight to their
+    destination and independent items are downloaded concurrently.
 
-    def __init__(self, girder_token, base_url, job_id, dest):
+    :param concurrency: The number of items to download at the same time.
+    :param cache: An optional InputCache to fetch the files through.
+    """
+
+    def __init__(self, girder_token, base_url, job_id, dest,
+                 concurrency=default_concurrency, cache=None):
         self._girder_token = girder_token
         self._base_url = base_url
         self._job_id = job_id
         self._dest = dest
-        super(JobInputDownloader, self).__init__(girder_token)
+        self._cache = cache
+        super(JobInputDownloader, self).__init__(girder_token, concurrency)
 
     def _mkdir(self, path):
         try:
@@ -168,77 +371,57 @@ class JobInputDownloader(GirderBase):
             else:
                 raise
 
+    def _stream_to_file(self, url, dest_path):
+        r = self._session.get(url, headers=self._headers, stream=True)
+        try:
+            self.check_status(r)
+            self._mkdir(os.path.dirname(dest_path))
+            with open(dest_path, 'wb') as fp:
+                for chunk in r.iter_content(chunk_size=download_chunk_size):
+                    if chunk:
+                        fp.write(chunk)
+        finally:
+            r.close()
+
     def _download_item(self, item_id, target_path):
 
         item_files_url = '%s/item/%s/files' % (self._base_url, item_id)
-        r = requests.get(item_files_url, headers=self._headers)
+        r = self._session.get(item_files_url, headers=self._headers,
+                              params={'limit': 0})
         self.check_status(r)
 
         files = r.json()
 
-        if len(files) == 1:
-            item_url = '%s/item/%s/download' % (self._base_url, item_id)
-            r = requests.get(item_url, headers=self._headers)
-            self.check_status(r)
-            dest_path = os.path.join(self._dest, target_path, files[0]['name'])
+        for f in files:
+            self._download_file(f, os.path.join(self._dest, target_path,
+                                                f['name']))
+
+    def _download_file(self, file, dest_path):
+        file_url = '%s/file/%s/download' % (self._base_url, file['_id'])
 
+        if self._cache:
             self._mkdir(os.path.dirname(dest_path))
-            with open(dest_path, 'w') as fp:
-                fp.write(r.content)
-        elif len(files) > 1:
-            # Download the item in zip format
-            item_url = '%s/item/%s/download' % (self._base_url, item_id)
-            r = requests.get(item_url, headers=self._headers, stream=True)
-            self.check_status(r)
-            with tempfile.NamedTemporaryFile(suffix='.zip') as fp:
-                for chunk in r.iter_content(chunk_size=1024):
-                    if chunk:
-                        fp.write(chunk)
+            self._cache.fetch(file, dest_path,
+                              lambda path: self._stream_to_file(file_url,
+                                                                path))
+        else:
+            self._stream_to_file(file_url, dest_path)
 
-                fp.flush()
-                with zipfile.ZipFile(fp.name, 'r') as files:
-                    dest_path = os.path.join(self._dest, target_path)
-
-                    temp_dir = None
-                    try:
-                        temp_dir = tempfile.mkdtemp()
-                        files.extractall(temp_dir)
-                        item_dir = os.listdir(temp_dir)
-
-                        if len(item_dir) != 1:
-                            raise Exception(
-                                'Expecting single item directory, got: %s'
-                                % len(item_dir))
-
-                        item_dir = os.path.join(temp_dir, item_dir[0])
-                        if not item_dir.endswith('/'):
-                            item_dir += '/'
-
-                        for dir, subdirs, files in os.walk(item_dir):
-                            for f in files:
-                                src = os.path.join(item_dir, dir, f)
-                                dest = os.path.join(
-                                    dest_path, dir.replace(item_dir, ''), f)
-                                self._mkdir(os.path.dirname(dest))
-                                shutil.copy(src, dest)
-                    finally:
-                        if os.path.exists(temp_dir):
-                            shutil.rmtree(temp_dir)
+    def _download_item_args(self, args):
+        self._download_item(*args)
 
     def run(self):
         job_url = '%s/jobs/%s' % (self._base_url, self._job_id)
 
-        r = requests.get(job_url, headers=self._headers)
+        r = self._session.get(job_url, headers=self._headers)
         self.check_status(r)
 
         job = r.json()
 
         start = time.time()
 
-        for i in job['input']:
-            item_id = i['itemId']
-            target_path = i['path']
-            self._download_item(item_id, target_path)
+        items = [(i['itemId'], i['path']) for i in job['input']]
+        self._map(self._download_item_args, items)
 
         end = time.time()
 
@@ -250,7 +433,12 @@ class JobInputDownloader(GirderBase):
             }
         }
 
-        r = requests.patch(job_url, json=updates, headers=self._headers)
+        if self._cache:
+            updates['timings']['inputCacheHits'] = self._cache.hits
+            updates['timings']['inputCacheMisses'] = self._cache.misses
+            self._cache.evict()
+
+        r = self._session.patch(job_url, json=updates, headers=self._headers)
         self.check_status(r)
 
 
@@ -271,6 +459,12 @@ def main():
         'upload', help='Upload paths to girder items')
     upload_parser.add_argument(
         '--job', help='The job to upload output for', required=True)
+    upload_parser.add_argument(
+        '--concurrency', help='The number of files to upload at once',
+        type=int, default=default_concurrency)
+    upload_parser.add_argument(
+        '--chunk-size', help='The maximum chunk size in bytes', type=int,
+        default=max_chunk_size)
 
     # Download
     download_parser = subparsers.add_parser(
@@ -279,14 +473,30 @@ def main():
         '--job', help='The job to download input for', required=True)
     download_parser.add_argument(
         '--dir', help='The target directory', required=True)
+    download_parser.add_argument(
+        '--concurrency', help='The number of items to download at once',
+        type=int, default=default_concurrency)
+    download_parser.add_argument(
+        '--cache-dir', help='Directory to cache input files in')
+    download_parser.add_argument(
+        '--cache-size', help='The maximum size of the cache in bytes',
+        type=int, default=default_cache_size)
 
     config = parser.parse_args()
 
     if config.action == 'upload':
-        DirectoryUploader(config.token, config.url, config.job).run()
+        DirectoryUploader(config.token, config.url, config.job,
+                          concurrency=config.concurrency,
+                          chunk_size=config.chunk_size).run()
     elif config.action == 'download':
+        cache = None
+        if config.cache_dir:
+            # The path is quoted, so it isn't expanded by the shell
+            cache = InputCache(os.path.expanduser(config.cache_dir),
+                               config.cache_size)
         JobInputDownloader(
-            config.token, config.url, config.job, config.dir).run()
+            config.token, config.url, config.job, config.dir,
+            concurrency=config.concurrency, cache=cache).run()
 
 
 if __name__ == '__main__':
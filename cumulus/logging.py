@@ -18,12 +18,17 @@
 ###############################################################################
 
 from __future__ import absolute_import
+import collections
 import logging
+import os
 import sys
+import threading
+import weakref
 import requests
 import json
 import traceback
 import types
+import six
 
 
 class LogRecordEncoder(json.JSONEncoder):
@@ -53,3 +58,140 @@ class RESTfulLogHandler(logging.Handler):
             traceback.print_stack()
             if r:
                 print >> sys.stderr, 'Unable to POST log record: %s' % r.content
+
+
+# The buffered handlers created in this process, so they can be flushed when a
+# task exits.
+_buffered_handlers = weakref.WeakSet()
+
+
+def flush_buffered_handlers():
+    """
+    Flush any records held by the buffered handlers in this process.
+    """
+    for handler in list(_buffered_handlers):
+        handler.flush()
+
+
+class BufferedRESTfulLogHandler(RESTfulLogHandler):
+    """
+    A RESTfulLogHandler that queues records in memory and POSTs them as a
+    list from a background thread, either once capacity records are queued or
+    every flush_interval seconds. If the server can't be reached the records
+    are kept, but at most max_records are held, once this is reached the
+    oldest records are dropped.
+
+    :param capacity: The number of records to send in a single request.
+    :param flush_interval: The maximum number of seconds a record is held
+                           before being sent.
+    :param max_records: The maximum number of records to hold.
+    """
+
+    def __init__(self, girder_token, url, level=logging.NOTSET, capacity=100,
+                 flush_interval=1.0, max_records=10000):
+        super(BufferedRESTfulLogHandler, self).__init__(girder_token, url,
+                                                        level)
+        self._capacity = capacity
+        self._flush_interval = flush_interval
+        self._records = collections.deque(maxlen=max_records)
+        self._dropped = 0
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+        _buffered_handlers.add(self)
+
+    def _ensure_thread(self):
+        # The thread doesn't survive a fork so start one per process.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        sent = True
+        while True:
+            with self._condition:
+                # If the last send failed wait before trying again, even if
+                # the buffer is full.
+                if not self._closed and \
+                   (not sent or len(self._records) < self._capacity):
+                    self._condition.wait(self._flush_interval)
+
+                if self._closed:
+                    return
+
+            sent = self._send()
+
+    def _queue(self, records, front=False):
+        with self._condition:
+            available = self._records.maxlen - len(self._records)
+            if len(records) > available:
+                self._dropped += len(records) - available
+
+            if front:
+                # Records that failed to send, keep the newest ones.
+                records = records[-self._records.maxlen:]
+                self._records = collections.deque(
+                    records + list(self._records), self._records.maxlen)
+            else:
+                self._records.extend(records)
+
+            if len(self._records) >= self._capacity:
+                self._condition.notify()
+
+    def emit(self, record):
+        try:
+            json_str = json.dumps(record.__dict__, cls=LogRecordEncoder)
+        except Exception:
+            self.handleError(record)
+            return
+
+        self._queue([json.loads(json_str)])
+        self._ensure_thread()
+
+    def _send(self):
+        """
+        Send the queued records.
+
+        :returns False if they could not be sent.
+        """
+        with self._flush_lock:
+            while True:
+                with self._condition:
+                    batch = [self._records.popleft() for _ in
+                             range(min(self._capacity, len(self._records)))]
+                    dropped = self._dropped
+                    self._dropped = 0
+
+                if dropped:
+                    six.print_('Dropped %d log records' % dropped,
+                               file=sys.stderr)
+
+                if not batch:
+                    return True
+
+                try:
+                    r = requests.post(self._url, headers=self._headers,
+                                      json=batch)
+                    r.raise_for_status()
+                except Exception as ex:
+                    six.print_('Unable to POST log records: %s' % ex,
+                               file=sys.stderr)
+                    self._queue(batch, front=True)
+                    return False
+
+    def flush(self):
+        self._send()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+        self.flush()
+        _buffered_handlers.discard(self)
+        super(BufferedRESTfulLogHandler, self).close()
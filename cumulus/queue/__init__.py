@@ -17,7 +17,7 @@
 #  limitations under the License.
 ###############################################################################
 
-from jsonpath_rw import parse
+from cumulus.common.jsonpath import parse
 
 from . import sge
 from . import pbs
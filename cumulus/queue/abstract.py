@@ -17,14 +17,151 @@
 #  limitations under the License.
 ###############################################################################
 
+import re
+
+from cumulus.constants import JobQueueState
+from cumulus.constants import JobState
+
+# The field of a job holding the parameter sets of an array job
+PARAMETER_SETS = 'parameterSets'
+# The field of an array job holding the number of tasks in each state
+TASK_STATES = 'taskStates'
+
+
+def is_array_job(job):
+    """
+    :returns True if the job is an array job, with a task per parameter set.
+    """
+    return bool(job.get(PARAMETER_SETS))
+
+
+def array_task_count(spec):
+    """
+    Returns the number of tasks in a task range output by a scheduler, for
+    example '4', '1-10:2' ( SGE ) or '[1,3-5%2]' ( SLURM ).
+    """
+    count = 0
+    # Strip the brackets and any limit on the number of concurrent tasks
+    spec = spec.strip('[]').split('%')[0]
+    for part in spec.split(','):
+        m = re.match('^(\\d+)(?:-(\\d+)(?::(\\d+))?)?$', part)
+        if not m:
+            continue
+        start = int(m.group(1))
+        end = int(m.group(2) or start)
+        step = int(m.group(3) or 1)
+        count += (end - start) // step + 1
+
+    return count
+
 
 class AbstractQueueAdapter(object):
     QUEUE_JOB_ID = 'queueJobId'
 
+    # The environment variable that holds the index ( starting at 1 ) of the
+    # task being run in an array job.
+    ARRAY_TASK_ID = None
+
+    # The native scheduler states, lower case
+    RUNNING_STATE = []
+    ERROR_STATE = []
+    COMPLETE_STATE = []
+    QUEUED_STATE = []
+
     def __init__(self, cluster, cluster_connection):
         self._cluster = cluster
         self._cluster_connection = cluster_connection
 
+    def _queue_state(self, native_state):
+        """
+        Map a native scheduler state to a JobQueueState, None is returned if
+        the state is unknown.
+        """
+        state = None
+        if native_state in self.RUNNING_STATE:
+            state = JobQueueState.RUNNING
+        elif native_state in self.ERROR_STATE:
+            state = JobQueueState.ERROR
+        elif native_state in self.QUEUED_STATE:
+            state = JobQueueState.QUEUED
+        elif native_state in self.COMPLETE_STATE:
+            state = JobQueueState.COMPLETE
+
+        return state
+
+    def _current_state(self, job):
+        """
+        The JobQueueState matching the job's current status. This is used when
+        the scheduler reports a native state we don't recognise, so the job
+        stays where it is rather than being treated as complete.
+        """
+        if job.get('status') == JobState.RUNNING:
+            return JobQueueState.RUNNING
+
+        return JobQueueState.QUEUED
+
+    def _array_job_state(self, job, task_states):
+        """
+        Work out the state of an array job from the state of its tasks. The
+        number of tasks in each state is recorded in the job's taskStates,
+        tasks no longer listed by the scheduler are counted as complete.
+
+        :param job: The array job.
+        :param task_states: List of (number of tasks, native state) tuples for
+                            the tasks listed by the scheduler.
+        :returns The JobQueueState of the job as a whole.
+        """
+        counts = {
+            JobQueueState.QUEUED: 0,
+            JobQueueState.RUNNING: 0,
+            JobQueueState.ERROR: 0,
+            JobQueueState.COMPLETE: 0
+        }
+        listed = 0
+        for (count, native_state) in task_states:
+            listed += count
+            state = self._queue_state(native_state) \
+                or self._current_state(job)
+            counts[state] += count
+
+        counts[JobQueueState.COMPLETE] \
+            += max(len(job[PARAMETER_SETS]) - listed, 0)
+        job[TASK_STATES] = counts
+
+        for state in [JobQueueState.RUNNING, JobQueueState.QUEUED,
+                      JobQueueState.ERROR]:
+            if counts[state] > 0:
+                return state
+
+        return JobQueueState.COMPLETE
+
+    def _job_states(self, jobs, native_states):
+        """
+        Look up the state of each job in the states parsed from a single
+        scheduler query.
+
+        :param jobs: The jobs to get the state of.
+        :param native_states: Dict mapping the native job id to a list of
+                              (number of tasks, native state) tuples, plain
+                              jobs have a single entry.
+        :returns List of (job, JobQueueState) tuples.
+        """
+        states = []
+        for job in jobs:
+            task_states = native_states.get(
+                str(job[AbstractQueueAdapter.QUEUE_JOB_ID]), [])
+            if is_array_job(job):
+                state = self._array_job_state(job, task_states)
+            elif task_states:
+                state = self._queue_state(task_states[0][1]) \
+                    or self._current_state(job)
+            else:
+                state = None
+
+            states.append((job, state))
+
+        return states
+
     def submit_job(self, job, job_script):
         raise NotImplementedError('Subclasses should implement this')
 
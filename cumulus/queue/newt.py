@@ -20,7 +20,7 @@
 import os
 import sys
 
-from jsonpath_rw import parse
+from cumulus.common.jsonpath import parse
 import requests
 
 from cumulus.queue.slurm import SlurmQueueAdapter
@@ -1,19 +1,28 @@
+import json
 import re
-from cumulus.queue.abstract import AbstractQueueAdapter
-from cumulus.constants import JobQueueState
+
+import six
+
+from cumulus.queue.abstract import AbstractQueueAdapter, is_array_job
 
 
 class PbsQueueAdapter(AbstractQueueAdapter):
     # Running states
     RUNNING_STATE = ['r']
 
-    ERROR_STATE = ['e']
+    # 'failed' is used for a finished job with a non-zero exit status
+    ERROR_STATE = ['e', 'failed']
 
     COMPLETE_STATE = ['c']
 
     # Queued states
     QUEUED_STATE = ['q', 'h', 't', 'w', 's']
 
+    # Finished jobs, and finished sub jobs of an array job
+    EXPIRED_STATE = ['f', 'x']
+
+    ARRAY_TASK_ID = 'PBS_ARRAY_INDEX'
+
     def terminate_job(self, job):
         command = 'qdel %s' % job['queueJobId']
         output = self._cluster_connection.execute(command)
@@ -21,7 +30,8 @@ class PbsQueueAdapter(AbstractQueueAdapter):
         return output
 
     def _parse_job_id(self, submit_output):
-        m = re.match('^(\\d+)\..*', submit_output[0])
+        # Array jobs are reported as 123[].server
+        m = re.match('^(\\d+)(?:\\[\\])?\..*', submit_output[0])
         if not m:
             raise Exception('Unable to extraction job id from: %s'
                             % submit_output[0])
@@ -38,41 +48,81 @@ class PbsQueueAdapter(AbstractQueueAdapter):
 
         return self._parse_job_id(output)
 
-    def job_statuses(self, jobs):
+    def _queue_state(self, native_state):
+        if native_state in PbsQueueAdapter.EXPIRED_STATE:
+            native_state = PbsQueueAdapter.COMPLETE_STATE[0]
 
-        job_ids = ' '.join(
-            [job[AbstractQueueAdapter.QUEUE_JOB_ID] for job in jobs])
+        return super(PbsQueueAdapter, self)._queue_state(native_state)
 
-        output = self._cluster_connection.execute('qstat %s' % job_ids)
+    def job_statuses(self, jobs):
 
-        states = []
+        job_ids = []
+        array_jobs = False
         for job in jobs:
-            state = None
-            pbs_state = self._extract_job_status(output, job)
-
-            if pbs_state:
-                if pbs_state in PbsQueueAdapter.RUNNING_STATE:
-                    state = JobQueueState.RUNNING
-                elif pbs_state in PbsQueueAdapter.ERROR_STATE:
-                    state = JobQueueState.ERROR
-                elif pbs_state in PbsQueueAdapter.QUEUED_STATE:
-                    state = JobQueueState.QUEUED
-                elif pbs_state in PbsQueueAdapter.COMPLETE_STATE:
-                    state = JobQueueState.COMPLETE
-
-            states.append((job, state))
-
-        return states
-
-    def _extract_job_status(self, job_status_output, job):
-        state = None
-        job_id = job[AbstractQueueAdapter.QUEUE_JOB_ID]
-        for line in job_status_output:
-            m = re.match('^\\s*(\\d+)\\S*\\s+\\S+\\s+\\S+\\s+\\S+\\s+(\\w+)',
-                         line)
-
-            if m and m.group(1) == job_id:
-                state = m.group(2).lower()
-                break
-
-        return state
+            job_id = job[AbstractQueueAdapter.QUEUE_JOB_ID]
+            # Array jobs have to be referred to as <id>[] and the sub jobs
+            # are only listed using -t
+            if is_array_job(job):
+                job_id = '%s[]' % job_id
+                array_jobs = True
+            job_ids.append(job_id)
+
+        options = ''
+        if array_jobs:
+            options = ' -t'
+        job_ids = ' '.join(job_ids)
+
+        # -x includes finished jobs, so we can get their exit status.
+        output = self._cluster_connection.execute(
+            'qstat -x -f -F json%s %s' % (options, job_ids))
+        try:
+            native_states = self._parse_json_states(output)
+        except ValueError:
+            # Older versions of PBS ( and Torque ) don't support JSON output,
+            # so fallback to parsing the table.
+            output = self._cluster_connection.execute(
+                'qstat%s %s' % (options, job_ids))
+            native_states = self._parse_states(output)
+
+        return self._job_states(jobs, native_states)
+
+    def _parse_json_states(self, output):
+        """
+        Parse the JSON output by qstat -f -F json into a dict of job id to
+        a list of (number of tasks, state). Finished jobs with a non-zero exit
+        status are given the 'failed' state.
+        """
+        status = json.loads('\n'.join([line.rstrip('\n') for line in output]))
+
+        native_states = {}
+        for (name, job) in six.iteritems(status.get('Jobs', {})):
+            m = re.match('^(\\d+)(\\[\\d*\\])?', name)
+            # Skip the parent of an array job, we use its sub jobs
+            if not m or m.group(2) == '[]':
+                continue
+
+            state = job.get('job_state', '').lower()
+            if state in PbsQueueAdapter.EXPIRED_STATE \
+                    and job.get('Exit_status', 0) != 0:
+                state = 'failed'
+
+            native_states.setdefault(m.group(1), []).append((1, state))
+
+        return native_states
+
+    def _parse_states(self, output):
+        """
+        Parse the table output by qstat into a dict of job id to a list of
+        (number of tasks, state). Sub jobs of an array job are listed as
+        <job id>[<index>].server, the array itself as <job id>[].server.
+        """
+        native_states = {}
+        for line in output:
+            m = re.match('^\\s*(\\d+)(\\[\\d*\\])?\\S*\\s+\\S+\\s+\\S+\\s+\\S+'
+                         '\\s+(\\w+)', line)
+
+            if m and m.group(2) != '[]':
+                native_states.setdefault(m.group(1), []).append(
+                    (1, m.group(3).lower()))
+
+        return native_states
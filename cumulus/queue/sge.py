@@ -18,8 +18,10 @@
 ###############################################################################
 
 import re
-from cumulus.queue.abstract import AbstractQueueAdapter
-from cumulus.constants import JobQueueState
+from xml.etree import ElementTree
+
+from cumulus.queue.abstract import AbstractQueueAdapter, array_task_count
+from cumulus.transport.metadata import metadata_cache, cluster_key
 
 
 class SgeQueueAdapter(AbstractQueueAdapter):
@@ -31,6 +33,8 @@ class SgeQueueAdapter(AbstractQueueAdapter):
     # Queued states
     QUEUED_STATE = ['qw', 'q', 'w', 's', 'h', 't']
 
+    ARRAY_TASK_ID = 'SGE_TASK_ID'
+
     def terminate_job(self, job):
         command = 'qdel %s' % job['queueJobId']
         output = self._cluster_connection.execute(command)
@@ -38,7 +42,8 @@ class SgeQueueAdapter(AbstractQueueAdapter):
         return output
 
     def _parse_job_id(self, submit_output):
-        m = re.match('^[Yy]our job (\\d+)', submit_output[0])
+        # Array jobs are reported as "Your job-array 123.1-10:1 ..."
+        m = re.match('^[Yy]our job(?:-array)? (\\d+)', submit_output[0])
         if not m:
             raise Exception('Unable to extraction job id from: %s'
                             % submit_output[0])
@@ -55,39 +60,63 @@ class SgeQueueAdapter(AbstractQueueAdapter):
 
         return self._parse_job_id(output)
 
-    def job_statuses(self, jobs):
-        output = self._cluster_connection.execute('qstat')
-
-        states = []
-        for job in jobs:
-            state = None
-            sge_state = self._extract_job_status(output, job)
-
-            if sge_state:
-                if sge_state in SgeQueueAdapter.RUNNING_STATE:
-                    state = JobQueueState.RUNNING
-                elif sge_state in SgeQueueAdapter.ERROR_STATE:
-                    state = JobQueueState.ERROR
-                elif sge_state in SgeQueueAdapter.QUEUED_STATE:
-                    state = JobQueueState.QUEUED
-
-            states.append((job, state))
-
-        return states
-
-    def _extract_job_status(self, job_status_output, job):
-        state = None
-        job_id = job[AbstractQueueAdapter.QUEUE_JOB_ID]
-        for line in job_status_output:
-            m = re.match('^\\s*(\\d+)\\s+\\S+\\s+\\S+\\s+\\S+\\s+(\\w+)',
-                         line)
-            if m and m.group(1) == job_id:
-                state = m.group(2).lower()
-                break
+    def _queue_state(self, native_state):
+        # SGE states combine a number of flags, for example Eqw or hqw, any
+        # job with the error flag set is in error.
+        if native_state and 'e' in native_state:
+            native_state = 'e'
+        elif native_state and native_state not in self.RUNNING_STATE \
+                + self.QUEUED_STATE:
+            native_state = native_state[-1]
 
-        return state
+        return super(SgeQueueAdapter, self)._queue_state(native_state)
+
+    def job_statuses(self, jobs):
+        output = self._cluster_connection.execute('qstat -xml')
+
+        return self._job_states(jobs, self._parse_states(output))
+
+    def _parse_states(self, output):
+        """
+        Parse the XML output by qstat into a dict of job id to a list of
+        (number of tasks, state). Array jobs have a job_list element for each
+        running task, pending tasks are grouped into a range.
+        """
+        try:
+            root = ElementTree.fromstring(
+                '\n'.join([line.rstrip('\n') for line in output]))
+        except ElementTree.ParseError:
+            raise Exception('Unable to parse qstat output: %s' % output)
+
+        native_states = {}
+        for job in root.iter('job_list'):
+            job_id = job.findtext('JB_job_number')
+            state = job.findtext('state')
+            if not job_id or not state:
+                continue
+
+            count = 1
+            tasks = job.findtext('tasks')
+            if tasks:
+                count = array_task_count(tasks)
+
+            native_states.setdefault(job_id, []).append(
+                (count, state.lower()))
+
+        return native_states
 
     def number_of_slots(self, parallel_env):
+        """
+        Returns the number of slots in a parallel environment, this is cached
+        per cluster so qconf is only run once.
+        """
+        def fetch():
+            return self._number_of_slots(parallel_env)
+
+        return metadata_cache().get(cluster_key(self._cluster),
+                                    'slots.%s' % parallel_env, fetch)
+
+    def _number_of_slots(self, parallel_env):
         slots = -1
         output = self._cluster_connection.execute('qconf -sp %s' % parallel_env)
 
@@ -1,6 +1,6 @@
 import re
 from cumulus.queue.abstract import AbstractQueueAdapter
-from cumulus.constants import JobQueueState
+from cumulus.queue.abstract import array_task_count
 
 
 class SlurmQueueAdapter(AbstractQueueAdapter):
@@ -24,15 +24,28 @@ class SlurmQueueAdapter(AbstractQueueAdapter):
     #                     pended.
     # TO  TIMEOUT         Job terminated upon reaching its time limit.
 
+    #
+    # squeue reports the abbreviated states, sacct reports the full names.
+    # Jobs reported by sacct have finished when they are in one of the final
+    # states, so these are classed as errors rather than running.
+
     # Running states
-    RUNNING_STATE = ['ca', 'cg', 'r', 's', 'to']
+    RUNNING_STATE = ['ca', 'cg', 'r', 's', 'to', 'si', 'so', 'st', 'running',
+                     'completing', 'suspended', 'signaling', 'stage_out',
+                     'stopped']
+
+    ERROR_STATE = ['bf', 'dl', 'f', 'nf', 'oom', 'rv', 'se', 'failed',
+                   'node_fail', 'cancelled', 'timeout', 'out_of_memory',
+                   'boot_fail', 'deadline', 'revoked', 'special_exit']
 
-    ERROR_STATE = ['f', 'nf']
+    COMPLETE_STATE = ['cd', 'pr', 'completed', 'preempted']
 
-    COMPLETE_STATE = ['cd', 'pr']
+    # Queued states, including the held and requeued states
+    QUEUED_STATE = ['cf', 'pd', 'rd', 'rf', 'rh', 'rq', 'rs', 'configuring',
+                    'pending', 'requeued', 'requeue_fed', 'requeue_hold',
+                    'resizing', 'resv_del_hold']
 
-    # Queued states
-    QUEUED_STATE = ['cf', 'pd']
+    ARRAY_TASK_ID = 'SLURM_ARRAY_TASK_ID'
 
     def terminate_job(self, job):
         command = 'scancel %s' % job['queueJobId']
@@ -61,37 +74,61 @@ class SlurmQueueAdapter(AbstractQueueAdapter):
     def job_statuses(self, jobs):
         job_ids = ','.join(
             [job[AbstractQueueAdapter.QUEUE_JOB_ID] for job in jobs])
-        output = self._cluster_connection.execute('squeue -j %s'
-                                                  % job_ids)
-
-        states = []
-        for job in jobs:
-            state = None
-            slurm_state = self._extract_job_status(output, job)
-
-            if slurm_state:
-                if slurm_state in SlurmQueueAdapter.RUNNING_STATE:
-                    state = JobQueueState.RUNNING
-                elif slurm_state in SlurmQueueAdapter.ERROR_STATE:
-                    state = JobQueueState.ERROR
-                elif slurm_state in SlurmQueueAdapter.QUEUED_STATE:
-                    state = JobQueueState.QUEUED
-                elif slurm_state in SlurmQueueAdapter.COMPLETE_STATE:
-                    state = JobQueueState.COMPLETE
-
-            states.append((job, state))
-
-        return states
-
-    def _extract_job_status(self, job_status_output, job):
-        state = None
-        job_id = job[AbstractQueueAdapter.QUEUE_JOB_ID]
-        for line in job_status_output:
-            m = re.match('^\\s*(\\d+)\\s+\\S+\\s+\\S+\\s+\\S+\\s+(\\w+)',
-                         line)
-
-            if m and m.group(1) == job_id:
-                state = m.group(2).lower()
-                break
-
-        return state
+
+        # sacct reports jobs that have left the queue, with their final state,
+        # so failed jobs can be told apart from completed ones.
+        output = self._cluster_connection.execute(
+            'sacct --noheader --parsable2 --allocations '
+            '--format=State,JobID --jobs=%s' % job_ids)
+        native_states = self._parse_states(output, '|')
+
+        # Job accounting isn't enabled, fallback to the jobs in the queue.
+        # Otherwise look for the jobs that sacct doesn't list in the queue,
+        # accounting records are written after a job is submitted and are
+        # missing while slurmdbd is unavailable.
+        if native_states is None:
+            native_states = {}
+        missing = ','.join(
+            [job[AbstractQueueAdapter.QUEUE_JOB_ID] for job in jobs
+             if job[AbstractQueueAdapter.QUEUE_JOB_ID] not in native_states])
+
+        if missing:
+            output = self._cluster_connection.execute(
+                'squeue --noheader --format=%%t,%%i --jobs=%s' % missing)
+            native_states.update(self._parse_states(output, ',') or {})
+
+        return self._job_states(jobs, native_states)
+
+    def _parse_states(self, output, delimiter):
+        """
+        Parse the state,job id records output by sacct or squeue into a dict
+        keyed by job id. Array tasks are reported as <job id>_<task id>,
+        pending tasks can be grouped, for example 123_[4-10].
+
+        :returns The dict of job id to list of (number of tasks, state), None
+                 if the output can't be parsed.
+        """
+        native_states = {}
+        for line in output:
+            line = line.strip()
+            if not line:
+                continue
+
+            fields = line.split(delimiter, 1)
+            if len(fields) != 2:
+                return None
+
+            (state, job_id) = fields
+            m = re.match('^(\\d+)(?:_(\\S+))?$', job_id)
+            if not m:
+                continue
+
+            count = 1
+            if m.group(2):
+                count = array_task_count(m.group(2))
+
+            # For example, 'CANCELLED by 1000'
+            state = state.split(' ')[0].lower()
+            native_states.setdefault(m.group(1), []).append((count, state))
+
+        return native_states
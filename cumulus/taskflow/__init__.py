@@ -21,8 +21,12 @@ import logging
 import importlib
 
 from functools import wraps
+import copy
+import hashlib
 import json
+import re
 import threading
+import time
 
 from girder_client import GirderClient, HttpError
 
@@ -32,6 +36,7 @@ from celery.signals import before_task_publish, task_prerun, task_failure, \
 from celery.canvas import maybe_signature
 from celery import current_task
 from celery.utils.log import get_task_logger
+from celery.worker.control import Panel
 
 import cumulus.celery
 from cumulus.logging import RESTfulLogHandler
@@ -48,6 +53,31 @@ thread_local = threading.local()
 TASKFLOW_HEADER = 'taskflow'
 TASKFLOW_TASK_ID_HEADER = 'taskflow_task_id'
 TASKFLOW_RETRY_HEADER = 'taskflow_retries'
+TASKFLOW_DAG_NODE_HEADER = 'taskflow_dag_node'
+
+# The number of tasks registered in each request by register_tasks(...)
+register_batch_size = 1000
+
+# The key in a compact taskflow header holding the version of the taskflow
+# definition stored in Girder, see TaskFlow.run_task(...)
+TASKFLOW_DEFINITION_VERSION = 'definitionVersion'
+
+# The fields carried by a compact taskflow header
+_compact_header_fields = ['id', 'girder_token', 'girder_api_url']
+
+# The taskflow definitions fetched by this worker, keyed by taskflow id and
+# definition version. Versions are never modified, so this never needs to be
+# invalidated.
+_max_definitions = 1024
+_definitions = {}
+_definitions_lock = threading.Lock()
+
+# The status of the taskflows this worker has run tasks for, keyed by taskflow
+# id. Entries expire after taskFlowStatusCache.ttl seconds, and are updated
+# straight away when a taskflow's status change is broadcast.
+_max_statuses = 1024
+_statuses = {}
+_statuses_lock = threading.Lock()
 
 
 # The states that a taskflow can be in, there are likely to be more
@@ -57,6 +87,11 @@ class TaskState:
     ERROR = 'error'
     COMPLETE = 'complete'
 
+    @staticmethod
+    def is_valid(status):
+        return status in [TaskState.CREATED, TaskState.RUNNING,
+                          TaskState.ERROR, TaskState.COMPLETE]
+
 
 class TaskFlowState:
     CREATED = 'created'
@@ -105,7 +140,7 @@ def task(func):
         # Get the current state of the taskflow so we know if we are terminating
         # Only do this if this task is not associated with termination ...
         if 'terminate' not in taskflow or not taskflow['terminate']:
-            status = taskflow.status()
+            status = _cached_status(taskflow)
             if status == TaskFlowState.TERMINATING or \
                     status == TaskFlowState.UNEXPECTEDERROR:
                 return
@@ -138,25 +173,111 @@ def load_class(class_name):
     return constructor
 
 
+def _compact_headers():
+    """
+    :returns True if taskflows should be published with compact headers.
+    """
+    return cumulus.config.get('taskFlowHeaders', {}).get('compact', False)
+
+
+def _definition_version(definition):
+    """
+    :returns The version of a taskflow definition, a hash of its content.
+    """
+    content = json.dumps(definition, sort_keys=True)
+
+    return hashlib.sha1(content.encode('utf8')).hexdigest()
+
+
+def _cache_definition(taskflow_id, version, definition):
+    with _definitions_lock:
+        # This just stops the cache growing without bound for long running
+        # workers.
+        if len(_definitions) >= _max_definitions:
+            _definitions.clear()
+        _definitions[(taskflow_id, version)] = definition
+
+
+def _load_definition(header):
+    """
+    Get the taskflow definition referenced by a compact header, it is only
+    fetched from Girder the first time it is used by this worker.
+
+    :param header: The compact taskflow header.
+    :returns The taskflow definition.
+    """
+    key = (header['id'], header[TASKFLOW_DEFINITION_VERSION])
+    with _definitions_lock:
+        definition = _definitions.get(key)
+
+    if definition is None:
+        client = _create_girder_client(header['girder_api_url'],
+                                       header['girder_token'])
+        url = 'taskflows/%s/definitions/%s' % key
+        definition = client.get(url)
+        _cache_definition(key[0], key[1], definition)
+
+    return definition
+
+
 def to_taskflow(taskflow):
     """
     Utility method to ensure we have a taskflow instance rather than a simple
-    dictionary.
+    dictionary. The dictionary can either be the full taskflow or a compact
+    header referencing a version of its definition.
     """
     if taskflow is not None:
         if isinstance(taskflow, dict):
+            if TASKFLOW_DEFINITION_VERSION in taskflow:
+                # Copy the cached definition, as the instance may be modified
+                header = taskflow
+                taskflow = copy.deepcopy(_load_definition(header))
+                for field in _compact_header_fields:
+                    taskflow[field] = header[field]
+
             constr = load_class(taskflow['_type'])
             taskflow = constr(**taskflow)
 
     return taskflow
 
 
+# The names that can be given to the nodes of a DAG
+_dag_node_name = re.compile(r'^[\w.-]+$')
+
+
+def _check_dag(dag):
+    """
+    Check that all the dependencies of the nodes of a DAG exist, and that it
+    doesn't contain any cycles.
+    """
+    for (name, node) in dag.items():
+        for dependency in node['dependsOn']:
+            if dependency not in dag:
+                raise Exception('Node \'%s\' depends on unknown node \'%s\'.'
+                                % (name, dependency))
+
+    # Remove nodes with no remaining dependencies until there are none left,
+    # any nodes that can't be removed are part of a cycle.
+    remaining = {name: set(node['dependsOn']) for (name, node) in dag.items()}
+    while remaining:
+        ready = [name for (name, deps) in remaining.items() if not deps]
+        if not ready:
+            raise Exception('The DAG contains a cycle between the nodes: %s'
+                            % ', '.join(sorted(remaining)))
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
 class TaskFlow(dict):
     """
     This is the base class users derive that taskflows from. In the future more
     utility methods can be added for example to update data/results associated
     with the taskflow.
     """
+    DAG = '_dag'
+
     def __init__(self, id=None, girder_token=None,
                  girder_api_url=None, **kwargs):
         """
@@ -194,9 +315,44 @@ class TaskFlow(dict):
         """
         signature.apply_async(
             headers={
-                TASKFLOW_HEADER: self
+                TASKFLOW_HEADER: self._header()
             }, **options)
 
+    def _header(self):
+        """
+        :returns The header used to pass this taskflow to its tasks.
+        """
+        if _compact_headers():
+            return self._compact_header()
+
+        return self
+
+    def _compact_header(self):
+        """
+        Store the definition of this taskflow in Girder, if this version of it
+        hasn't already been stored, and return a header that just references
+        it. This keeps the message headers small however large the taskflow
+        definition is.
+        """
+        definition = dict(self)
+        del definition['girder_token']
+        version = _definition_version(definition)
+
+        with _definitions_lock:
+            stored = (self.id, version) in _definitions
+
+        if not stored:
+            client = _create_girder_client(self.girder_api_url,
+                                           self.girder_token)
+            url = 'taskflows/%s/definitions/%s' % (self.id, version)
+            client.put(url, data=json.dumps(definition))
+            _cache_definition(self.id, version, definition)
+
+        header = {field: self[field] for field in _compact_header_fields}
+        header[TASKFLOW_DEFINITION_VERSION] = version
+
+        return header
+
     def start(self, signature, **options):
         """
         This must be called by subclass to give start to the taskflow.
@@ -303,6 +459,90 @@ class TaskFlow(dict):
         """
         self.setdefault(['_next'], []).append(taskflow)
 
+    def add_node(self, name, signature, depends_on=None):
+        """
+        Add a node to the taskflow's DAG. Once run_dag() is called a node's
+        task is run as soon as the tasks of all the nodes it depends on have
+        completed, so independent branches of the DAG run concurrently.
+
+        For example, to stage the input of job b while job a is running:
+
+        self.add_node('job_a', run_job.s(a))
+        self.add_node('stage_b', stage_input.s(b))
+        self.add_node('job_b', run_job.s(b), depends_on=['stage_b'])
+        self.add_node('report', report.s(), depends_on=['job_a', 'job_b'])
+        self.run_dag()
+
+        A node is complete when its task completes, tasks it goes on to
+        schedule aren't waited for.
+
+        :param name: The name of the node, made up of letters, digits, '_',
+                     '-' and '.'.
+        :param signature: The signature of the node's task.
+        :param depends_on: The names of the nodes that must complete before
+                           this node is run.
+        """
+        if not _dag_node_name.match(name):
+            raise Exception('Invalid node name: %s' % name)
+
+        dag = self.setdefault(TaskFlow.DAG, {})
+        if name in dag:
+            raise Exception('Node \'%s\' has already been added.' % name)
+
+        dag[name] = {
+            'task': signature,
+            'dependsOn': list(depends_on or [])
+        }
+
+    def run_dag(self):
+        """
+        Run the DAG defined using add_node(...), starting with the nodes that
+        have no dependencies.
+        """
+        dag = self.get(TaskFlow.DAG, {})
+        _check_dag(dag)
+
+        for name in sorted(dag):
+            if not dag[name]['dependsOn']:
+                self._run_node(name)
+
+    def _run_node(self, name):
+        """
+        Private utility method to run the task of a node of the DAG.
+        """
+        signature = maybe_signature(self[TaskFlow.DAG][name]['task'])
+        signature.apply_async(
+            headers={
+                TASKFLOW_HEADER: self._header(),
+                TASKFLOW_DAG_NODE_HEADER: name
+            })
+
+    def _dag_node_complete(self, name):
+        """
+        Private utility method to record that a node of the DAG has completed,
+        Girder keeps track of the completed nodes so it is safe for nodes to
+        complete concurrently on different workers.
+
+        :param name: The node that has completed.
+        :returns The names of the nodes that are now ready to run.
+        """
+        client = _create_girder_client(self.girder_api_url, self.girder_token)
+        url = 'taskflows/%s/dag/%s/complete' % (self.id, name)
+        r = client.put(url)
+
+        # Only the request that completes the last dependency of a node sees
+        # it become ready, so each node is only released once.
+        completed_before = set(r['completedNodes'])
+        completed = completed_before | set([name])
+        ready = []
+        for (node, n) in self.get(TaskFlow.DAG, {}).items():
+            depends_on = set(n['dependsOn'])
+            if name in depends_on and depends_on <= completed and \
+                    not depends_on <= completed_before:
+                ready.append(node)
+
+        return sorted(ready)
+
     def status(self):
         """
         Return the current status of this taskflow
@@ -331,6 +571,136 @@ class CompositeTaskFlow(TaskFlow):
         taskflow.start()
 
 
+def register_tasks(signatures):
+    """
+    Register the taskflow tasks for a batch of signatures using bulk requests,
+    rather than a request per task as each task is published. This should be
+    used when fanning out a large number of tasks, for example:
+
+    @taskflow.task
+    def task4(workflow, *args, **kwargs):
+        header = register_tasks([task5.s() for i in range(10000)])
+        chord(header)(task6.s())
+
+    The tasks are registered before they are published, so Girder knows about
+    all of them before any can start running. This must be called from within
+    a taskflow task.
+
+    :param signatures: The signatures of the tasks to register.
+    :returns The list of signatures, with the taskflow headers set.
+    """
+    current = getattr(thread_local, 'current_task', None)
+    if current is None or TASKFLOW_HEADER not in current.request.headers:
+        raise Exception('Tasks can only be registered from a taskflow task.')
+
+    taskflow_header = current.request.headers[TASKFLOW_HEADER]
+    taskflow = to_taskflow(taskflow_header)
+    client = _create_girder_client(taskflow['girder_api_url'],
+                                   taskflow['girder_token'])
+    url = 'taskflows/%s/tasks/bulk' % taskflow.id
+
+    signatures = [maybe_signature(s) for s in signatures]
+    registered = []
+    try:
+        for i in range(0, len(signatures), register_batch_size):
+            batch = signatures[i:i + register_batch_size]
+            body = []
+            for s in batch:
+                # Assign the celery task id now, it is kept when published
+                s.freeze()
+                body.append({
+                    'celeryTaskId': s.id,
+                    'name': s.task
+                })
+
+            tasks = client.post(url, data=json.dumps(body))
+            for (s, t) in zip(batch, tasks):
+                headers = s.options.setdefault('headers', {})
+                headers[TASKFLOW_HEADER] = taskflow_header
+                headers[TASKFLOW_TASK_ID_HEADER] = t['_id']
+                registered.append(t['_id'])
+    except Exception:
+        # The tasks already registered are counted as active but will never
+        # be published, so finish them to keep the active task count in sync.
+        for taskflow_task_id in registered:
+            _taskflow_task_finished(taskflow, taskflow_task_id)
+            _update_task_status(taskflow, taskflow_task_id, TaskState.ERROR)
+        raise
+
+    return signatures
+
+
+def _status_cache_ttl():
+    return cumulus.config.get('taskFlowStatusCache', {}).get('ttl', 5)
+
+
+def _cache_status(taskflow_id, status, now=None):
+    now = now or time.time()
+    with _statuses_lock:
+        # Drop the expired entries so the cache doesn't grow without bound for
+        # long running workers, clearing it if they are all still live.
+        if len(_statuses) >= _max_statuses:
+            ttl = _status_cache_ttl()
+            for (key, (_, cached)) in list(_statuses.items()):
+                if now - cached > ttl:
+                    del _statuses[key]
+            if len(_statuses) >= _max_statuses:
+                _statuses.clear()
+        _statuses[taskflow_id] = (status, now)
+
+
+def _cached_status(taskflow):
+    """
+    Get the status of a taskflow, using the status cached by this worker if it
+    hasn't expired. This is used to check if the taskflow is being terminated
+    before running each task, without a request to Girder for every task.
+    Status changes that need to be seen by running tasks are broadcast to the
+    workers, see broadcast_status(...), so the cache is only relied on to
+    expire if a broadcast is missed.
+
+    :param taskflow: The taskflow.
+    :returns The taskflow status.
+    """
+    ttl = _status_cache_ttl()
+    now = time.time()
+    with _statuses_lock:
+        entry = _statuses.get(taskflow.id)
+
+    if ttl > 0 and entry is not None and now - entry[1] <= ttl:
+        return entry[0]
+
+    status = taskflow.status()
+    _cache_status(taskflow.id, status, now)
+
+    return status
+
+
+def broadcast_status(taskflow_id, status):
+    """
+    Broadcast a change in the status of a taskflow to all the workers, so
+    their cached status is updated straight away.
+
+    :param taskflow_id: The id of the taskflow.
+    :param status: The new status.
+    """
+    _cache_status(taskflow_id, status)
+    cumulus.celery.command.control.broadcast(
+        'taskflow_status', arguments={
+            'taskflow_id': taskflow_id,
+            'status': status
+        })
+
+
+@Panel.register
+def taskflow_status(state, taskflow_id=None, status=None, **kwargs):
+    """
+    Remote control command used to update a taskflow's cached status.
+    """
+    _cache_status(taskflow_id, status)
+
+    return {'ok': 'status of taskflow %s is %s' % (taskflow_id, status)}
+
+
 def _taskflow_task_finished(taskflow, taskflow_task_id):
     girder_token = taskflow['girder_token']
     girder_api_url = taskflow['girder_api_url']
@@ -403,7 +773,7 @@ def task_before_sent_handler(headers=None, body=None, **kwargs):
     if not hasattr(thread_local, 'current_task'):
         thread_local.current_task = None
 
-    def _update_girder(taskflow, body):
+    def _update_girder(taskflow, body, headers):
         taskflow = to_taskflow(taskflow)
         taskflow_id = taskflow['id']
         girder_token = taskflow['girder_token']
@@ -425,6 +795,9 @@ def task_before_sent_handler(headers=None, body=None, **kwargs):
             # determine in the postrun handler if the task is really complete.
             current_task.request.headers[TASKFLOW_RETRY_HEADER] \
                 = body['retries']
+        elif headers is not None and TASKFLOW_TASK_ID_HEADER in headers:
+            # The task has already been created using register_tasks(...)
+            taskflow_task_id = headers[TASKFLOW_TASK_ID_HEADER]
         else:
                 # This is a new task so create a taskflow task instance
             body = {
@@ -438,23 +811,40 @@ def task_before_sent_handler(headers=None, body=None, **kwargs):
 
     # First task in the queue
     if headers is not None and TASKFLOW_HEADER in headers:
+        taskflow_header = headers[TASKFLOW_HEADER]
         taskflow, taskflow_task_id = _update_girder(
-            headers[TASKFLOW_HEADER], body)
+            taskflow_header, body, headers)
         headers[TASKFLOW_TASK_ID_HEADER] = taskflow_task_id
-        headers[TASKFLOW_HEADER] = taskflow
+        headers[TASKFLOW_HEADER] = _propagated_header(taskflow_header,
+                                                      taskflow)
     # All other tasks
     elif thread_local.current_task is not None and \
             TASKFLOW_HEADER in thread_local.current_task.request.headers:
 
+        taskflow_header \
+            = thread_local.current_task.request.headers[TASKFLOW_HEADER]
         taskflow, taskflow_task_id = _update_girder(
-            thread_local.current_task.request.headers[TASKFLOW_HEADER], body)
+            taskflow_header, body, headers)
         headers[TASKFLOW_TASK_ID_HEADER] = taskflow_task_id
-        headers[TASKFLOW_HEADER] = taskflow
+        headers[TASKFLOW_HEADER] = _propagated_header(taskflow_header,
+                                                      taskflow)
         # Save the task_id and taskflow in the headers
     else:
         print(body['task'])
 
 
+def _propagated_header(taskflow_header, taskflow):
+    """
+    :returns The taskflow header to pass on to a new task, compact headers are
+             passed on as they are rather than expanded.
+    """
+    if isinstance(taskflow_header, dict) and \
+            TASKFLOW_DEFINITION_VERSION in taskflow_header:
+        return taskflow_header
+
+    return taskflow
+
+
 def _update_task_status(taskflow, task_id, status):
     """
     Utility function to update the state of a given taskflow task.
@@ -484,6 +874,8 @@ def _update_taskflow_status(taskflow, status):
     }
     client.patch(url, data=json.dumps(body))
 
+    broadcast_status(taskflow.id, status)
+
 
 @task_failure.connect
 def task_failure_handler(sender=None, task_id=None, exception=None,
@@ -528,6 +920,31 @@ def task_failure_handler(sender=None, task_id=None, exception=None,
             raise
 
 
+def _run_follow_on_tasks(taskflow, sender, headers):
+    """
+    Run the tasks that follow on from a completed task, the on_complete tasks
+    and the DAG nodes that were waiting for it.
+
+    :param taskflow: The taskflow the task belongs to.
+    :param sender: The completed task.
+    :param headers: The headers of the completed task.
+    """
+    # See if we have any follow on tasks
+    to_run = taskflow._on_complete_lookup(sender.name)
+    # Only run follow on tasks if we aren't terminating
+    if to_run and _cached_status(taskflow) != TaskFlowState.TERMINATING:
+        to_run.delay()
+
+    # If this task is a node of the taskflow's DAG run the nodes that
+    # were waiting for it.
+    node = headers.get(TASKFLOW_DAG_NODE_HEADER)
+    if node is not None:
+        ready = taskflow._dag_node_complete(node)
+        if ready and _cached_status(taskflow) != TaskFlowState.TERMINATING:
+            for name in ready:
+                taskflow._run_node(name)
+
+
 @task_success.connect
 def task_success_handler(sender=None, **kwargs):
     if TASKFLOW_HEADER in sender.request.headers:
@@ -549,11 +966,7 @@ def task_success_handler(sender=None, **kwargs):
             if taskflow_retries and taskflow_retries != sender.request.retries:
                 return
 
-            # See if we have any follow on tasks
-            to_run = taskflow._on_complete_lookup(sender.name)
-            # Only run follow on tasks if we aren't terminating
-            if to_run and taskflow.status() != TaskFlowState.TERMINATING:
-                to_run.delay()
+            _run_follow_on_tasks(taskflow, sender, headers)
 
             # Is the completion of this task going to complete the flow?
             # Signal to the taskflow that we are finished and see what the
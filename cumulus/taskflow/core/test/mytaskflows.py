@@ -159,7 +159,8 @@ def task4(task, *args, **kwargs):
     print ('task4')
     time.sleep(2)
 
-    header = [task5.s() for i in range(10)]
+    # Register the header tasks in one request before running the chord
+    header = taskflow.register_tasks([task5.s() for i in range(10)])
 
     chord(header)(task6.s())
 
@@ -265,3 +266,34 @@ class ConnectTwoTaskFlow(taskflow.TaskFlow):
 
     def start(self, *args, **kwargs):
         super(ConnectTwoTaskFlow, self).start(part1_start.s(*args, **kwargs))
+
+
+class DAGTaskFlow(taskflow.TaskFlow):
+    """
+    This taskflow runs its tasks as a DAG, dag_stage runs while dag_job('a')
+    is running, dag_report is run once both jobs are complete.
+    """
+    def start(self, *args, **kwargs):
+        self.add_node('job_a', dag_job.s('a'))
+        self.add_node('stage_b', dag_stage.s('b'))
+        self.add_node('job_b', dag_job.s('b'), depends_on=['stage_b'])
+        self.add_node('report', dag_report.s(),
+                      depends_on=['job_a', 'job_b'])
+        self.run_dag()
+
+
+@taskflow.task
+def dag_stage(task, name, *args, **kwargs):
+    print ('dag_stage - %s' % name)
+    time.sleep(2)
+
+
+@taskflow.task
+def dag_job(task, name, *args, **kwargs):
+    print ('dag_job - %s' % name)
+    time.sleep(3)
+
+
+@taskflow.task
+def dag_report(task, *args, **kwargs):
+    print ('dag_report')
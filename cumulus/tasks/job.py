@@ -18,8 +18,9 @@
 ###############################################################################
 
 from __future__ import absolute_import
+import copy
 import traceback
-from cumulus.common import check_status
+from cumulus.common import check_status, update_dict
 from cumulus.common import get_post_logger, get_job_logger
 from cumulus.common import get_cluster_logger
 from cumulus.celery import command, monitor
@@ -28,7 +29,8 @@ import cumulus.girderclient
 import cumulus.constants
 from cumulus.constants import ClusterType, JobQueueState
 from cumulus.queue import get_queue_adapter
-from cumulus.queue.abstract import AbstractQueueAdapter
+from cumulus.queue.abstract import AbstractQueueAdapter, is_array_job
+from cumulus.queue.abstract import PARAMETER_SETS, TASK_STATES
 from cumulus.transport import get_connection
 from cumulus.transport.files.download import download_path
 from cumulus.transport.files.upload import upload_path
@@ -40,10 +42,12 @@ import inspect
 import time
 import uuid
 from six import StringIO
+from six.moves import shlex_quote
 from celery import signature
 from celery.exceptions import Retry
 from jinja2 import Environment, Template, PackageLoader
-from jsonpath_rw import parse
+from jinja2 import FileSystemBytecodeCache
+from cumulus.common.jsonpath import parse
 import tempfile
 from girder_client import HttpError
 import paramiko
@@ -59,6 +63,11 @@ def _put_script(conn, script_commands):
     return cmd
 
 
+# The default location of a cluster's input cache, relative to the home
+# directory.
+_default_input_cache_dir = '.cumulus/input_cache'
+
+
 def job_directory(cluster, job, user_home='.'):
     """
     Returns the job directory for a given job.
@@ -104,6 +113,22 @@ def download_job_input_items(cluster, job, log_write_url=None,
                 % (girder_token, cumulus.config.girder.baseUrl,
                    job_directory(cluster, job), job_id)
 
+            # Allow the download concurrency to be tuned
+            download_config = cumulus.config.get('download', {})
+            if 'concurrency' in download_config:
+                download_cmd += ' --concurrency %d' \
+                    % download_config['concurrency']
+
+            # Use the cluster's input cache if it has one
+            input_cache = parse('config.inputCache').find(cluster)
+            if input_cache:
+                input_cache = input_cache[0].value
+                download_cmd += ' --cache-dir %s' % shlex_quote(
+                    input_cache.get('path', _default_input_cache_dir))
+                if 'maxSize' in input_cache:
+                    download_cmd += ' --cache-size %d' \
+                        % int(input_cache['maxSize'])
+
             download_output = '%s.download.out' % job_id
             download_cmd = 'nohup %s  &> %s  &\n' % (download_cmd,
                                                      download_output)
@@ -199,18 +224,83 @@ def _is_terminating(job, girder_token):
     return current_status in [JobState.TERMINATED, JobState.TERMINATING]
 
 
-def _generate_submission_script(job, cluster, job_params):
-    env = Environment(loader=PackageLoader('cumulus', 'templates'))
-    template = env.get_template('template.sh')
-    script = template.render(cluster=cluster, job=job,
-                             baseUrl=cumulus.config.girder.baseUrl,
-                             **job_params)
+_template_env = None
+_command_env = None
+# Compiled templates for the jobs commands, keyed by the command
+_command_templates = {}
+_max_command_templates = 1024
+
+
+def _template_environment():
+    """
+    Returns the environment used to render submission scripts, this is
+    created on first use and shared by all submissions so the templates are
+    only loaded and compiled once per worker. The bytecode cache means new
+    workers don't have to recompile them either.
+    """
+    global _template_env
+
+    if _template_env is None:
+        _template_env = Environment(
+            loader=PackageLoader('cumulus', 'templates'),
+            bytecode_cache=FileSystemBytecodeCache(),
+            # The templates are part of the package so won't change
+            auto_reload=False)
+
+    return _template_env
+
+
+def _command_template(command):
+    global _command_env
+
+    template = _command_templates.get(command)
+    if template is None:
+        if len(_command_templates) >= _max_command_templates:
+            _command_templates.clear()
+
+        # Commands are rendered into the middle of the script, so keep
+        # any trailing newline.
+        if _command_env is None:
+            _command_env = Environment(keep_trailing_newline=True)
+        template = _command_env.from_string(command)
+        _command_templates[command] = template
+
+    return template
+
+
+def _generate_submission_script(job, cluster, job_params,
+                                cluster_connection=None):
+    context = dict(job_params, cluster=cluster, job=job,
+                   baseUrl=cumulus.config.girder.baseUrl)
+
+    def render_commands(context):
+        # Render any template variables in the jobs commands. Jobs in a sweep
+        # share the same commands, so their compiled templates are reused.
+        return [_command_template(c).render(context)
+                for c in job.get('commands', [])]
+
+    array_params = {}
+    if is_array_job(job):
+        # An array job runs the commands once per parameter set, the task
+        # selects its commands using the index set by the scheduler.
+        parameter_sets = job[PARAMETER_SETS]
+        array_params = {
+            'arraySize': len(parameter_sets),
+            'arrayTaskId': get_queue_adapter(
+                cluster, cluster_connection).ARRAY_TASK_ID,
+            'arrayCommands': [render_commands(dict(context, **p))
+                              for p in parameter_sets]
+        }
+        commands = []
+    else:
+        commands = render_commands(context)
+
+    template = _template_environment().get_template('template.sh')
+    script = template.render(context, commands=commands, **array_params)
 
-    # We now render again to ensure any template variable in the jobs
-    # commands are filled out.
-    script = Template(script).render(cluster=cluster, job=job,
-                                     baseUrl=cumulus.config.girder.baseUrl,
-                                     **job_params)
+    # Generated scripts don't include the final trailing newline
+    if script.endswith('\n'):
+        script = script[:-1]
 
     return script
 
@@ -246,11 +336,7 @@ def submit_job(cluster, job, log_write_url=None, girder_token=None,
             if 'params' in job:
                 job_params = job['params']
 
-            output = conn.execute('pwd')
-            if len(output) != 1:
-                raise Exception('Unable to fetch users home directory.')
-
-            user_home = output[0].strip()
+            user_home = conn.home_dir()
             job_dir = job_directory(cluster, job, user_home=user_home)
             job['dir'] = job_dir
 
@@ -275,7 +361,8 @@ def submit_job(cluster, job, log_write_url=None, girder_token=None,
                     if slots > 0:
                         job_params['numberOfSlots'] = slots
 
-            script = _generate_submission_script(job, cluster, job_params)
+            script = _generate_submission_script(job, cluster, job_params,
+                                                 conn)
 
             conn.mkdir(job_dir, ignore_failure=True)
             # put the script to master
@@ -302,11 +389,10 @@ def submit_job(cluster, job, log_write_url=None, girder_token=None,
             job = r.json()
             job['queuedTime'] = time.time()
 
-            # Now monitor the jobs progress
+            # Now monitor the jobs progress, all the jobs on a cluster are
+            # monitored by a single task.
             if monitor:
-                monitor_job.s(
-                    cluster, job, log_write_url=log_write_url,
-                    girder_token=girder_token).apply_async(countdown=5)
+                _ensure_cluster_monitor(cluster, girder_token)
 
         # Now update the status of the job
         headers = {'Girder-Token':  girder_token}
@@ -420,39 +506,67 @@ class Queued(JobState):
 
 class Running(JobState):
     def _tail_output(self):
+        """
+        Read any new content in the files being tailed and append it to the
+        job's output. Only the bytes after the offset we have already read up
+        to are fetched, and only complete lines are sent to Girder.
+        """
         job_url = '%s/jobs/%s/log' % (cumulus.config.girder.baseUrl,
                                       self.job['_id'])
         log = get_post_logger(self.job['_id'], self.girder_token, job_url)
 
+        appends = []
+        tailed = []
         # Do we need to tail any output files
         for output in self.job.get('output', []):
             if 'tail' in output and output['tail']:
                 path = output['path']
-                offset = 0
-                if 'content' in output:
-                    offset = len(output['content'])
-                else:
-                    output['content'] = []
+                offset = output.get('tailOffset', 0)
                 tail_path = os.path.join(self.job['dir'], path)
-                command = 'tail -n +%d %s' % (offset, tail_path)
                 try:
+                    data = self.conn.read(tail_path, offset)
                     # Only tail if file exists
-                    if self.conn.isfile(tail_path):
-                        stdout = self.conn.execute(command)
-                        output['content'] = output['content'] + stdout
-                    else:
+                    if data is None:
                         log.info('Skipping tail of %s as file doesn\'t '
                                  'currently exist' %
                                  tail_path)
+                        continue
+
+                    # Leave any partial line to be read in the next poll
+                    end = data.rfind(b'\n') + 1
+                    if not end:
+                        continue
+
+                    offset += end
+                    content = data[:end].decode('utf8', 'replace')
+                    appends.append({
+                        'path': path,
+                        'content': content.splitlines(True),
+                        'offset': offset
+                    })
+                    tailed.append((output, offset))
                 except Exception as ex:
                     get_job_logger(self.job,
-                                   self.girder_token).exception(ex.message)
+                                   self.girder_token).exception(str(ex))
+
+        if appends:
+            headers = {'Girder-Token':  self.girder_token}
+            url = '%s/jobs/%s/output' % (cumulus.config.girder.baseUrl,
+                                         self.job['_id'])
+            r = requests.post(url, headers=headers, json=appends)
+            check_status(r)
+
+            # Only move on once the content has been saved
+            for (output, offset) in tailed:
+                output['tailOffset'] = offset
 
     def next(self, job_queue_status):
         if not job_queue_status or job_queue_status == JobQueueState.COMPLETE:
             return Uploading(self)
         elif job_queue_status == JobQueueState.RUNNING:
             return self
+        elif job_queue_status == JobQueueState.QUEUED:
+            return Queued(self)
         elif job_queue_status == JobQueueState.ERROR:
             return Error(self)
         else:
@@ -605,8 +719,162 @@ def from_string(s, **kwargs):
     return state
 
 
+# The default adaptive polling schedule. We poll at initialInterval right after
+# a state change and then back off by backoffFactor while the state stays the
+# same, up to the maximum interval for the state. This can be overridden using
+# pollSchedule in the cluster config or in the job params.
+_default_poll_schedule = {
+    'initialInterval': 5,
+    'backoffFactor': 2,
+    'maxInterval': {
+        JobState.QUEUED: 120,
+        JobState.RUNNING: 30,
+        JobState.UPLOADING: 30,
+        'downloading': 30,
+        'default': 60
+    }
+}
+
+
+def _poll_schedule(cluster, job=None):
+    schedule = update_dict(copy.deepcopy(_default_poll_schedule),
+                           cluster.get('config', {}).get('pollSchedule', {}))
+
+    if job is not None:
+        schedule = update_dict(schedule,
+                               job.get('params', {}).get('pollSchedule', {}))
+
+    return schedule
+
+
+def _poll_interval(schedule, state, polls):
+    """
+    Returns the number of seconds to wait before the next poll.
+
+    :param schedule: The poll schedule to use.
+    :param state: The current state of the job.
+    :param polls: The number of polls since the state last changed.
+    """
+    max_intervals = schedule['maxInterval']
+    max_interval = max_intervals.get(state, max_intervals['default'])
+    # Cap the exponent, we will have hit the max interval long before this.
+    interval = schedule['initialInterval'] \
+        * schedule['backoffFactor'] ** min(polls, 32)
+
+    return min(interval, max_interval)
+
+
+def _schedule_next_poll(cluster, job, previous_status):
+    """
+    Record when the job should next be polled on the job, the poll count is
+    reset each time the job changes state.
+    """
+    if job['status'] != previous_status:
+        job['pollCount'] = 0
+    else:
+        job['pollCount'] = job.get('pollCount', 0) + 1
+
+    interval = _poll_interval(_poll_schedule(cluster, job), job['status'],
+                              job['pollCount'])
+    job['nextPoll'] = time.time() + interval
+
+
+def _next_poll_countdown(jobs):
+    """
+    Returns the number of seconds until the next job is due to be polled.
+    """
+    next_poll = min([job.get('nextPoll', 0) for job in jobs])
+
+    return max(int(round(next_poll - time.time())), 0)
+
+
+# The states in which a job still needs to be monitored
+_running_states = set(
+    [JobState.CREATED, JobState.QUEUED,
+     JobState.RUNNING, JobState.TERMINATING]
+)
+
+
+def _update_job_states(task, cluster, conn, jobs, log_write_url=None,
+                       girder_token=None):
+    """
+    Query the scheduler once for the status of all the jobs and move each of
+    them through the state machine. The current statuses are fetched and the
+    updates written back to Girder using one bulk request each.
+
+    :returns The list of jobs that are still in a running state.
+    """
+    headers = {'Girder-Token':  girder_token}
+    job_queue_states \
+        = get_queue_adapter(cluster, conn).job_statuses(jobs)
+
+    # First get the current status of all the jobs
+    status_url = '%s/jobs/status' % cumulus.config.girder.baseUrl
+    params = {
+        'ids': ','.join([job['_id'] for job in jobs])
+    }
+    r = requests.get(status_url, headers=headers, params=params)
+    check_status(r)
+    current_statuses = r.json()
+
+    active_jobs = []
+    updates = []
+    for (job, state) in job_queue_states:
+        job_id = job['_id']
+        current_status = current_statuses.get(job_id)
+
+        # The job has been removed or terminated, stop monitoring it
+        if current_status is None or current_status == JobState.TERMINATED:
+            continue
+
+        job_log_write_url = log_write_url
+        if job_log_write_url is None:
+            job_log_write_url = '%s/jobs/%s/log' % (
+                cumulus.config.girder.baseUrl, job_id)
+
+        job_status = from_string(current_status, task=task,
+                                 cluster=cluster, job=job,
+                                 log_write_url=job_log_write_url,
+                                 girder_token=girder_token,
+                                 conn=conn)
+        job_status = job_status.next(state)
+        job['status'] = str(job_status)
+        job_status.run()
+        _schedule_next_poll(cluster, job, current_status)
+        # The output is not sent, tailed content is appended separately
+        update = {
+            '_id': job_id,
+            'status': str(job_status),
+            'timings': job.get('timings', {})
+        }
+        if TASK_STATES in job:
+            update[TASK_STATES] = job[TASK_STATES]
+        updates.append(update)
+
+        if job['status'] in _running_states:
+            active_jobs.append(job)
+
+    # Now update all the jobs in one go
+    if updates:
+        jobs_url = '%s/jobs' % cumulus.config.girder.baseUrl
+        r = requests.patch(jobs_url, headers=headers, json=updates)
+        check_status(r)
+
+    return active_jobs
+
+
 def _monitor_jobs(task, cluster, jobs, log_write_url=None, girder_token=None,
-                  monitor_interval=5):
+                  monitor_interval=None, retry=True):
+    """
+    Update the state of the jobs. If retry is True the task will be
+    rescheduled while any of the jobs are still in a running state, otherwise
+    the list of jobs still running is returned and it is up to the caller to
+    reschedule.
+
+    :param monitor_interval: If provided the jobs are polled at this fixed
+                             interval, otherwise the adaptive poll schedule is
+                             used.
+    """
     headers = {'Girder-Token':  girder_token}
 
     cluster_url = '%s/clusters/%s' % (
@@ -615,51 +883,18 @@ def _monitor_jobs(task, cluster, jobs, log_write_url=None, girder_token=None,
         with get_connection(girder_token, cluster) as conn:
 
             try:
-                job_queue_states \
-                    = get_queue_adapter(cluster, conn).job_statuses(jobs)
-
-                new_states = set()
-                for (job, state) in job_queue_states:
-                    job_id = job['_id']
-                    # First get the current status
-                    status_url = '%s/jobs/%s/status' % (
-                        cumulus.config.girder.baseUrl, job_id)
-                    r = requests.get(status_url, headers=headers)
-                    check_status(r)
-                    current_status = r.json()['status']
-
-                    if current_status == JobState.TERMINATED:
-                        continue
-
-                    job_status = from_string(current_status, task=task,
-                                             cluster=cluster, job=job,
-                                             log_write_url=log_write_url,
-                                             girder_token=girder_token,
-                                             conn=conn)
-                    job_status = job_status.next(state)
-                    job['status'] = str(job_status)
-                    job_status.run()
-                    json = {
-                        'status': str(job_status),
-                        'timings': job.get('timings', {}),
-                        'output': job['output']
-                    }
-                    job_url = '%s/jobs/%s' % (cumulus.config.girder.baseUrl,
-                                              job['_id'])
-                    r = requests.patch(job_url, headers=headers, json=json)
-                    check_status(r)
-
-                    new_states.add(job['status'])
-
-                # Now see if we still have jobs to monitor
-                running_states = set(
-                    [JobState.CREATED, JobState.QUEUED,
-                     JobState.RUNNING, JobState.TERMINATING]
-                )
+                active_jobs = _update_job_states(
+                    task, cluster, conn, jobs, log_write_url=log_write_url,
+                    girder_token=girder_token)
 
                 # Do we have any job still in a running state?
-                if new_states & running_states:
-                    task.retry(countdown=monitor_interval)
+                if active_jobs and retry:
+                    countdown = monitor_interval
+                    if countdown is None:
+                        countdown = _next_poll_countdown(active_jobs)
+                    task.retry(countdown=countdown)
+
+                return active_jobs
             except EOFError:
                 # Try again
                 task.retry(countdown=5)
@@ -688,18 +923,188 @@ def _monitor_jobs(task, cluster, jobs, log_write_url=None, girder_token=None,
 
 @monitor.task(bind=True, max_retries=None, throws=(Retry,))
 def monitor_job(task, cluster, job, log_write_url=None, girder_token=None,
-                monitor_interval=5):
+                monitor_interval=None):
     _monitor_jobs(task, cluster, [job], log_write_url, girder_token,
                   monitor_interval=monitor_interval)
 
 
 @monitor.task(bind=True, max_retries=None, throws=(Retry,))
 def monitor_jobs(task, cluster, jobs, log_write_url=None, girder_token=None,
-                 monitor_interval=5):
+                 monitor_interval=None):
     _monitor_jobs(task, cluster, jobs, log_write_url, girder_token,
                   monitor_interval=monitor_interval)
 
 
+# Number of seconds after which a cluster monitor that has stopped renewing
+# its lease is considered dead and can be replaced.
+_monitor_lease_timeout = 120
+
+
+def _acquire_monitor(cluster, owner, girder_token):
+    """
+    Acquire or renew the cluster's monitor lease. Girder keeps the newest
+    token used to acquire the lease, so the token of the most recently
+    submitted job is handed to the monitor holding it.
+
+    :returns Tuple of whether owner holds the lease and the token to use from
+             now on.
+    """
+    headers = {'Girder-Token':  girder_token}
+    url = '%s/clusters/%s/monitor' % (cumulus.config.girder.baseUrl,
+                                      cluster['_id'])
+    params = {
+        'owner': owner,
+        'timeout': _monitor_lease_timeout
+    }
+    r = requests.put(url, headers=headers, params=params)
+    check_status(r)
+    lease = r.json()
+
+    return (lease['acquired'], lease.get('token', girder_token))
+
+
+def _release_monitor(cluster, owner, girder_token):
+    headers = {'Girder-Token':  girder_token}
+    url = '%s/clusters/%s/monitor' % (cumulus.config.girder.baseUrl,
+                                      cluster['_id'])
+    r = requests.delete(url, headers=headers, params={'owner': owner})
+    check_status(r)
+
+
+def _fetch_active_jobs(cluster, girder_token):
+    """
+    Fetch the jobs on the cluster that have been submitted to the scheduler
+    and still need to be monitored.
+    """
+    headers = {'Girder-Token':  girder_token}
+    url = '%s/clusters/%s/jobs' % (cumulus.config.girder.baseUrl,
+                                   cluster['_id'])
+    params = {
+        'status': ','.join(
+            [JobState.QUEUED, JobState.RUNNING, JobState.TERMINATING])
+    }
+    r = requests.get(url, headers=headers, params=params)
+    check_status(r)
+
+    return [job for job in r.json()
+            if AbstractQueueAdapter.QUEUE_JOB_ID in job]
+
+
+def _merge_active_jobs(jobs, active_jobs):
+    """
+    Merge the jobs currently being monitored with the active jobs fetched from
+    Girder. Jobs we are already monitoring are kept ( they carry the timing
+    information ), jobs that are no longer active are dropped and new jobs are
+    added.
+    """
+    active_ids = set([job['_id'] for job in active_jobs])
+    merged = [job for job in jobs if job['_id'] in active_ids]
+    monitored_ids = set([job['_id'] for job in merged])
+
+    for job in active_jobs:
+        if job['_id'] not in monitored_ids:
+            # We only find out about the job on the next poll, so this is
+            # accurate to within one monitor interval.
+            if job['status'] == JobState.QUEUED:
+                job['queuedTime'] = time.time()
+            merged.append(job)
+
+    return merged
+
+
+def _ensure_cluster_monitor(cluster, girder_token, monitor_interval=None):
+    """
+    Start a monitor_cluster_jobs task for the cluster, unless one is already
+    running in which case it will pick up any newly submitted job on its next
+    poll.
+    """
+    owner = uuid.uuid4().hex
+    countdown = monitor_interval
+    if countdown is None:
+        countdown = _poll_schedule(cluster)['initialInterval']
+
+    # If another monitor holds the lease it will pick up our token, which
+    # will expire after its own.
+    (acquired, _) = _acquire_monitor(cluster, owner, girder_token)
+    if acquired:
+        monitor_cluster_jobs.s(
+            cluster, owner, [], girder_token=girder_token,
+            monitor_interval=monitor_interval).apply_async(
+                countdown=countdown)
+
+
+@monitor.task(bind=True, max_retries=None, throws=(Retry,))
+def monitor_cluster_jobs(task, cluster, owner, jobs, girder_token=None,
+                         monitor_interval=None):
+    """
+    Monitor all the active jobs on a cluster using a single scheduler query
+    per poll, so the load on the scheduler depends on the number of clusters
+    rather than the number of jobs. Only the task holding the cluster's
+    monitor lease polls, the set of jobs being monitored is carried between
+    polls in the jobs argument.
+
+    Each job is polled according to its own adaptive schedule, the jobs due
+    at the same time share a scheduler query. The monitor wakes at least
+    every initialInterval to pick up newly submitted jobs.
+
+    :param owner: The id this monitor uses to hold the cluster's lease.
+    :param jobs: The jobs currently being monitored.
+    :param monitor_interval: If provided all jobs are polled at this fixed
+                             interval.
+    """
+    wake_interval = monitor_interval
+    if wake_interval is None:
+        wake_interval = _poll_schedule(cluster)['initialInterval']
+
+    (acquired, girder_token) = _acquire_monitor(cluster, owner, girder_token)
+    if not acquired:
+        # Our lease has expired and another monitor has taken over.
+        return
+
+    jobs[:] = _merge_active_jobs(jobs,
+                                 _fetch_active_jobs(cluster, girder_token))
+
+    if not jobs:
+        _release_monitor(cluster, owner, girder_token)
+
+        # A job may have been submitted between the fetch and the release,
+        # in which case its submit_job would have seen the lease held by us.
+        # So check again and try to take back the lease.
+        if not _fetch_active_jobs(cluster, girder_token) or \
+           not _acquire_monitor(cluster, owner, girder_token)[0]:
+            return
+    else:
+        now = time.time()
+        if monitor_interval is None:
+            due_jobs = [job for job in jobs if job.get('nextPoll', 0) <= now]
+        else:
+            due_jobs = list(jobs)
+
+        if due_jobs:
+            active_jobs = _monitor_jobs(task, cluster, due_jobs,
+                                        girder_token=girder_token,
+                                        retry=False)
+            if active_jobs is None:
+                # We were unable to connect to the cluster
+                _release_monitor(cluster, owner, girder_token)
+                return
+
+            due_ids = set([job['_id'] for job in due_jobs])
+            jobs[:] = [job for job in jobs if job['_id'] not in due_ids] \
+                + active_jobs
+
+    countdown = wake_interval
+    if jobs and monitor_interval is None:
+        countdown = min(_next_poll_countdown(jobs), wake_interval)
+
+    # Pass the token explicitly, we may have switched to a newer one.
+    kwargs = {
+        'girder_token': girder_token,
+        'monitor_interval': monitor_interval
+    }
+    task.retry(args=(cluster, owner, jobs), kwargs=kwargs, countdown=countdown)
+
+
 def upload_job_output_to_item(cluster, job, log_write_url=None, job_dir=None,
                               girder_token=None):
     headers = {'Girder-Token':  girder_token}
@@ -725,6 +1130,14 @@ def upload_job_output_to_item(cluster, job, log_write_url=None, job_dir=None,
                          % (girder_token,
                             cumulus.config.girder.baseUrl, job['_id'])
 
+            # Allow the upload concurrency and chunk size to be tuned
+            upload_config = cumulus.config.get('upload', {})
+            if 'concurrency' in upload_config:
+                upload_cmd += ' --concurrency %d' \
+                    % upload_config['concurrency']
+            if 'chunkSize' in upload_config:
+                upload_cmd += ' --chunk-size %d' % upload_config['chunkSize']
+
             upload_output = '%s.upload.out' % job_id
             upload_output_path = os.path.normpath(os.path.join(job_dir, '..',
                                                                upload_output))
@@ -856,10 +1269,13 @@ def monitor_process(task, cluster, job, pid, nohup_out_path,
                                   source_profile=False)
 
             if len(output) > 0:
-                # Process is still running so schedule self again in about 5
-                # secs
+                # Process is still running so schedule self again, backing
+                # off while it continues to run.
                 # N.B. throw=False to prevent Retry exception being raised
-                task.retry(throw=False, countdown=5)
+                countdown = _poll_interval(_poll_schedule(cluster, job),
+                                           job.get('status'),
+                                           task.request.retries)
+                task.retry(throw=False, countdown=countdown)
             else:
                 try:
                     nohup_out_file_name = os.path.basename(nohup_out_path)
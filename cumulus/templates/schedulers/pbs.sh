@@ -14,5 +14,8 @@
 {% if account -%}
 #PBS -A {{account}}
 {% endif -%}
+{% if arraySize -%}
+#PBS -J 1-{{arraySize}}
+{% endif -%}
 cd $PBS_O_WORKDIR
 
@@ -26,4 +26,7 @@
 {% if qualityOfService -%}
 #SBATCH --qos={{qualityOfService}}
 {% endif -%}
+{% if arraySize -%}
+#SBATCH --array=1-{{arraySize}}
+{% endif -%}
 
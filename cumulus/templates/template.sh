@@ -8,8 +8,19 @@
 #
 {% include "schedulers/" + cluster.config.scheduler.type + ".sh" -%}
 
-{% for command in job.commands %}
+{% for command in commands %}
 {{ command -}}
 {% endfor %}
+{%- if arrayCommands %}
+case "${{arrayTaskId}}" in
+{% for task_commands in arrayCommands -%}
+{{ loop.index }})
+{% for command in task_commands -%}
+{{ command }}
+{% endfor -%}
+;;
+{% endfor -%}
+esac
+{%- endif %}
 
 
@@ -17,15 +17,90 @@
 #  limitations under the License.
 ###############################################################################
 
+import os
+import stat
+
+from six.moves import shlex_quote
+
+from .metadata import metadata_cache, cluster_key
+
+# Output format used by find to describe each path below the root in a walk.
+# Records are NUL terminated and the path is last so it may contain anything.
+_walk_format = r'%y %m %s %U %G %T@ %P\0'
+
+_walk_types = {
+    'f': stat.S_IFREG,
+    'd': stat.S_IFDIR,
+    'l': stat.S_IFLNK,
+    'p': stat.S_IFIFO,
+    's': stat.S_IFSOCK,
+    'c': stat.S_IFCHR,
+    'b': stat.S_IFBLK
+}
+
+
+def walk_command(root, find='find'):
+    """
+    :params root: The path to walk.
+    :params find: The find executable to use.
+    :returns The command that will list all the paths below root in one go.
+    """
+    return '%s %s -mindepth 1 -printf %s' % (find, shlex_quote(root),
+                                             shlex_quote(_walk_format))
+
+
+def parse_walk_record(record):
+    """
+    Parse a record output by the walk_command.
+
+    :params record: A single NUL stripped record.
+    :returns The path entry in the same form as list(...) with the addition of
+             the path relative to the root.
+    """
+    (type, perms, size, user, group, date, path) = record.split(' ', 6)
+
+    return {
+        'name': os.path.basename(path),
+        'path': path,
+        'user': int(user),
+        'group': int(group),
+        'mode': _walk_types.get(type, 0) | int(perms, 8),
+        'date': int(float(date)),
+        'size': int(size)
+    }
+
 
 class AbstractConnection(object):
 
+    def home_dir(self):
+        """
+        Returns the user's home directory on the cluster, this is cached per
+        cluster so only needs to be fetched once.
+        """
+        def fetch():
+            output = [line.strip() for line in self.execute('pwd')
+                      if line.strip()]
+            if len(output) != 1:
+                raise Exception('Unable to fetch users home directory.')
+
+            return output[0]
+
+        return metadata_cache().get(cluster_key(self._cluster), 'homeDir',
+                                    fetch)
+
     def execute(self, command, ignore_exit_status=False, source_profile=True):
         raise NotImplementedError('Implemented by subclass')
 
     def get(self, remote_path):
         raise NotImplementedError('Implemented by subclass')
 
+    def read(self, remote_path, offset=0):
+        """
+        Returns the contents of a file starting at byte offset, or None if
+        the file doesn't exist.
+        """
+        raise NotImplementedError('Implemented by subclass')
+
     def isfile(self, remote_path):
         raise NotImplementedError('Implemented by subclass')
 
@@ -58,3 +133,23 @@ class AbstractConnection(object):
         }
         """
         raise NotImplementedError('Implemented by subclass')
+
+    def walk(self, root):
+        """
+        Returns all the paths below root, as objects of the same form as
+        list(...) with the addition of 'path', the path relative to root.
+        Subclasses should override this to fetch the tree in a single round
+        trip, this implementation lists each directory in turn.
+        """
+        dirs = ['']
+        while dirs:
+            dir = dirs.pop()
+            for p in self.list(os.path.join(root, dir)):
+                if p['name'] in ['.', '..']:
+                    continue
+
+                p['path'] = os.path.join(dir, p['name'])
+                yield p
+
+                if stat.S_ISDIR(p['mode']):
+                    dirs.append(p['path'])
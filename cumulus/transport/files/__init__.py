@@ -17,7 +17,7 @@
 #  limitations under the License.
 ###############################################################################
 import requests
-from jsonpath_rw import parse
+from cumulus.common.jsonpath import parse
 
 import cumulus
 from cumulus.common import check_status
@@ -22,6 +22,9 @@ import stat
 import json
 import re
 import six
+import collections
+import threading
+from multiprocessing.pool import ThreadPool
 
 from girder_client import GirderClient
 
@@ -29,6 +32,10 @@ import cumulus
 from cumulus.transport import get_connection
 from cumulus.transport.files import get_assetstore_url_base, get_assetstore_id
 
+default_import_concurrency = 4
+# The number of files to register with the assetstore in each request
+import_batch_size = 500
+
 
 def _include(path, includes, excludes):
     """
@@ -118,9 +125,152 @@ def _ensure_path(girder_client, girder_folders, parent, path):
     return parent_id
 
 
+class _Importer(object):
+    """
+    Imports the files found under a cluster path into Girder. The cluster
+    connection can't be shared between threads, so all access to it is
+    serialized. The folder lock makes sure that workers importing files into
+    the same directory don't both create its Girder folder.
+    """
+
+    def __init__(self, cluster_connection, girder_client, parent, root_path,
+                 assetstore_url, assetstore_id, girder_folders):
+        self._cluster_connection = cluster_connection
+        self._girder_client = girder_client
+        self._parent = parent
+        self._root_path = root_path
+        self._assetstore_url = assetstore_url
+        self._assetstore_id = assetstore_id
+        self._girder_folders = girder_folders
+        self.connection_lock = threading.Lock()
+        self._folders_lock = threading.Lock()
+
+    def _folder_id(self, path):
+        # Create any folders we might need
+        if path == '.':
+            return self._parent
+
+        folder_id = self._girder_folders.get(path)
+        if folder_id is None:
+            with self._folders_lock:
+                folder_id = _ensure_path(self._girder_client,
+                                         self._girder_folders, self._parent,
+                                         path)
+
+        return folder_id
+
+    def register_files(self, batch):
+        """
+        Register a batch of files with the assetstore using a single request.
+
+        :param batch: List of (directory relative to root path, file) tuples.
+        """
+        body = []
+        for (path, p) in batch:
+            full_path = os.path.normpath(os.path.join(path, p['name']))
+            body.append({
+                'folderId': self._folder_id(path),
+                'name': p['name'],
+                'size': p['size'],
+                'path': os.path.join(self._root_path, full_path)
+            })
+
+        url = '%s/%s/files/bulk' % (self._assetstore_url, self._assetstore_id)
+        self._girder_client.post(url, data=json.dumps(body))
+
+    def upload_files(self, batch):
+        """
+        Upload the data of a batch of files to Girder, a file at a time.
+
+        :param batch: List of (directory relative to root path, file) tuples.
+        """
+        for (path, p) in batch:
+            name = p['name']
+            full_path = os.path.normpath(os.path.join(path, name))
+            item = self._girder_client.createItem(self._folder_id(path), name,
+                                                  '')
+            cluster_path = os.path.normpath(
+                os.path.join(self._root_path, full_path))
+            with self.connection_lock:
+                with self._cluster_connection.get(cluster_path) as stream:
+                    self._girder_client.uploadFile(
+                        item['_id'], stream, name, p['size'],
+                        parentType='item')
+
+    def files(self, path, include, exclude):
+        """
+        Generator yielding (directory relative to root path, file) for each of
+        the files to import under path. The whole tree is fetched using a
+        single walk of the cluster path, we still take the connection lock
+        while reading it as the walk may be streamed over the same connection
+        the workers are using.
+        """
+        entries = self._cluster_connection.walk(
+            os.path.normpath(os.path.join(self._root_path, path)))
+        while True:
+            with self.connection_lock:
+                p = next(entries, None)
+            if p is None:
+                break
+
+            if stat.S_ISDIR(p['mode']):
+                continue
+
+            full_path = os.path.normpath(os.path.join(path, p['path']))
+
+            # Should we include this path?
+            if _include(full_path, include, exclude):
+                # Pass on the directory this file is in relative to root_path
+                yield (os.path.dirname(full_path) or '.', p)
+
+
+class _BatchRunner(object):
+    """
+    Runs a function on batches of work using a pool of concurrency threads.
+    The number of batches waiting to be run is bounded, so callers don't read
+    all their work into memory ahead of the workers.
+
+    :param func: The function to call with each batch.
+    :param concurrency: The number of threads, batches are run in the calling
+                        thread if this is 1.
+    """
+
+    def __init__(self, func, concurrency):
+        self._func = func
+        self._pool = None
+        if concurrency > 1:
+            self._pool = ThreadPool(concurrency)
+        self._max_pending = 2 * concurrency
+        self._pending = collections.deque()
+
+    def submit(self, batch):
+        if self._pool is None:
+            self._func(batch)
+            return
+
+        self._pending.append(self._pool.apply_async(self._func, (batch,)))
+        while len(self._pending) > self._max_pending:
+            self._pending.popleft().get()
+
+    def wait(self):
+        """
+        Wait for the remaining batches, this will also raise any error.
+        """
+        while self._pending:
+            self._pending.popleft().get()
+
+    def close(self, terminate=False):
+        if self._pool is not None:
+            if terminate:
+                self._pool.terminate()
+            self._pool.close()
+            self._pool.join()
+
+
 def _import_path(cluster_connection, girder_client, parent, root_path,
                  assetstore_url, assetstore_id, upload=False,
-                 include=None, exclude=None, path='.', girder_folders=None):
+                 include=None, exclude=None, path='.', girder_folders=None,
+                 concurrency=1):
     """
     :params cluster_connection: The cluster connection to access the cluster.
     :params girder_client: The Girder client to use to access Girder.
@@ -133,6 +283,9 @@ def _import_path(cluster_connection, girder_client, parent, root_path,
     :params include: List of include regexs
     :params exclude: List of exclude regexs,
     :params path: The current subdirectory of root_path that is being imported.
+    :params girder_folders: A map of paths to existing Girder folder ids.
+    :params concurrency: The number of requests to make to Girder in
+                         parallel, the default is 1.
     """
     if girder_folders is None:
         girder_folders = {}
@@ -140,60 +293,42 @@ def _import_path(cluster_connection, girder_client, parent, root_path,
     if root_path[0] != '/':
         # If we don't have a full path, assume the path is relative to the users
         # home directory.
-        home = cluster_connection.execute('pwd')[0]
+        home = cluster_connection.home_dir()
         root_path = os.path.abspath(os.path.join(home, root_path))
 
-    cluster_path = os.path.normpath(os.path.join(root_path, path))
-    for p in cluster_connection.list(cluster_path):
-        name = p['name']
+    importer = _Importer(cluster_connection, girder_client, parent, root_path,
+                         assetstore_url, assetstore_id, girder_folders)
 
-        full_path = os.path.normpath(os.path.join(path, name))
-        if name in ['.', '..']:
-            continue
+    # If we are just registering the files with the assetstore we can send
+    # them in batches, uploads have to be done a file at a time.
+    if upload:
+        runner = _BatchRunner(importer.upload_files, concurrency)
+        batch_size = 1
+    else:
+        runner = _BatchRunner(importer.register_files, concurrency)
+        batch_size = import_batch_size
 
-        if stat.S_ISDIR(p['mode']):
-            _import_path(cluster_connection, girder_client, parent,
-                         root_path, assetstore_url, assetstore_id,
-                         upload=upload, path=full_path,
-                         include=include,
-                         exclude=exclude, girder_folders=girder_folders)
-        else:
+    terminate = True
+    try:
+        batch = []
+        for f in importer.files(path, include, exclude):
+            batch.append(f)
+            if len(batch) >= batch_size:
+                runner.submit(batch)
+                batch = []
 
-            # Should we include this path?
-            if not _include(full_path, include, exclude):
-                continue
-
-            # Create any folders we might need
-            if path == '.':
-                folder_id = parent
-            else:
-                folder_id = _ensure_path(girder_client, girder_folders, parent,
-                                         path)
+        if batch:
+            runner.submit(batch)
 
-            size = p['size']
-            item = girder_client.createItem(folder_id, name, '')
-
-            if not upload:
-
-                url = '%s/%s/files' % (assetstore_url, assetstore_id)
-                body = {
-                    'name': name,
-                    'itemId': item['_id'],
-                    'size': size,
-                    'path': os.path.join(root_path, full_path)
-                }
-                girder_client.post(url, data=json.dumps(body))
-            else:
-                cluster_path = os.path.normpath(
-                    os.path.join(root_path, full_path))
-                with cluster_connection.get(cluster_path) as stream:
-                    girder_client.uploadFile(item['_id'], stream, name, size,
-                                             parentType='item')
+        runner.wait()
+        terminate = False
+    finally:
+        runner.close(terminate)
 
 
 def download_path(cluster_connection, girder_token, parent, path,
                   assetstore_url, assetstore_id, upload=False, include=None,
-                  exclude=None):
+                  exclude=None, concurrency=None):
     """
     Download a given path on a cluster into an assetstore.
 
@@ -207,13 +342,20 @@ def download_path(cluster_connection, girder_token, parent, path,
                     the metadata, the default is False.
     :params include: List of include regexs
     :params exclude: List of exclude regexs,
+    :params concurrency: The number of files to import in parallel, defaults
+                         to the import concurrency in the configuration.
     """
     girder_client = GirderClient(apiUrl=cumulus.config.girder.baseUrl)
     girder_client.token = girder_token
 
+    if concurrency is None:
+        import_config = cumulus.config.get('import', {})
+        concurrency = import_config.get('concurrency',
+                                        default_import_concurrency)
+
     _import_path(cluster_connection, girder_client, parent, path,
                  assetstore_url, assetstore_id, upload=upload, include=include,
-                 exclude=exclude)
+                 exclude=exclude, concurrency=concurrency)
 
 
 def download_path_from_cluster(cluster, girder_token, parent, path,
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright 2016 Kitware Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+
+import threading
+import time
+
+import cumulus
+from cumulus.common.jsonpath import get_property
+
+
+def cluster_key(cluster):
+    """
+    :returns The key identifying the cluster ( and user ) metadata is cached
+             for.
+    """
+    return (str(cluster.get('_id')), get_property('config.host', cluster),
+            get_property('config.ssh.user', cluster))
+
+
+class ClusterMetadataCache(object):
+    """
+    A per worker process cache of values that rarely change for a cluster,
+    such as the user's home directory or the number of slots in a parallel
+    environment. This saves running a remote command to fetch them on every
+    submission.
+
+    :param ttl: Number of seconds a value is cached for.
+    """
+
+    def __init__(self, ttl=3600):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def get(self, key, name, fetch):
+        """
+        Returns the cached value of name for the cluster, calling fetch() to
+        get the value if it isn't cached or has expired.
+
+        :param key: The cluster key, see cluster_key(...).
+        :param name: The name of the value, for example 'homeDir'.
+        :param fetch: Function returning the current value.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._values.get((key, name))
+
+        if entry is not None and now - entry[1] <= self._ttl:
+            return entry[0]
+
+        value = fetch()
+        with self._lock:
+            self._values[(key, name)] = (value, now)
+
+        return value
+
+    def invalidate(self, key):
+        """
+        Remove all the values cached for a cluster.
+        """
+        with self._lock:
+            for k in [k for k in self._values if k[0] == key]:
+                del self._values[k]
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+
+    def __len__(self):
+        return len(self._values)
+
+
+_cache = None
+
+
+def metadata_cache():
+    """
+    Returns the cache for this process, created on first use using the
+    metadataCache section of the cumulus configuration.
+    """
+    global _cache
+
+    if _cache is None:
+        config = cumulus.config.get('metadataCache', {})
+        _cache = ClusterMetadataCache(ttl=config.get('ttl', 3600))
+
+    return _cache
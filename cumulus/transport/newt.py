@@ -25,11 +25,10 @@ import re
 import requests
 from paramiko import SFTPAttributes
 
-from jsonpath_rw import parse
-
-from .abstract import AbstractConnection
+from .abstract import AbstractConnection, walk_command, parse_walk_record
 import cumulus
 from cumulus.common import check_status
+from cumulus.common.jsonpath import parse
 
 NEWT_BASE_URL = 'https://newt.nersc.gov/newt'
 
@@ -44,8 +43,10 @@ commands = {
     'rm': '/bin/rm',
     'pwd': '/bin/pwd',
     'tail': '/usr/bin/tail',
+    'find': '/usr/bin/find',
     # This may be very machine dependant!
-    'squeue': '/opt/slurm/default/bin/squeue'
+    'squeue': '/opt/slurm/default/bin/squeue',
+    'sacct': '/opt/slurm/default/bin/sacct'
 }
 
 type = {
@@ -107,6 +108,12 @@ class NewtClusterConnection(AbstractConnection):
         pass
 
     def execute(self, command, ignore_exit_status=False, source_profile=True):
+        return self._command(command, source_profile).split('\n')
+
+    def _command(self, command, source_profile=True):
+        """
+        Run a command using NEWT, returning its raw output.
+        """
         url = '%s/command/%s' % (NEWT_BASE_URL, self._machine)
 
         # NEWT requires all commands are issued using a full executable path
@@ -125,7 +132,7 @@ class NewtClusterConnection(AbstractConnection):
         if json_response['error']:
             raise NewtException(json_response['error'])
 
-        return json_response['output'].split('\n')
+        return json_response['output']
 
     @contextmanager
     def get(self, remote_path):
@@ -144,6 +151,21 @@ class NewtClusterConnection(AbstractConnection):
             if r:
                 r.close()
 
+    def read(self, remote_path, offset=0):
+        if not self.isfile(remote_path):
+            return None
+
+        with self.get(remote_path) as fp:
+            # NEWT doesn't support reading part of a file, so skip over the
+            # start of the stream.
+            while offset > 0:
+                skipped = len(fp.read(min(offset, 64 * 1024)))
+                if not skipped:
+                    break
+                offset -= skipped
+
+            return fp.read()
+
     def isfile(self, remote_path):
         try:
             s = self.stat(remote_path)
@@ -169,11 +191,6 @@ class NewtClusterConnection(AbstractConnection):
 
         return self.execute(command)
 
-    def _home_dir(self):
-        home = self.execute('pwd')[0]
-
-        return home
-
     def put(self, stream, remote_path):
 
         name = os.path.basename(remote_path)
@@ -182,7 +199,7 @@ class NewtClusterConnection(AbstractConnection):
         # If not a full path then assume relative to users home
         if path[0] != '/':
             # Get the users home directory
-            path = os.path.abspath(os.path.join(self._home_dir(), path))
+            path = os.path.abspath(os.path.join(self.home_dir(), path))
 
         files = {
             'file': (name, stream)
@@ -243,7 +260,7 @@ class NewtClusterConnection(AbstractConnection):
     def list(self, remote_path):
         if remote_path[0] != '/':
             # Get the users home directory
-            remote_path = os.path.abspath(os.path.join(self._home_dir(),
+            remote_path = os.path.abspath(os.path.join(self.home_dir(),
                                                        remote_path))
 
         url = '%s/file/%s/%s' % (NEWT_BASE_URL, self._machine, remote_path)
@@ -260,6 +277,20 @@ class NewtClusterConnection(AbstractConnection):
             path['mode'] = self._perms_to_mode(perms)
             yield path
 
+    def walk(self, root):
+        """
+        Walk the tree using a single find command rather than a NEWT file
+        request per directory.
+        """
+        if root[0] != '/':
+            # Get the users home directory
+            root = os.path.abspath(os.path.join(self.home_dir(), root))
+
+        output = self._command(walk_command(root), source_profile=False)
+        for record in output.split('\0'):
+            if record:
+                yield parse_walk_record(record)
+
     @property
     def session_id(self):
         """
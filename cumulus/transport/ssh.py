@@ -19,11 +19,15 @@
 
 import os
 from contextlib import contextmanager
+import errno
+import socket
 import stat
-from jsonpath_rw import parse
+import threading
+import time
 
-from .abstract import AbstractConnection
+from .abstract import AbstractConnection, walk_command, parse_walk_record
 import cumulus
+from cumulus.common.jsonpath import parse
 
 from paramiko.client import SSHClient
 from paramiko import RSAKey
@@ -39,20 +43,173 @@ class SshCommandException(Exception):
         self.output = output
 
 
+# Exceptions that indicate the underlying transport is no longer usable, a
+# client that raised one of these is closed rather than returned to the pool.
+# N.B. IOError is not included as SFTP reports missing files etc. using it,
+# any other dead transport will be caught by the liveness check on checkout.
+_connection_errors = (EOFError, paramiko.SSHException)
+
+
+def _is_alive(client):
+    transport = client.get_transport()
+    if transport is None or not transport.is_active():
+        return False
+
+    try:
+        transport.send_ignore()
+    except (EOFError, socket.error, paramiko.SSHException):
+        return False
+
+    return True
+
+
+class SshConnectionPool(object):
+    """
+    A per worker process pool of connected SSHClient instances keyed by
+    (cluster id, host, user). Clients are checked out exclusively by
+    SshClusterConnection.__enter__ and returned in __exit__, so repeated
+    "with get_connection(...)" blocks reuse a warm transport rather than
+    performing a new TCP connect, key exchange and private key load.
+
+    :param max_size: The maximum number of idle clients to keep, the least
+                     recently used client is closed when this is exceeded.
+    :param idle_timeout: Number of seconds a client can remain idle before it
+                         is closed.
+    """
+
+    def __init__(self, max_size=10, idle_timeout=300):
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        # List of (key, client, last_used) tuples, least recently used first.
+        self._idle = []
+        self._pid = os.getpid()
+
+    def _check_pid(self):
+        # Connections must not be shared across a fork ( celery prefork ), the
+        # child just forgets about the parent's clients.
+        if self._pid != os.getpid():
+            self._idle = []
+            self._pid = os.getpid()
+
+    def _expired(self):
+        now = time.time()
+        expired = [c for (_, c, last_used) in self._idle
+                   if now - last_used > self._idle_timeout]
+        self._idle = [e for e in self._idle
+                      if now - e[2] <= self._idle_timeout]
+
+        return expired
+
+    def _close(self, clients):
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+    def _pop(self, key):
+        with self._lock:
+            self._check_pid()
+            expired = self._expired()
+            client = None
+            # Take the most recently used client, it is the most likely to
+            # still be alive.
+            for i in range(len(self._idle) - 1, -1, -1):
+                if self._idle[i][0] == key:
+                    client = self._idle.pop(i)[1]
+                    break
+
+        self._close(expired)
+
+        return client
+
+    def acquire(self, key, connect):
+        """
+        Check out a live client for key, calling connect() to create a new one
+        if the pool has no live client available.
+        """
+        while True:
+            client = self._pop(key)
+            if client is None:
+                return connect()
+            if _is_alive(client):
+                return client
+
+            self._close([client])
+
+    def release(self, key, client, discard=False):
+        """
+        Return a client to the pool. If discard is True, or the client is no
+        longer alive, it is closed instead.
+        """
+        if discard or self._max_size < 1 or not _is_alive(client):
+            self._close([client])
+            return
+
+        with self._lock:
+            self._check_pid()
+            self._idle.append((key, client, time.time()))
+            evicted = self._expired()
+            while len(self._idle) > self._max_size:
+                evicted.append(self._idle.pop(0)[1])
+
+        self._close(evicted)
+
+    def clear(self):
+        """
+        Close all idle clients.
+        """
+        with self._lock:
+            self._check_pid()
+            idle = [c for (_, c, _) in self._idle]
+            self._idle = []
+
+        self._close(idle)
+
+    def __len__(self):
+        return len(self._idle)
+
+
+_pool = None
+
+
+def connection_pool():
+    """
+    Returns the pool for this process, created on first use using the
+    ssh.pool section of the cumulus configuration.
+    """
+    global _pool
+
+    if _pool is None:
+        config = cumulus.config.get('ssh', {}).get('pool', {})
+        _pool = SshConnectionPool(max_size=config.get('maxSize', 10),
+                                  idle_timeout=config.get('idleTimeout', 300))
+
+    return _pool
+
+
 class SshClusterConnection(AbstractConnection):
     def __init__(self, girder_token, cluster):
         self._girder_token = girder_token
         self._cluster = cluster
+        self._client = None
+        self._sftp_client = None
 
     def _load_rsa_key(self, path, passphrase):
         return RSAKey.from_private_key_file(path, password=passphrase)
 
-    def __enter__(self):
-        self._client = SSHClient()
-        self._client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
+    def _pool_key(self):
         username = parse('config.ssh.user').find(self._cluster)[0].value
         hostname = parse('config.host').find(self._cluster)[0].value
+
+        return (self._cluster.get('_id'), hostname, username)
+
+    def _connect(self):
+        client = SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+        (_, hostname, username) = self._pool_key()
         passphrase \
             = parse('config.ssh.passphrase').find(self._cluster)
         if passphrase:
@@ -66,13 +223,51 @@ class SshClusterConnection(AbstractConnection):
 
         private_key = self._load_rsa_key(key_path, passphrase)
 
-        self._client.connect(hostname=hostname, username=username,
-                             pkey=private_key)
+        client.connect(hostname=hostname, username=username,
+                       pkey=private_key)
+
+        return client
+
+    def __enter__(self):
+        self._key = self._pool_key()
+        self._client = connection_pool().acquire(self._key, self._connect)
 
         return self
 
     def __exit__(self, type, value, traceback):
-        self._client.close()
+        self._close_sftp()
+        discard = type is not None and issubclass(type, _connection_errors)
+        connection_pool().release(self._key, self._client, discard=discard)
+        self._client = None
+
+    def _close_sftp(self):
+        if self._sftp_client is not None:
+            try:
+                self._sftp_client.close()
+            except Exception:
+                pass
+            self._sftp_client = None
+
+    @contextmanager
+    def _sftp(self):
+        """
+        Yields the SFTP client for this connection. The SFTP subsystem channel
+        is opened on first use and then shared by all file operations, if the
+        channel fails it is dropped so the next operation opens a new one.
+        """
+        if self._sftp_client is not None \
+           and self._sftp_client.get_channel().closed:
+            self._close_sftp()
+
+        if self._sftp_client is None:
+            self._sftp_client \
+                = self._client.get_transport().open_sftp_client()
+
+        try:
+            yield self._sftp_client
+        except _connection_errors:
+            self._close_sftp()
+            raise
 
     def execute(self, command, ignore_exit_status=False, source_profile=True):
         if source_profile:
@@ -92,20 +287,33 @@ class SshClusterConnection(AbstractConnection):
 
     @contextmanager
     def get(self, remote_path):
-        sftp = None
         file = None
         try:
-            sftp = self._client.get_transport().open_sftp_client()
-            file = sftp.open(remote_path)
-            yield file
+            with self._sftp() as sftp:
+                file = sftp.open(remote_path)
+                yield file
         finally:
             if file:
                 file.close()
-                sftp.close()
+
+    def read(self, remote_path, offset=0):
+        with self._sftp() as sftp:
+            try:
+                file = sftp.open(remote_path)
+            except IOError as ex:
+                if ex.errno == errno.ENOENT:
+                    return None
+                raise
+
+            try:
+                file.seek(offset)
+                return file.read()
+            finally:
+                file.close()
 
     def isfile(self, remote_path):
 
-        with self._client.get_transport().open_sftp_client() as sftp:
+        with self._sftp() as sftp:
             try:
                 s = sftp.stat(remote_path)
             except IOError:
@@ -114,7 +322,7 @@ class SshClusterConnection(AbstractConnection):
             return stat.S_ISDIR(s.st_mode)
 
     def mkdir(self, remote_path, ignore_failure=False):
-        with self._client.get_transport().open_sftp_client() as sftp:
+        with self._sftp() as sftp:
             try:
                 sftp.mkdir(remote_path)
             except IOError:
@@ -122,7 +330,7 @@ class SshClusterConnection(AbstractConnection):
                     raise
 
     def makedirs(self, remote_path):
-        with self._client.get_transport().open_sftp_client() as sftp:
+        with self._sftp() as sftp:
             current_path = ''
             if remote_path[0] == '/':
                 current_path = '/'
@@ -137,19 +345,19 @@ class SshClusterConnection(AbstractConnection):
                     sftp.mkdir(current_path)
 
     def put(self, stream, remote_path):
-        with self._client.get_transport().open_sftp_client() as sftp:
+        with self._sftp() as sftp:
             sftp.putfo(stream, remote_path)
 
     def stat(self, remote_path):
-        with self._client.get_transport().open_sftp_client() as sftp:
+        with self._sftp() as sftp:
             return sftp.stat(remote_path)
 
     def remove(self, remote_path):
-        with self._client.get_transport().open_sftp_client() as sftp:
+        with self._sftp() as sftp:
             return sftp.remove(remote_path)
 
     def list(self, remote_path):
-        with self._client.get_transport().open_sftp_client() as sftp:
+        with self._sftp() as sftp:
             for path in sftp.listdir_iter(remote_path):
                 yield {
                     'name': path.filename,
@@ -160,3 +368,31 @@ class SshClusterConnection(AbstractConnection):
                     'date': path.st_mtime,
                     'size': path.st_size
                 }
+
+    def walk(self, root):
+        """
+        Walk the tree using a single find command, the output is streamed
+        back so large trees are not held in memory.
+        """
+        command = walk_command(root)
+        chan = self._client.get_transport().open_session()
+        try:
+            chan.exec_command(command)
+            stdout = chan.makefile('rb', -1)
+
+            buf = b''
+            while True:
+                data = stdout.read(32 * 1024)
+                if not data:
+                    break
+                records = (buf + data).split(b'\0')
+                buf = records.pop()
+                for record in records:
+                    yield parse_walk_record(record.decode('utf8'))
+
+            exit_code = chan.recv_exit_status()
+            if exit_code != 0:
+                output = chan.makefile_stderr('r', -1).readlines()
+                raise SshCommandException(command, exit_code, output)
+        finally:
+            chan.close()
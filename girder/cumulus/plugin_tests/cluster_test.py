@@ -21,6 +21,7 @@ from tests import base
 import json
 import mock
 from bson.objectid import ObjectId
+from girder.constants import AccessType
 
 from cumulus.transport.files import get_assetstore_url_base
 from cumulus.testing import AssertCallsMixin
@@ -590,6 +591,129 @@ class ClusterTestCase(AssertCallsMixin, base.TestCase):
 
         self.assertCalls(submit.call_args_list, expected_submit_call)
 
+    @mock.patch('cumulus.tasks.job.submit')
+    def test_jobs_and_monitor(self, submit):
+        body = {
+            'profileId': str(self._user_profile['_id']),
+            'name': 'test'
+        }
+
+        json_body = json.dumps(body)
+
+        r = self.request('/clusters', method='POST',
+                         type='application/json', body=json_body, user=self._user)
+        self.assertStatus(r, 201)
+        cluster_id = r.json['_id']
+
+        r = self.request(
+            '/clusters/%s' % str(cluster_id), method='PATCH',
+            type='application/json', body=json.dumps({'status': 'running'}),
+            user=self._cumulus)
+        self.assertStatusOk(r)
+
+        job_ids = []
+        for name in ['job1', 'job2']:
+            body = {
+                'commands': [''],
+                'name': name
+            }
+            r = self.request('/jobs', method='POST',
+                             type='application/json', body=json.dumps(body),
+                             user=self._user)
+            self.assertStatus(r, 201)
+            job_ids.append(r.json['_id'])
+
+            r = self.request('/clusters/%s/job/%s/submit'
+                             % (str(cluster_id), r.json['_id']), method='PUT',
+                             type='application/json', body='', user=self._user)
+            self.assertStatusOk(r)
+
+        r = self.request('/jobs/%s' % job_ids[0], method='PATCH',
+                         type='application/json',
+                         body=json.dumps({'status': 'queued'}),
+                         user=self._cumulus)
+        self.assertStatusOk(r)
+
+        r = self.request('/clusters/%s/jobs' % str(cluster_id), method='GET',
+                         user=self._cumulus)
+        self.assertStatusOk(r)
+        self.assertEqual(sorted([j['_id'] for j in r.json]), sorted(job_ids))
+        self.assertFalse('log' in r.json[0])
+
+        r = self.request('/clusters/%s/jobs' % str(cluster_id), method='GET',
+                         params={'status': 'queued,running'},
+                         user=self._cumulus)
+        self.assertStatusOk(r)
+        self.assertEqual([j['_id'] for j in r.json], [job_ids[0]])
+
+        # Only one monitor can hold the lease
+        monitor_url = '/clusters/%s/monitor' % str(cluster_id)
+        r = self.request(monitor_url, method='PUT', params={'owner': 'a'},
+                         user=self._cumulus)
+        self.assertStatusOk(r)
+        self.assertTrue(r.json['acquired'])
+
+        r = self.request(monitor_url, method='PUT', params={'owner': 'b'},
+                         user=self._cumulus)
+        self.assertStatusOk(r)
+        self.assertFalse(r.json['acquired'])
+
+        # The owner can renew
+        r = self.request(monitor_url, method='PUT', params={'owner': 'a'},
+                         user=self._cumulus)
+        self.assertStatusOk(r)
+        self.assertTrue(r.json['acquired'])
+
+        # An expired lease can be taken
+        r = self.request(monitor_url, method='PUT',
+                         params={'owner': 'b', 'timeout': -1},
+                         user=self._cumulus)
+        self.assertStatusOk(r)
+        self.assertTrue(r.json['acquired'])
+
+        # Only the owner can release
+        r = self.request(monitor_url, method='DELETE', params={'owner': 'a'},
+                         user=self._cumulus)
+        self.assertStatusOk(r)
+        r = self.request(monitor_url, method='PUT', params={'owner': 'a'},
+                         user=self._cumulus)
+        self.assertFalse(r.json['acquired'])
+
+        r = self.request(monitor_url, method='DELETE', params={'owner': 'b'},
+                         user=self._cumulus)
+        self.assertStatusOk(r)
+        r = self.request(monitor_url, method='PUT', params={'owner': 'a'},
+                         user=self._cumulus)
+        self.assertTrue(r.json['acquired'])
+
+        # The holder is handed the newest token used to acquire the lease
+        token_model = self.model('token')
+        old_token = token_model.createToken(user=self._cumulus, days=1)
+        new_token = token_model.createToken(user=self._cumulus, days=7)
+        r = self.request(monitor_url, method='PUT', params={'owner': 'a'},
+                         token=old_token['_id'])
+        self.assertTrue(r.json['acquired'])
+        self.assertFalse('token' in r.json)
+        r = self.request(monitor_url, method='PUT', params={'owner': 'b'},
+                         token=new_token['_id'])
+        self.assertFalse(r.json['acquired'])
+        r = self.request(monitor_url, method='PUT', params={'owner': 'a'},
+                         token=old_token['_id'])
+        self.assertTrue(r.json['acquired'])
+        self.assertEqual(r.json['token'], new_token['_id'])
+
+        # Tokens are only handed to the same user
+        self.model('cluster', 'cumulus').setUserAccess(
+            self.model('cluster', 'cumulus').load(cluster_id, force=True),
+            self._another_user, AccessType.WRITE, save=True)
+        another_token = token_model.createToken(user=self._another_user,
+                                                days=1)
+        r = self.request(monitor_url, method='PUT',
+                         params={'owner': 'c', 'timeout': -1},
+                         token=another_token['_id'])
+        self.assertTrue(r.json['acquired'])
+        self.assertFalse('token' in r.json)
+
     @mock.patch('cumulus.ansible.tasks.cluster.terminate_cluster.delay')
     def test_terminate(self, terminate_cluster):
 
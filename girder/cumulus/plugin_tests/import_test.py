@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright 2016 Kitware Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+
+import six
+
+from tests import base
+from cumulus.common.girder import create_imported_files
+
+
+def setUpModule():
+    base.enabledPlugins.append('cumulus')
+    base.startServer()
+
+
+def tearDownModule():
+    base.stopServer()
+
+
+class ImportTestCase(base.TestCase):
+
+    def setUp(self):
+        super(ImportTestCase, self).setUp()
+
+        self._user = self.model('user').createUser(
+            email='regularuser@email.com', login='regularuser',
+            firstName='First', lastName='Last', password='goodpassword')
+
+        self._folder = six.next(self.model('folder').childFolders(
+            self._user, parentType='user', force=True, filters={
+                'name': 'Public'
+            }))
+        self._folder_id = str(self._folder['_id'])
+
+    def _file(self, name, size, path=None):
+        return {
+            'folderId': self._folder_id,
+            'name': name,
+            'size': size,
+            'path': path or '/data/%s' % name
+        }
+
+    def _folder_size(self):
+        return self.model('folder').load(self._folder['_id'],
+                                         force=True)['size']
+
+    def test_new_files(self):
+        files = [self._file(' a.txt ', 10, path='/data/a.txt'),
+                 self._file('b.txt', 20)]
+        results = create_imported_files(self.assetstore, self._user, files)
+        self.assertEqual(len(results), 2)
+
+        for (result, name, size) in zip(results, ['a.txt', 'b.txt'],
+                                        [10, 20]):
+            item = self.model('item').load(result['itemId'], force=True)
+            self.assertEqual(item['name'], name)
+            self.assertEqual(item['lowerName'], name)
+            self.assertEqual(item['meta'], {})
+            self.assertEqual(item['size'], size)
+
+            file = self.model('file').load(result['fileId'], force=True)
+            self.assertEqual(file['itemId'], item['_id'])
+            self.assertEqual(file['name'], name)
+            self.assertEqual(file['size'], size)
+            self.assertEqual(file['path'], '/data/%s' % name)
+            self.assertTrue(file['imported'])
+
+        self.assertEqual(self._folder_size(), 30)
+
+    def test_reimport(self):
+        files = [self._file('a.txt', 10)]
+        results = create_imported_files(self.assetstore, self._user, files)
+
+        files = [self._file('a.txt', 10, path='/new/a.txt')]
+        reimported = create_imported_files(self.assetstore, self._user, files)
+
+        # The existing item and file should be reused
+        self.assertEqual(reimported, results)
+        file = self.model('file').load(results[0]['fileId'], force=True)
+        self.assertEqual(file['path'], '/new/a.txt')
+        self.assertEqual(self.model('item').find({
+            'folderId': self._folder['_id']
+        }).count(), 1)
+
+        # The sizes shouldn't change
+        item = self.model('item').load(results[0]['itemId'], force=True)
+        self.assertEqual(item['size'], 10)
+        self.assertEqual(self._folder_size(), 10)
+
+    def test_duplicate_names(self):
+        files = [self._file('a.txt', 10), self._file('a.txt', 10)]
+        results = create_imported_files(self.assetstore, self._user, files)
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(self.model('item').find({
+            'folderId': self._folder['_id']
+        }).count(), 1)
+        self.assertEqual(self.model('file').find({
+            'itemId': results[0]['itemId']
+        }).count(), 1)
+        self.assertEqual(self._folder_size(), 10)
+
+        # A folder with the same name as an item is a conflict
+        self.model('folder').createFolder(
+            parentType='folder', parent=self._folder, creator=self._user,
+            name='b.txt')
+        results = create_imported_files(self.assetstore, self._user,
+                                        [self._file('b.txt', 5)])
+        item = self.model('item').load(results[0]['itemId'], force=True)
+        self.assertEqual(item['name'], 'b.txt (1)')
+
+    def test_item_size(self):
+        # Add a file to an existing item
+        item = self.model('item').createItem(
+            name='a.txt', creator=self._user, folder=self._folder)
+        self.model('file').createFile(
+            creator=self._user, item=item, name='other.txt', size=7,
+            assetstore=self.assetstore)
+        item_size = self.model('item').load(item['_id'], force=True)['size']
+        folder_size = self._folder_size()
+
+        results = create_imported_files(self.assetstore, self._user,
+                                        [self._file('a.txt', 10)])
+        self.assertEqual(results[0]['itemId'], item['_id'])
+
+        # The size of the new file should be added to the item and folder
+        item = self.model('item').load(item['_id'], force=True)
+        self.assertEqual(item['size'], item_size + 10)
+        self.assertEqual(self._folder_size(), folder_size + 10)
@@ -388,6 +388,79 @@ class JobTestCase(base.TestCase):
         self.assertStatusOk(r)
         self.assertEqual(len(r.json['log']), 1)
 
+        r = self.request('/jobs/%s/log' % str(job_id), method='GET',
+                         params={'limit': 1}, user=self._user)
+        self.assertStatusOk(r)
+        self.assertEqual(r.json, expected_log)
+
+        # The log should be stored separately from the job
+        job = self.model('job', 'cumulus').load(job_id, force=True)
+        self.assertNotIn('log', job)
+        self.assertEqual(self.model('log', 'cumulus').find({
+            'resourceType': 'job',
+            'resourceId': job['_id']
+        }).count(), 2)
+
+        # and removed with it
+        self.model('job', 'cumulus').remove(job)
+        self.assertEqual(self.model('log', 'cumulus').find({
+            'resourceType': 'job',
+            'resourceId': job['_id']
+        }).count(), 0)
+
+    def test_append_output(self):
+        body = {
+            'commands': [
+                ''
+            ],
+            'name': 'test',
+            'output': [{
+                'path': 'out.txt',
+                'tail': True
+            }]
+        }
+
+        json_body = json.dumps(body)
+        r = self.request('/jobs', method='POST',
+                         type='application/json', body=json_body,
+                         user=self._user)
+        self.assertStatus(r, 201)
+        job_id = r.json['_id']
+
+        for (content, offset) in [(['line1\n', 'line2\n'], 12),
+                                  (['line3\n'], 18)]:
+            appends = [{
+                'path': 'out.txt',
+                'content': content,
+                'offset': offset
+            }]
+            r = self.request('/jobs/%s/output' % job_id, method='POST',
+                             type='application/json',
+                             body=json.dumps(appends), user=self._user)
+            self.assertStatusOk(r)
+
+        r = self.request('/jobs/%s/output' % job_id, method='GET',
+                         params={'path': 'out.txt'}, user=self._user)
+        self.assertStatusOk(r)
+        self.assertEqual(r.json['content'],
+                         ['line1\n', 'line2\n', 'line3\n'])
+
+        r = self.request('/jobs/%s/output' % job_id, method='GET',
+                         params={'path': 'out.txt', 'offset': 2},
+                         user=self._user)
+        self.assertStatusOk(r)
+        self.assertEqual(r.json['content'], ['line3\n'])
+
+        r = self.request('/jobs/%s' % job_id, method='GET', user=self._user)
+        self.assertStatusOk(r)
+        self.assertEqual(r.json['output'][0]['tailOffset'], 18)
+
+        # Another user can't append
+        r = self.request('/jobs/%s/output' % job_id, method='POST',
+                         type='application/json',
+                         body=json.dumps(appends), user=self._another_user)
+        self.assertStatus(r, 403)
+
     def test_get_status(self):
         body = {
             'onComplete': {
@@ -421,6 +494,75 @@ class JobTestCase(base.TestCase):
         expected_status = {u'status': u'created'}
         self.assertEqual(r.json, expected_status)
 
+    def test_bulk_status_and_update(self):
+        body = {
+            'commands': [
+                ''
+            ],
+            'name': 'test',
+            'output': []
+        }
+
+        job_ids = []
+        for i in range(2):
+            body['name'] = 'test%d' % i
+            json_body = json.dumps(body)
+            r = self.request('/jobs', method='POST',
+                             type='application/json', body=json_body,
+                             user=self._user)
+            self.assertStatus(r, 201)
+            job_ids.append(r.json['_id'])
+
+        r = self.request('/jobs/status', method='GET', user=self._user,
+                         params={'ids': ','.join(job_ids)})
+        self.assertStatusOk(r)
+        expected = {job_id: u'created' for job_id in job_ids}
+        self.assertEqual(r.json, expected)
+
+        # Another user can't see the jobs
+        r = self.request('/jobs/status', method='GET',
+                         user=self._another_user,
+                         params={'ids': ','.join(job_ids)})
+        self.assertStatusOk(r)
+        self.assertEqual(r.json, {})
+
+        updates = [{
+            '_id': job_ids[0],
+            'status': 'running',
+            'timings': {
+                'queued': 10
+            }
+        }, {
+            '_id': job_ids[1],
+            'status': 'queued',
+            'output': [{'path': 'out.txt'}]
+        }]
+        r = self.request('/jobs', method='PATCH', type='application/json',
+                         body=json.dumps(updates), user=self._user)
+        self.assertStatusOk(r)
+
+        r = self.request('/jobs/%s' % job_ids[0], method='GET',
+                         user=self._user)
+        self.assertStatusOk(r)
+        self.assertEqual(r.json['status'], 'running')
+        self.assertEqual(r.json['timings'], {'queued': 10})
+
+        r = self.request('/jobs/%s' % job_ids[1], method='GET',
+                         user=self._user)
+        self.assertStatusOk(r)
+        self.assertEqual(r.json['status'], 'queued')
+        self.assertEqual(r.json['output'], [{'path': 'out.txt'}])
+
+        # Updating a job we don't have access to should fail
+        r = self.request('/jobs', method='PATCH', type='application/json',
+                         body=json.dumps(updates), user=self._another_user)
+        self.assertStatus(r, 404)
+
+        # The body must be a list
+        r = self.request('/jobs', method='PATCH', type='application/json',
+                         body=json.dumps(updates[0]), user=self._user)
+        self.assertStatus(r, 400)
+
     def test_delete(self):
         body = {
             'onComplete': {
@@ -19,7 +19,7 @@
 
 import cherrypy
 import json
-from jsonpath_rw import parse
+from cumulus.common.jsonpath import parse
 
 import cumulus
 import cumulus.aws.ec2.tasks.key
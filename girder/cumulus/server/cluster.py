@@ -19,7 +19,6 @@
 
 import cherrypy
 import json
-from jsonpath_rw import parse
 from bson.objectid import ObjectId
 
 from girder.api import access
@@ -33,7 +32,7 @@ from cumulus.constants import ClusterType, ClusterStatus
 from .utility.cluster_adapters import get_cluster_adapter
 from cumulus.ssh.tasks.key import generate_key_pair
 from cumulus.common import update_dict
-from cumulus.common.jsonpath import get_property
+from cumulus.common.jsonpath import parse, get_property
 
 
 class Cluster(BaseResource):
@@ -51,6 +50,9 @@ class Cluster(BaseResource):
         self.route('GET', (':id', 'status'), self.status)
         self.route('PUT', (':id', 'terminate'), self.terminate)
         self.route('PUT', (':id', 'job', ':jobId', 'submit'), self.submit_job)
+        self.route('GET', (':id', 'jobs'), self.jobs)
+        self.route('PUT', (':id', 'monitor'), self.acquire_monitor)
+        self.route('DELETE', (':id', 'monitor'), self.release_monitor)
         self.route('GET', (':id', ), self.get)
         self.route('DELETE', (':id', ), self.delete)
         self.route('GET', (), self.find)
@@ -432,14 +434,13 @@ class Cluster(BaseResource):
     @access.user
     def log(self, id, params):
         user = self.getCurrentUser()
-        offset = 0
-        if 'offset' in params:
-            offset = int(params['offset'])
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', 0))
 
         if not self._model.load(id, user=user, level=AccessType.READ):
             raise RestException('Cluster not found.', code=404)
 
-        log_records = self._model.log_records(user, id, offset)
+        log_records = self._model.log_records(user, id, offset, limit)
 
         return {'log': log_records}
 
@@ -451,8 +452,12 @@ class Cluster(BaseResource):
             'The cluster to get log entries for.', paramType='path')
         .param(
             'offset',
-            'The offset to start getting entries at.', required=False,
-            paramType='query'))
+            'The sequence number of the entry to start at.', required=False,
+            paramType='query', dataType='integer')
+        .param(
+            'limit',
+            'The maximum number of entries to return.', required=False,
+            paramType='query', dataType='integer'))
 
     @access.user
     def submit_job(self, id, jobId, params):
@@ -482,7 +487,7 @@ class Cluster(BaseResource):
 
         cluster_adapter = get_cluster_adapter(cluster)
         del job['access']
-        del job['log']
+        job.pop('log', None)
         cluster_adapter.submit_job(job)
 
     submit_job.description = (
@@ -500,6 +505,101 @@ class Cluster(BaseResource):
             'The properties to template on submit.', dataType='object',
             paramType='body'))
 
+    @access.user
+    def jobs(self, id, params):
+        user = self.getCurrentUser()
+        cluster = self._model.load(id, user=user, level=AccessType.READ)
+
+        if not cluster:
+            raise RestException('Cluster not found.', code=404)
+
+        status = None
+        if 'status' in params:
+            status = params['status'].split(',')
+
+        job_model = self.model('job', 'cumulus')
+        jobs = job_model.find_by_cluster(user, cluster, status=status)
+
+        for job in jobs:
+            del job['access']
+            job['_id'] = str(job['_id'])
+            job['userId'] = str(job['userId'])
+            job['clusterId'] = str(job['clusterId'])
+
+        return jobs
+
+    jobs.description = (
+        Description('List the jobs that have been submitted to a cluster')
+        .param(
+            'id',
+            'The cluster id.', paramType='path', required=True)
+        .param(
+            'status',
+            'Comma separated list of job statuses to filter by.',
+            paramType='query', required=False)
+        .notes('Internal - Used by Celery tasks'))
+
+    @access.user
+    def acquire_monitor(self, id, params):
+        (user, token) = self.getCurrentUser(returnToken=True)
+        self.requireParams(['owner'], params)
+
+        if not self._model.load(id, user=user, level=AccessType.WRITE):
+            raise RestException('Cluster not found.', code=404)
+
+        timeout = int(params.get('timeout', 120))
+        acquired = self._model.acquire_monitor(id, params['owner'], timeout,
+                                               token)
+        result = {'acquired': acquired}
+
+        # Hand the holder any newer token, so the monitor doesn't stop when
+        # the token it was started with expires.
+        if acquired and token is not None:
+            monitor_token = self._model.monitor_token(id, user)
+            if monitor_token and monitor_token['_id'] != token['_id']:
+                result['token'] = monitor_token['_id']
+
+        return result
+
+    acquire_monitor.description = (
+        Description('Acquire or renew the job monitor lease for a cluster')
+        .param(
+            'id',
+            'The cluster id.', paramType='path', required=True)
+        .param(
+            'owner',
+            'Identifies the monitor taking the lease.', paramType='query',
+            required=True)
+        .param(
+            'timeout',
+            'Number of seconds after which a lease that has not been renewed '
+            'can be taken by another monitor.', paramType='query',
+            required=False, default=120)
+        .notes('Internal - Used by Celery tasks. The response includes the '
+               'token the lease holder should switch to, if there is a newer '
+               'one.'))
+
+    @access.user
+    def release_monitor(self, id, params):
+        user = self.getCurrentUser()
+        self.requireParams(['owner'], params)
+
+        if not self._model.load(id, user=user, level=AccessType.WRITE):
+            raise RestException('Cluster not found.', code=404)
+
+        self._model.release_monitor(id, params['owner'])
+
+    release_monitor.description = (
+        Description('Release the job monitor lease for a cluster')
+        .param(
+            'id',
+            'The cluster id.', paramType='path', required=True)
+        .param(
+            'owner',
+            'Identifies the monitor holding the lease.', paramType='query',
+            required=True)
+        .notes('Internal - Used by Celery tasks'))
+
     @access.user
     def get(self, id, params):
         user = self.getCurrentUser()
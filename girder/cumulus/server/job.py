@@ -35,12 +35,15 @@ class Job(BaseResource):
         super(Job, self).__init__()
         self.resourceName = 'jobs'
         self.route('POST', (), self.create)
+        self.route('PATCH', (), self.update_jobs)
         self.route('PATCH', (':id',), self.update)
+        self.route('GET', ('status',), self.statuses)
         self.route('GET', (':id', 'status'), self.status)
         self.route('PUT', (':id', 'terminate'), self.terminate)
         self.route('POST', (':id', 'log'), self.append_to_log)
         self.route('GET', (':id', 'log'), self.log)
         self.route('GET', (':id', 'output'), self.output)
+        self.route('POST', (':id', 'output'), self.append_output)
         self.route('DELETE', (':id', ), self.delete)
         self.route('GET', (':id',), self.get)
         self.route('GET', (), self.find)
@@ -49,7 +52,7 @@ class Job(BaseResource):
 
     def _clean(self, job):
         del job['access']
-        del job['log']
+        job.pop('log', None)
         job['_id'] = str(job['_id'])
         job['userId'] = str(job['userId'])
 
@@ -100,6 +103,13 @@ class Job(BaseResource):
             if not isinstance(body['output'], list):
                 raise RestException('output must be a list', 400)
 
+        if 'parameterSets' in body:
+            parameter_sets = body['parameterSets']
+            if not isinstance(parameter_sets, list) or not parameter_sets \
+                    or not all(isinstance(p, dict) for p in parameter_sets):
+                raise RestException(
+                    'parameterSets must be a non-empty list of objects', 400)
+
         job = self._model.create(user, body)
 
         cherrypy.response.status = 201
@@ -182,6 +192,15 @@ class Job(BaseResource):
             },
             'onComplete': {
                 '$ref': 'JobOnCompleteParams'
+            },
+            'parameterSets': {
+                'type': 'array',
+                'description': 'Run the job as an array job, with a task '
+                'per parameter set. The parameters of each set are available '
+                'when rendering the commands.',
+                'items': {
+                    'type': 'object'
+                }
             }
         }
     }, 'jobs')
@@ -250,12 +269,16 @@ class Job(BaseResource):
         if 'dir' in body:
             job['dir'] = body['dir']
 
+        if 'taskStates' in body:
+            job['taskStates'] = body['taskStates']
+
         job = self._model.update_job(user, job)
 
         # Don't return the access object
         del job['access']
-        # Don't return the log
-        del job['log']
+        # Don't return the log, only documents created before logs were
+        # moved to their own collection will have one.
+        job.pop('log', None)
 
         return job
 
@@ -280,6 +303,66 @@ class Job(BaseResource):
             paramType='body')
         .notes('Internal - Used by Celery tasks'))
 
+    @access.user
+    def update_jobs(self, params):
+        user = self.getCurrentUser()
+        body = getBodyJson()
+
+        if not isinstance(body, list):
+            raise RestException('A list of job updates must be provided',
+                                code=400)
+
+        for update in body:
+            if '_id' not in update:
+                raise RestException('Each update must include an _id',
+                                    code=400)
+
+        if not self._model.update_jobs(user, body):
+            raise RestException('Job not found.', code=404)
+
+    addModel('JobsUpdateParameters', {
+        'id': 'JobsUpdateParameters',
+        'type': 'array',
+        'items': {
+            'type': 'object',
+            'required': ['_id'],
+            'properties': {
+                '_id': {'type': 'string',
+                        'description': 'The id of the job to update.'},
+                'status': {'$ref': 'JobStatus',
+                           'description': 'The new status. (optional)'},
+                'timings': {'type': 'object',
+                            'description': 'Timings to merge. (optional)'},
+                'output': {'type': 'array',
+                           'description': 'The new output. (optional)'}
+            }
+        }
+    }, 'jobs')
+
+    update_jobs.description = (
+        Description('Update a set of jobs')
+        .param(
+            'body',
+            'The list of updates, one per job.',
+            dataType='JobsUpdateParameters', paramType='body')
+        .notes('Internal - Used by Celery tasks'))
+
+    @access.user
+    def statuses(self, params):
+        user = self.getCurrentUser()
+        self.requireParams(['ids'], params)
+
+        ids = [id for id in params['ids'].split(',') if id]
+
+        return self._model.statuses(user, ids)
+
+    statuses.description = (
+        Description('Get the status of a set of jobs')
+        .param('ids', 'Comma separated list of job ids.', paramType='query',
+               required=True)
+        .notes('Returns an object mapping each job id to its status, jobs '
+               'that can not be found are omitted.'))
+
     @access.user
     def status(self, id, params):
         user = self.getCurrentUser()
@@ -328,16 +411,15 @@ class Job(BaseResource):
     @access.user
     def log(self, id, params):
         user = self.getCurrentUser()
-        offset = 0
-        if 'offset' in params:
-            offset = int(params['offset'])
-
-        job = self._model.load(id, user=user, level=AccessType.READ)
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', 0))
 
-        if not job:
+        if not self._model.load(id, user=user, level=AccessType.READ):
             raise RestException('Job not found.', code=404)
 
-        return {'log': job['log'][offset:]}
+        log_records = self._model.log_records(user, id, offset, limit)
+
+        return {'log': log_records}
 
     log.description = (
         Description('Get log entries for job')
@@ -346,8 +428,12 @@ class Job(BaseResource):
             'The job to get log entries for.', paramType='path')
         .param(
             'offset',
-            'The offset to start getting entries at.', required=False,
-            paramType='query'))
+            'The sequence number of the entry to start at.', required=False,
+            paramType='query', dataType='integer')
+        .param(
+            'limit',
+            'The maximum number of entries to return.', required=False,
+            paramType='query', dataType='integer'))
 
     @access.user
     def output(self, id, params):
@@ -394,6 +480,53 @@ class Job(BaseResource):
             'The offset to start getting entries at.', required=False,
             paramType='query'))
 
+    @access.user
+    def append_output(self, id, params):
+        user = self.getCurrentUser()
+        body = getBodyJson()
+
+        if not isinstance(body, list):
+            raise RestException('A list of output appends must be provided',
+                                code=400)
+
+        for append in body:
+            if 'path' not in append or 'content' not in append:
+                raise RestException('Each append must include a path and '
+                                    'content', code=400)
+
+        if not self._model.append_output(user, id, body):
+            raise RestException('Job not found.', code=404)
+
+    addModel('JobOutputAppends', {
+        'id': 'JobOutputAppends',
+        'type': 'array',
+        'items': {
+            'type': 'object',
+            'required': ['path', 'content'],
+            'properties': {
+                'path': {'type': 'string',
+                         'description': 'The path of the output file.'},
+                'content': {'type': 'array',
+                            'items': {'type': 'string'},
+                            'description': 'The lines to append.'},
+                'offset': {'type': 'integer',
+                           'description': 'The byte offset in the file '
+                           'that has been read up to. (optional)'}
+            }
+        }
+    }, 'jobs')
+
+    append_output.description = (
+        Description('Append content to the output of a job')
+        .param(
+            'id',
+            'The job to append output to.', paramType='path')
+        .param(
+            'body',
+            'The content to append, one entry per output file.',
+            dataType='JobOutputAppends', paramType='body')
+        .notes('Internal - Used by Celery tasks'))
+
     @access.user
     def get(self, id, params):
         user = self.getCurrentUser()
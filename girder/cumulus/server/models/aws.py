@@ -19,7 +19,7 @@
 
 from bson.objectid import ObjectId
 from botocore.exceptions import ClientError, EndpointConnectionError
-from jsonpath_rw import parse
+from cumulus.common.jsonpath import parse
 
 from girder.constants import AccessType
 
@@ -17,7 +17,9 @@
 #  limitations under the License.
 ###############################################################################
 
-from jsonpath_rw import parse
+import datetime
+import time
+from cumulus.common.jsonpath import parse
 from girder.models.model_base import ValidationException
 from bson.objectid import ObjectId, InvalidId
 from girder.constants import AccessType
@@ -143,7 +145,6 @@ class Cluster(BaseModel):
         cluster = {
             'name': name,
             'profileId': profile['_id'],
-            'log': [],
             'status': ClusterStatus.CREATED,
             'config': {
                 'scheduler': {
@@ -166,7 +167,6 @@ class Cluster(BaseModel):
     def create_traditional(self, user, name, config):
         cluster = {
             'name': name,
-            'log': [],
             'status': 'creating',
             'config': config,
             'type': ClusterType.TRADITIONAL
@@ -186,7 +186,6 @@ class Cluster(BaseModel):
             config.setdefault('scheduler', {})['type'] = QueueType.SLURM
         cluster = {
             'name': name,
-            'log': [],
             'status': 'creating',
             'config': config,
             'type': ClusterType.NEWT
@@ -209,13 +208,13 @@ class Cluster(BaseModel):
 
             return new_value
         # Load first to force access check
-        log = mongo_safe_value(record)
+        records = record if isinstance(record, list) else [record]
+        records = [mongo_safe_value(r) for r in records]
         cluster = self.load(id, user=user, level=AccessType.WRITE)
-        self.update({'_id': ObjectId(id)},
-                    {'$push': {
-                        'log': mongo_safe_value(record)
-                    }})
-        send_log_notification('cluster', cluster, log)
+        self.model('log', 'cumulus').extend('cluster', cluster['_id'],
+                                            records)
+        for log in records:
+            send_log_notification('cluster', cluster, log)
 
     def update_status(self, id, status):
         self.update({'_id': ObjectId(id)},
@@ -223,6 +222,90 @@ class Cluster(BaseModel):
                         'status': status
                     }})
 
+    def acquire_monitor(self, id, owner, timeout, token=None):
+        """
+        Acquire ( or renew ) the lease that allows a single job monitor to
+        poll the scheduler on behalf of all jobs running on this cluster. The
+        lease can be taken by another owner if it hasn't been renewed in the
+        last timeout seconds.
+
+        The token that expires last of those used to acquire the lease is kept
+        with it, so the monitor can switch to the token of the most recently
+        submitted job, see monitor_token(...).
+
+        :param token: The token used to make the request.
+        :returns True if owner now holds the lease, False otherwise.
+        """
+        now = time.time()
+        query = {
+            '_id': ObjectId(id),
+            '$or': [
+                {'monitor': {'$exists': False}},
+                {'monitor.owner': owner},
+                {'monitor.heartbeat': {'$lt': now - timeout}}
+            ]
+        }
+        update = {
+            '$set': {
+                'monitor.owner': owner,
+                'monitor.heartbeat': now
+            }
+        }
+
+        result = self.update(query, update, multi=False)
+
+        if token is not None:
+            query = {
+                '_id': ObjectId(id),
+                'monitor.owner': {'$exists': True},
+                '$or': [
+                    {'monitor.token': {'$exists': False}},
+                    {'monitor.tokenExpires': {'$lt': token['expires']}}
+                ]
+            }
+            update = {
+                '$set': {
+                    'monitor.token': token['_id'],
+                    'monitor.tokenExpires': token['expires']
+                }
+            }
+            self.update(query, update, multi=False)
+
+        return result.matched_count > 0
+
+    def monitor_token(self, id, user):
+        """
+        Get the token kept with the cluster's monitor lease, if it is still
+        valid and belongs to user.
+
+        :returns The token, None if there isn't one.
+        """
+        cluster = self.load(id, force=True, fields=['monitor'])
+        token_id = cluster.get('monitor', {}).get('token')
+        if token_id is None:
+            return None
+
+        token = self.model('token').load(token_id, force=True,
+                                         objectId=False)
+        if token is None or token.get('userId') != user['_id'] or \
+                token['expires'] < datetime.datetime.utcnow():
+            return None
+
+        return token
+
+    def release_monitor(self, id, owner):
+        query = {
+            '_id': ObjectId(id),
+            'monitor.owner': owner
+        }
+        update = {
+            '$unset': {
+                'monitor': ''
+            }
+        }
+
+        self.update(query, update, multi=False)
+
     def update_cluster(self, user, cluster):
         # Load first to force access check
         cluster_id = cluster['_id']
@@ -238,13 +321,19 @@ class Cluster(BaseModel):
 
         return self.save(current_cluster)
 
-    def log_records(self, user, id, offset=0):
+    def log_records(self, user, id, offset=0, limit=0):
         # TODO Need to figure out perms a remove this force
         cluster = self.load(id, user=user, level=AccessType.READ)
 
-        return cluster['log'][offset:]
+        return self.model('log', 'cumulus').records('cluster', cluster['_id'],
+                                                    offset, limit)
 
     def delete(self, user, id):
         cluster = self.load(id, user=user, level=AccessType.ADMIN)
 
         self.remove(cluster)
+
+    def remove(self, cluster, **kwargs):
+        self.model('log', 'cumulus').remove_records('cluster', cluster['_id'])
+
+        super(Cluster, self).remove(cluster, **kwargs)
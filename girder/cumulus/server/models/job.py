@@ -17,8 +17,10 @@
 #  limitations under the License.
 ###############################################################################
 
+import six
 from girder.models.model_base import ValidationException
 from bson.objectid import ObjectId
+from pymongo import UpdateOne
 from girder.constants import AccessType
 from .base import BaseModel
 from cumulus.common.girder import send_status_notification, \
@@ -32,7 +34,7 @@ class Job(BaseModel):
 
     def initialize(self):
         self.name = 'jobs'
-        self.ensureIndices(['userId'])
+        self.ensureIndices(['userId', 'clusterId'])
 
     def validate(self, doc):
         if not doc['name']:
@@ -43,7 +45,6 @@ class Job(BaseModel):
     def create(self, user, job):
 
         job['status'] = 'created'
-        job['log'] = []
 
         self.setUserAccess(job, user=user, level=AccessType.ADMIN)
         group = {
@@ -85,12 +86,165 @@ class Job(BaseModel):
 
         return self.save(job)
 
+    def statuses(self, user, ids):
+        """
+        Returns a dict mapping job id to status for a list of job ids, using
+        a single query. Only the jobs the user has write access to are
+        included, the same access needed to get the status of a single job.
+        """
+        query = {
+            '_id': {
+                '$in': [ObjectId(id) for id in ids]
+            }
+        }
+        jobs = self.find(query=query, fields=['status', 'access'])
+        jobs = self.filterResultsByPermission(jobs, user, AccessType.WRITE)
+
+        return {str(job['_id']): job['status'] for job in jobs}
+
+    def update_jobs(self, user, updates):
+        """
+        Apply a list of updates of the form:
+
+        {
+            '_id': <job id>,
+            'status': <status>,
+            'timings': <timings to merge>,
+            'output': <output>
+        }
+
+        The jobs are loaded using a single query and the updates applied using
+        a single bulk write. queueJobId, dir and taskStates can also be
+        updated.
+
+        :returns False if any of the jobs could not be found, in which case no
+                 updates are applied.
+        """
+        query = {
+            '_id': {
+                '$in': [ObjectId(update['_id']) for update in updates]
+            }
+        }
+        jobs = self.find(query=query,
+                         fields={'log': False, 'output.content': False})
+        jobs = self.filterResultsByPermission(jobs, user, AccessType.WRITE)
+        jobs = {str(job['_id']): job for job in jobs}
+
+        operations = []
+        notify = []
+        for update in updates:
+            job = jobs.get(str(update['_id']))
+            if not job:
+                return False
+
+            fields = {}
+            for key in ['status', 'queueJobId', 'output', 'dir', 'taskStates']:
+                if key in update:
+                    fields[key] = update[key]
+
+            for (key, value) in six.iteritems(update.get('timings', {})):
+                fields['timings.%s' % key] = value
+
+            if not fields:
+                continue
+
+            if 'status' in update and job['status'] != update['status']:
+                job['status'] = update['status']
+                notify.append(job)
+
+            operations.append(UpdateOne({'_id': job['_id']}, {'$set': fields}))
+
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+        for job in notify:
+            send_status_notification('job', job)
+
+        return True
+
+    def find_by_cluster(self, user, cluster, status=None):
+        """
+        Returns the jobs that have been submitted to a cluster, optionally
+        filtered by a list of statuses. The log is not loaded.
+        """
+        query = {
+            'clusterId': ObjectId(cluster['_id'])
+        }
+
+        if status:
+            query['status'] = {
+                '$in': status
+            }
+
+        jobs = self.find(query=query,
+                         fields={'log': False, 'output.content': False})
+
+        return list(self.filterResultsByPermission(jobs, user,
+                                                   AccessType.READ))
+
+    def append_output(self, user, id, appends):
+        """
+        Append content to the output files of a job. Each append is of the
+        form:
+
+        {
+            'path': <the output path>,
+            'content': <list of lines to append>,
+            'offset': <byte offset read up to>
+        }
+
+        Only the new content is written, the existing content is not
+        loaded or rewritten.
+
+        :returns False if the job could not be found.
+        """
+        job = self.load(id, user=user, level=AccessType.WRITE,
+                        fields=['access'])
+        if not job:
+            return False
+
+        operations = []
+        for append in appends:
+            update = {
+                '$push': {
+                    'output.$.content': {
+                        '$each': append['content']
+                    }
+                }
+            }
+            if 'offset' in append:
+                update['$set'] = {
+                    'output.$.tailOffset': append['offset']
+                }
+
+            query = {
+                '_id': job['_id'],
+                'output.path': append['path']
+            }
+            operations.append(UpdateOne(query, update))
+
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+        return True
+
     def append_to_log(self, user, _id, record):
+        """
+        Append a record, or a list of records, to the job's log.
+        """
         job = self.load(_id, user=user, level=AccessType.WRITE)
-        self.update({'_id': ObjectId(_id)}, {'$push': {'log': record}})
-        send_log_notification('job', job, record)
+        records = record if isinstance(record, list) else [record]
+        self.model('log', 'cumulus').extend('job', job['_id'], records)
+        for record in records:
+            send_log_notification('job', job, record)
 
-    def log_records(self, user, id, offset=0):
+    def log_records(self, user, id, offset=0, limit=0):
         job = self.load(id, user=user, level=AccessType.READ)
 
-        return job['log'][offset:]
+        return self.model('log', 'cumulus').records('job', job['_id'],
+                                                    offset, limit)
+
+    def remove(self, job, **kwargs):
+        self.model('log', 'cumulus').remove_records('job', job['_id'])
+
+        super(Job, self).remove(job, **kwargs)
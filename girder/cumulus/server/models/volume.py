@@ -18,7 +18,7 @@
 ###############################################################################
 
 from bson.objectid import ObjectId
-from jsonpath_rw import parse
+from cumulus.common.jsonpath import parse
 
 from girder.models.model_base import ValidationException
 from girder.constants import AccessType
@@ -84,8 +84,7 @@ class Volume(BaseModel):
                 'id': None
             },
             'profileId': profileId,
-            'status': VolumeState.CREATED,
-            'log': []
+            'status': VolumeState.CREATED
         }
 
         if fs:
@@ -105,11 +104,22 @@ class Volume(BaseModel):
         return volume
 
     def append_to_log(self, user, id, record):
+        """
+        Append a record, or a list of records, to the volume's log.
+        """
         volume = self.load(id, user=user, level=AccessType.WRITE)
-        self.update({'_id': ObjectId(id)}, {'$push': {'log': record}})
-        send_log_notification('volume', volume, record)
+        records = record if isinstance(record, list) else [record]
+        self.model('log', 'cumulus').extend('volume', volume['_id'], records)
+        for record in records:
+            send_log_notification('volume', volume, record)
 
-    def log_records(self, user, id, offset=0):
+    def log_records(self, user, id, offset=0, limit=0):
         volume = self.load(id, user=user, level=AccessType.READ)
 
-        return volume['log'][offset:]
+        return self.model('log', 'cumulus').records('volume', volume['_id'],
+                                                    offset, limit)
+
+    def remove(self, volume, **kwargs):
+        self.model('log', 'cumulus').remove_records('volume', volume['_id'])
+
+        super(Volume, self).remove(volume, **kwargs)
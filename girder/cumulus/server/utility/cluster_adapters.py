@@ -18,7 +18,6 @@
 ###############################################################################
 
 import base64
-from jsonpath_rw import parse
 
 from girder.utility.model_importer import ModelImporter
 from girder.models.model_base import ValidationException
@@ -29,7 +28,7 @@ from cumulus.common.girder import get_task_token, _get_profile
 import cumulus.tasks.cluster
 import cumulus.tasks.job
 import cumulus.ansible.tasks.cluster
-from cumulus.common.jsonpath import get_property
+from cumulus.common.jsonpath import parse, get_property
 
 
 class AbstractClusterAdapter(ModelImporter):
@@ -301,7 +300,7 @@ class TraditionClusterAdapter(AbstractClusterAdapter):
         # Don't return the access object
         del self.cluster['access']
         # Don't return the log
-        del self.cluster['log']
+        self.cluster.pop('log', None)
         # Don't return the passphrase
         if parse('config.ssh.passphrase').find(self.cluster):
             del self.cluster['config']['ssh']['passphrase']
@@ -352,7 +351,7 @@ class NewtClusterAdapter(AbstractClusterAdapter):
         # Don't return the access object
         del self.cluster['access']
         # Don't return the log
-        del self.cluster['log']
+        self.cluster.pop('log', None)
 
         return self.cluster
 
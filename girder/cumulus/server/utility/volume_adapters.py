@@ -17,7 +17,7 @@
 #  limitations under the License.
 ###############################################################################
 
-from jsonpath_rw import parse
+from cumulus.common.jsonpath import parse
 
 from girder.utility.model_importer import ModelImporter
 from girder.models.model_base import ValidationException
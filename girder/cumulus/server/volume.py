@@ -18,7 +18,7 @@
 ###############################################################################
 
 import cherrypy
-from jsonpath_rw import parse
+from cumulus.common.jsonpath import parse
 from bson.objectid import ObjectId
 
 from girder.api import access
@@ -450,14 +450,13 @@ class Volume(BaseResource):
     @access.user
     def log(self, id, params):
         user = self.getCurrentUser()
-        offset = 0
-        if 'offset' in params:
-            offset = int(params['offset'])
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', 0))
 
         if not self._model.load(id, user=user, level=AccessType.READ):
             raise RestException('Volume not found.', code=404)
 
-        log_records = self._model.log_records(user, id, offset)
+        log_records = self._model.log_records(user, id, offset, limit)
 
         return {'log': log_records}
 
@@ -469,5 +468,9 @@ class Volume(BaseResource):
             'The volume to get log entries for.', paramType='path')
         .param(
             'offset',
-            'The offset to start getting entries at.', required=False,
-            paramType='query'))
+            'The sequence number of the entry to start at.', required=False,
+            paramType='query', dataType='integer')
+        .param(
+            'limit',
+            'The maximum number of entries to return.', required=False,
+            paramType='query', dataType='integer'))
@@ -29,6 +29,8 @@ from girder.utility.model_importer import ModelImporter
 from girder.constants import AssetstoreType, AccessType
 from girder.api.docs import addModel
 
+from cumulus.common.girder import add_create_files_route
+
 from .constants import NEWT_BASE_URL
 
 class Newt(Resource):
@@ -163,6 +165,7 @@ class NewtAssetstore(Resource):
 
         self.route('POST', (), self.create)
         self.route('POST', (':id', 'files'), self.create_file)
+        add_create_files_route(self, 'newt')
 
     @access.user
     @loadmodel(model='assetstore')
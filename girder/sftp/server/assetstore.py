@@ -30,8 +30,32 @@ from girder.api.rest import RestException
 
 from paramiko.ssh_exception import SSHException
 
+import cumulus
+from cumulus.transport.ssh import SshConnectionPool
+
+# The default number of bytes to read from the remote file at a time
+DEFAULT_READ_SIZE = 262144
+# The number of reads to request ahead of the data being streamed
+READ_AHEAD = 16
+
+_pool = None
+
+
+def connection_pool():
+    """
+    Returns the pool of SSH connections used to access the assetstores, it is
+    created on first use from the sftp.pool section of the cumulus
+    configuration.
+    """
+    global _pool
+
+    if _pool is None:
+        config = cumulus.config.get('sftp', {}).get('pool', {})
+        _pool = SshConnectionPool(max_size=config.get('maxSize', 10),
+                                  idle_timeout=config.get('idleTimeout', 300))
+
+    return _pool
 
-BUFFER_SIZE = 32768
 
 class SftpAssetstoreAdapter(AbstractAssetstoreAdapter):
     def __init__(self, assetstore):
@@ -70,21 +94,34 @@ class SftpAssetstoreAdapter(AbstractAssetstoreAdapter):
 
     @contextmanager
     def open_ssh_connection(self):
-        ssh = None
-
+        """
+        Yields a connected SSHClient for this assetstore, taken from the
+        connection pool so we only pay for the SSH handshake on first use.
+        """
+        # The credentials are always looked up as this checks that the current
+        # user has access to them, they also form part of the pool key so
+        # connections are only shared between requests using the same ones.
         (private_key, private_key_pass) = self._get_credentials()
+        key = (str(self.assetstore['_id']), self.host, self.user, private_key)
 
-        try:
+        def connect():
             ssh = paramiko.SSHClient()
             ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
             ssh.connect(hostname=self.host, username=self.user,
                         key_filename=private_key,
                         password=private_key_pass)
 
+            return ssh
+
+        ssh = connection_pool().acquire(key, connect)
+        discard = False
+        try:
             yield ssh
+        except (EOFError, SSHException):
+            discard = True
+            raise
         finally:
-            if ssh:
-                ssh.close()
+            connection_pool().release(key, ssh, discard=discard)
 
     def downloadFile(self, file, offset=0, headers=True, end_byte=None,
                      **kwargs):
@@ -96,32 +133,27 @@ class SftpAssetstoreAdapter(AbstractAssetstoreAdapter):
             cherrypy.response.headers['Accept-Ranges'] = 'bytes'
             self.setContentHeaders(file, offset, end_byte)
 
-        def stream():
-            bytes_read = offset
+        read_size = cumulus.config.get('sftp', {}).get('readSize',
+                                                       DEFAULT_READ_SIZE)
 
+        def stream():
             with self.open_ssh_connection() as ssh:
                 with ssh.open_sftp() as sftp_client:
                     with sftp_client.open(path,
                                       mode='r', bufsize=-1) as sftp_file:
-
-                        # If we are fetching the whole file then use prefetch
-                        if offset == 0 and end_byte == file['size']:
-                            sftp_file.prefetch(file['size'])
-
-                        if offset > 0:
-                            sftp_file.seek(offset)
-
-                        while True:
-                            read_len = min(BUFFER_SIZE, end_byte - bytes_read)
-                            if read_len <= 0:
-                                break
-
-                            data = sftp_file.read(read_len)
-                            bytes_read += read_len
-
-                            if not data:
-                                break
-                            yield data
+                        # readv(...) pipelines the requests for a window of
+                        # reads, so we are not paying a round trip for each
+                        # read. This works for range requests as well as whole
+                        # files, the window bounds how much is buffered.
+                        window_size = read_size * READ_AHEAD
+                        for start in range(offset, end_byte, window_size):
+                            end = min(start + window_size, end_byte)
+                            chunks = [(o, min(read_size, end - o))
+                                      for o in range(start, end, read_size)]
+                            for data in sftp_file.readv(chunks):
+                                if not data:
+                                    return
+                                yield data
 
         return stream
 
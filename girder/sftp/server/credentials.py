@@ -18,14 +18,13 @@
 ###############################################################################
 
 import os
-from jsonpath_rw import parse
 
 from girder.utility.model_importer import ModelImporter
 from girder.constants import AccessType
 from girder.api.rest import getCurrentUser
 
 import cumulus
-from cumulus.common.jsonpath import get_property
+from cumulus.common.jsonpath import parse, get_property
 
 def retrieve_credentials(event):
     cluster_id = event.info['authKey']
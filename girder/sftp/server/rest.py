@@ -27,6 +27,8 @@ from girder.constants import SettingKey
 from girder.constants import AssetstoreType, AccessType
 from girder.api.docs import addModel
 
+from cumulus.common.girder import add_create_files_route
+
 class SftpAssetstoreResource(Resource):
     def __init__(self):
         super(SftpAssetstoreResource, self).__init__()
@@ -34,6 +36,7 @@ class SftpAssetstoreResource(Resource):
 
         self.route('POST', (), self.create_assetstore)
         self.route('POST', (':id', 'files'), self.create_file)
+        add_create_files_route(self, 'sftp')
 
     @access.user
     def create_assetstore(self, params):
@@ -96,3 +96,192 @@ class TaskFlowTestCase(base.TestCase):
         self.assertEqual(len(notifications), 2, 'Expecting two notification, received %d' % len(notifications))
         self.assertEqual(notifications[0]['type'], 'taskflow.status', 'Expecting a message with type \'taskflow.status\'')
         self.assertEqual(notifications[1]['type'], 'taskflow.log', 'Expecting a message with type \'taskflow.log\'')
+
+    def test_taskflow_status(self):
+        body = {
+            'taskFlowClass': 'cumulus.taskflow.core.test.mytaskflows.SimpleTaskFlow',
+            'name': 'test_taskflow'
+        }
+
+        r = self.request('/taskflows', method='POST',
+                         type='application/json', body=json.dumps(body),
+                         user=self._user)
+        self.assertStatus(r, 201)
+        taskflow_id = r.json['_id']
+
+        task_ids = []
+        for i in range(2):
+            body = {
+                'celeryTaskId': 'celery_%d' % i,
+                'name': 'task_%d' % i
+            }
+            r = self.request('/taskflows/%s/tasks' % taskflow_id,
+                             method='POST', type='application/json',
+                             body=json.dumps(body), user=self._user)
+            self.assertStatus(r, 201)
+            task_ids.append(r.json['_id'])
+
+        def update_task(task_id, status):
+            r = self.request('/tasks/%s' % task_id, method='PATCH',
+                             type='application/json',
+                             body=json.dumps({'status': status}),
+                             user=self._user)
+            self.assertStatusOk(r)
+
+        def taskflow_status():
+            r = self.request('/taskflows/%s/status' % taskflow_id,
+                             method='GET', user=self._user)
+            self.assertStatusOk(r)
+
+            return r.json['status']
+
+        def task_status_count():
+            taskflow = self.model('taskflow', 'taskflow').load(
+                taskflow_id, force=True)
+
+            return {s: c for (s, c) in taskflow['taskStatusCount'].items()
+                    if c > 0}
+
+        self.assertEqual(task_status_count(), {'created': 2})
+
+        update_task(task_ids[0], 'running')
+        self.assertEqual(taskflow_status(), 'running')
+        self.assertEqual(task_status_count(), {'created': 1, 'running': 1})
+
+        update_task(task_ids[0], 'complete')
+        self.assertEqual(taskflow_status(), 'running')
+
+        update_task(task_ids[1], 'running')
+        update_task(task_ids[1], 'complete')
+        self.assertEqual(taskflow_status(), 'complete')
+        self.assertEqual(task_status_count(), {'complete': 2})
+
+        update_task(task_ids[1], 'error')
+        self.assertEqual(taskflow_status(), 'error')
+        self.assertEqual(task_status_count(), {'complete': 1, 'error': 1})
+
+        # The status is used as a key so must be valid
+        r = self.request('/tasks/%s' % task_ids[0], method='PATCH',
+                         type='application/json',
+                         body=json.dumps({'status': 'bad.status'}),
+                         user=self._user)
+        self.assertStatus(r, 400)
+
+    def test_create_tasks(self):
+        body = {
+            'taskFlowClass': 'cumulus.taskflow.core.test.mytaskflows.SimpleTaskFlow',
+            'name': 'test_taskflow'
+        }
+
+        r = self.request('/taskflows', method='POST',
+                         type='application/json', body=json.dumps(body),
+                         user=self._user)
+        self.assertStatus(r, 201)
+        taskflow_id = r.json['_id']
+
+        body = [{
+            'celeryTaskId': 'celery_%d' % i,
+            'name': 'task_%d' % i
+        } for i in range(3)]
+        r = self.request('/taskflows/%s/tasks/bulk' % taskflow_id,
+                         method='POST', type='application/json',
+                         body=json.dumps(body), user=self._user)
+        self.assertStatus(r, 201)
+        self.assertEqual([t['name'] for t in r.json],
+                         ['task_0', 'task_1', 'task_2'])
+        self.assertEqual(set([t['status'] for t in r.json]), set(['created']))
+
+        r = self.request('/taskflows/%s/tasks' % taskflow_id, method='GET',
+                         user=self._user)
+        self.assertStatusOk(r)
+        self.assertEqual(len(r.json), 3)
+
+        taskflow = self.model('taskflow', 'taskflow').load(taskflow_id,
+                                                           force=True)
+        self.assertEqual(taskflow['activeTaskCount'], 3)
+        self.assertEqual(taskflow['taskStatusCount'], {'created': 3})
+
+        # Each task must have a celery task id
+        r = self.request('/taskflows/%s/tasks/bulk' % taskflow_id,
+                         method='POST', type='application/json',
+                         body=json.dumps([{'name': 'task'}]), user=self._user)
+        self.assertStatus(r, 400)
+
+    def test_definitions(self):
+        body = {
+            'taskFlowClass': 'cumulus.taskflow.core.test.mytaskflows.SimpleTaskFlow',
+            'name': 'test_taskflow'
+        }
+
+        r = self.request('/taskflows', method='POST',
+                         type='application/json', body=json.dumps(body),
+                         user=self._user)
+        self.assertStatus(r, 201)
+        taskflow_id = r.json['_id']
+
+        # Keys that aren't valid mongo keys should be stored fine
+        definition = {
+            '_type': 'cumulus.taskflow.core.test.mytaskflows.SimpleTaskFlow',
+            '_on_complete_map': {
+                'cumulus.tasks.task1': {'task': 'cumulus.tasks.task2'}
+            }
+        }
+        url = '/taskflows/%s/definitions/%s' % (taskflow_id, 'abc123')
+        r = self.request(url, method='PUT', type='application/json',
+                         body=json.dumps(definition), user=self._user)
+        self.assertStatusOk(r)
+
+        r = self.request(url, method='GET', user=self._user)
+        self.assertStatusOk(r)
+        self.assertEqual(r.json, definition)
+
+        # The definitions are not part of the taskflow
+        r = self.request('/taskflows/%s' % taskflow_id, method='GET',
+                         user=self._user)
+        self.assertStatusOk(r)
+        self.assertNotIn('definitions', r.json)
+
+        r = self.request('/taskflows/%s/definitions/%s' % (taskflow_id,
+                                                           'def456'),
+                         method='GET', user=self._user)
+        self.assertStatus(r, 404)
+
+        r = self.request('/taskflows/%s/definitions/%s' % (taskflow_id,
+                                                           'not.valid'),
+                         method='PUT', type='application/json',
+                         body=json.dumps(definition), user=self._user)
+        self.assertStatus(r, 400)
+
+    def test_complete_dag_node(self):
+        body = {
+            'taskFlowClass': 'cumulus.taskflow.core.test.mytaskflows.DAGTaskFlow',
+            'name': 'test_taskflow'
+        }
+
+        r = self.request('/taskflows', method='POST',
+                         type='application/json', body=json.dumps(body),
+                         user=self._user)
+        self.assertStatus(r, 201)
+        taskflow_id = r.json['_id']
+
+        # Each request should return the nodes completed before it
+        expected = [
+            ('stage_b', []),
+            ('job_a', ['stage_b']),
+            ('job_a', ['stage_b', 'job_a'])
+        ]
+        for (node, completed) in expected:
+            r = self.request('/taskflows/%s/dag/%s/complete'
+                             % (taskflow_id, node), method='PUT',
+                             user=self._user)
+            self.assertStatusOk(r)
+            self.assertEqual(r.json['completedNodes'], completed)
+
+        # The completed nodes can't be modified directly
+        body = {
+            'dagCompletedNodes': []
+        }
+        r = self.request('/taskflows/%s' % taskflow_id, method='PATCH',
+                         type='application/json', body=json.dumps(body),
+                         user=self._user)
+        self.assertStatus(r, 400)
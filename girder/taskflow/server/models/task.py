@@ -31,7 +31,7 @@ class Task(AccessControlledModel):
         self.name = 'tasks'
         self.ensureIndices(['taskFlowId', 'celeryTaskId'])
         self.exposeFields(level=AccessType.READ, fields=(
-            '_id', 'taskFlowId', 'status', 'log', 'name', 'created'))
+            '_id', 'taskFlowId', 'status', 'name', 'created'))
 
     def validate(self, doc):
         return doc
@@ -47,23 +47,65 @@ class Task(AccessControlledModel):
 
         task['taskFlowId'] = taskflow['_id']
         task['status'] = 'created'
-        task['log'] = []
         now = datetime.datetime.utcnow()
         task['created'] = now
 
-        model = self.model('taskflow', 'taskflow')
-
         doc = self.setUserAccess(task, user, level=AccessType.ADMIN, save=True)
-        # increment the number of active tasks
-        query = {
-            '_id': taskflow['_id']
-        }
-        model.increment(query, 'activeTaskCount', 1)
+        self._increment_task_count(taskflow, 1)
 
         send_status_notification('task', doc)
 
         return doc
 
+    def create_many(self, user, taskflow, tasks):
+        """
+        Create a batch of tasks associated with a taskflow. The tasks are
+        written using a single bulk insert and the taskflow's counts are
+        updated once for the whole batch.
+
+        :param user: The user creating the tasks.
+        :param taskflow: The taskflow that the tasks will be part of.
+        :param tasks: List of task documents.
+        :returns The list of created tasks.
+        """
+        now = datetime.datetime.utcnow()
+        docs = []
+        for task in tasks:
+            task['taskFlowId'] = taskflow['_id']
+            task['status'] = 'created'
+            task['created'] = now
+            docs.append(self.setUserAccess(task, user,
+                                           level=AccessType.ADMIN, save=False))
+
+        if not docs:
+            return docs
+
+        self.collection.insert_many(docs)
+        self._increment_task_count(taskflow, len(docs))
+
+        for doc in docs:
+            send_status_notification('task', doc)
+
+        return docs
+
+    def _increment_task_count(self, taskflow, count):
+        """
+        Increment the number of active tasks, and the number of tasks in the
+        created state.
+        """
+        query = {
+            '_id': taskflow['_id']
+        }
+        update = {
+            '$inc': {
+                'activeTaskCount': count
+            }
+        }
+        if 'taskStatusCount' in taskflow:
+            update['$inc']['taskStatusCount.created'] = count
+
+        self.model('taskflow', 'taskflow').update(query, update, multi=False)
+
     def find_by_celery_task_id(self, user, celery_task_id):
         """
         Lookup a task by its celery task id
@@ -106,29 +148,38 @@ class Task(AccessControlledModel):
 
     def append_to_log(self, task, log):
         """
-        Append a log entry the tasks log
+        Append a log entry, or a list of entries, to the tasks log
         """
-        # This needs to be done in the database to prevent lost updates
-        query = {
-            '_id': task['_id']
-        }
-        update = {
-            '$push': {
-                'log': log
-            }
-        }
-        result = self.update(query, update, multi=False)
-        send_log_notification('task', task, log)
-        return result
+        records = log if isinstance(log, list) else [log]
+        self.model('log', 'taskflow').extend('task', task['_id'], records)
+        for record in records:
+            send_log_notification('task', task, record)
+
+    def log_records(self, task, offset=0, limit=0):
+        """
+        Get the tasks log entries, starting at sequence number offset.
+        """
+        return self.model('log', 'taskflow').records(
+            'task', task['_id'], offset, limit)
 
     def update_task(self, user, task, status=None):
         if status and task['status'] != status:
+            # Atomically set the status, returning the previous one so we know
+            # which count to decrement even if there are concurrent updates.
+            previous = self.collection.find_one_and_update(
+                {'_id': task['_id']}, {'$set': {'status': status}},
+                projection={'status': True})
             task['status'] = status
-            task = self.save(task)
+
+            taskflow_model = self.model('taskflow', 'taskflow')
+            if previous and previous['status'] != status:
+                taskflow_model.update_task_status_count(task['taskFlowId'], {
+                    previous['status']: -1,
+                    status: 1
+                })
 
             # Update the state of the parent taskflow
-            self.model('taskflow', 'taskflow').update_state(
-                user, task['taskFlowId'])
+            taskflow_model.update_state(user, task['taskFlowId'])
 
             send_status_notification('task', task)
 
@@ -17,6 +17,10 @@
 #  limitations under the License.
 ###############################################################################
 
+import json
+import six
+from pymongo import ReturnDocument
+
 from girder.models.model_base import AccessControlledModel
 from girder.constants import AccessType
 
@@ -32,7 +36,7 @@ class Taskflow(AccessControlledModel):
     def initialize(self):
         self.name = 'taskflows'
         self.exposeFields(level=AccessType.READ, fields=(
-            '_id', 'status', 'log', 'activeTaskCount', 'taskFlowClass',
+            '_id', 'status', 'activeTaskCount', 'taskFlowClass',
             'meta'))
 
     def validate(self, doc):
@@ -40,7 +44,8 @@ class Taskflow(AccessControlledModel):
 
     def create(self, user, taskflow):
         taskflow['status'] = TaskFlowState.CREATED
-        taskflow['log'] = []
+        # The number of tasks in each state, used to derive the status
+        taskflow['taskStatusCount'] = {}
 
         taskflow = self.setUserAccess(
             taskflow, user, level=AccessType.ADMIN, save=True)
@@ -51,21 +56,20 @@ class Taskflow(AccessControlledModel):
 
     def append_to_log(self, taskflow, log):
         """
-        Append a log entry to the taskflows log
+        Append a log entry, or a list of entries, to the taskflows log
         """
-        # This needs to be done in the database to prevent lost updates
-        query = {
-            '_id': taskflow['_id']
-        }
-        update = {
-            '$push': {
-                'log': log
-            }
-        }
+        records = log if isinstance(log, list) else [log]
+        self.model('log', 'taskflow').extend(
+            'taskflow', taskflow['_id'], records)
+        for record in records:
+            send_log_notification('taskflow', taskflow, record)
 
-        result = self.update(query, update, multi=False)
-        send_log_notification('taskflow', taskflow, log)
-        return result
+    def log_records(self, taskflow, offset=0, limit=0):
+        """
+        Get the taskflows log entries, starting at sequence number offset.
+        """
+        return self.model('log', 'taskflow').records(
+            'taskflow', taskflow['_id'], offset, limit)
 
     def _to_paths(self, d, path=''):
         """
@@ -119,6 +123,63 @@ class Taskflow(AccessControlledModel):
 
         return self.findOne(query=query, fields=projection)
 
+    def set_definition(self, taskflow, version, definition):
+        """
+        Store a version of the taskflow's definition, referenced by compact
+        taskflow message headers.
+
+        :param taskflow: The taskflow.
+        :param version: The definition version.
+        :param definition: The taskflow definition.
+        """
+        query = {
+            '_id': taskflow['_id']
+        }
+        # Store the definition serialized, as its keys, such as task names,
+        # may not be valid mongo keys.
+        update = {
+            '$set': {
+                'definitions.%s' % version: json.dumps(definition)
+            }
+        }
+
+        self.update(query, update, multi=False)
+
+    def get_definition(self, taskflow, version):
+        """
+        :returns The version of the taskflow's definition, or None if it
+                 hasn't been stored.
+        """
+        definition = taskflow.get('definitions', {}).get(version)
+        if definition is not None:
+            definition = json.loads(definition)
+
+        return definition
+
+    def complete_dag_node(self, taskflow, node):
+        """
+        Atomically record that a node of the taskflow's DAG has completed.
+
+        :param taskflow: The taskflow.
+        :param node: The name of the node.
+        :returns The list of nodes that had completed before this one, the
+                 caller can use it to work out which nodes this one has made
+                 ready to run.
+        """
+        query = {
+            '_id': taskflow['_id']
+        }
+        update = {
+            '$addToSet': {
+                'dagCompletedNodes': node
+            }
+        }
+        before = self.collection.find_one_and_update(
+            query, update, projection={'dagCompletedNodes': True},
+            return_document=ReturnDocument.BEFORE)
+
+        return before.get('dagCompletedNodes', [])
+
     def delete(self, taskflow):
         """
         Delete a taskflow and its associated tasks.
@@ -127,7 +188,14 @@ class Taskflow(AccessControlledModel):
             'taskFlowId': taskflow['_id']
         }
 
-        self.model('task', 'taskflow').removeWithQuery(query)
+        task_model = self.model('task', 'taskflow')
+        task_ids = [task['_id'] for task in task_model.find(query,
+                                                            fields=['_id'])]
+        log_model = self.model('log', 'taskflow')
+        log_model.remove_records('task', *task_ids)
+        log_model.remove_records('taskflow', taskflow['_id'])
+
+        task_model.removeWithQuery(query)
         self.remove(taskflow)
 
     def status(self, user, taskflow):
@@ -145,11 +213,15 @@ class Taskflow(AccessControlledModel):
                                       TaskFlowState.DELETING]:
                 return taskflow['status']
 
-        tasks = self.model('task', 'taskflow').find_by_taskflow_id(
-            user, taskflow['_id'])
-
-        task_status = [t['status'] for t in tasks]
-        task_status = set(task_status)
+        if 'taskStatusCount' in taskflow:
+            task_status = set([s for (s, count)
+                               in six.iteritems(taskflow['taskStatusCount'])
+                               if count > 0])
+        else:
+            # Taskflows created before the task counts were kept
+            tasks = self.model('task', 'taskflow').find_by_taskflow_id(
+                user, taskflow['_id'], fields=['status'])
+            task_status = set([t['status'] for t in tasks])
 
         status = TaskFlowState.CREATED
         if len(task_status) == 1:
@@ -163,6 +235,30 @@ class Taskflow(AccessControlledModel):
 
         return status
 
+    def update_task_status_count(self, taskflow_id, increments):
+        """
+        Atomically update the number of tasks in each state.
+
+        :param taskflow_id: The taskflow the tasks belong to.
+        :param increments: Dict of task state to the change in the number of
+                           tasks in that state.
+        """
+        query = {
+            '_id': taskflow_id,
+            # Taskflows created before the counts were kept don't have them
+            'taskStatusCount': {
+                '$exists': True
+            }
+        }
+        update = {
+            '$inc': {
+                'taskStatusCount.%s' % status: increment
+                for (status, increment) in six.iteritems(increments)
+            }
+        }
+
+        self.update(query, update, multi=False)
+
     def update_state(self, user, taskflow_id):
         """
         Update the state of the taskflow. This is called any time a task in the
@@ -19,6 +19,7 @@
 
 import cherrypy
 import json
+import re
 from pymongo import ReturnDocument
 import traceback
 import logging
@@ -32,11 +33,17 @@ from girder.constants import AccessType
 import sys
 from bson.objectid import ObjectId
 
-from cumulus.taskflow import load_class, TaskFlowState
+from cumulus.taskflow import load_class, TaskFlowState, broadcast_status
 import cumulus
 
 logger = logging.getLogger('girder')
 
+# The maximum number of tasks that can be created in a single request
+MAX_BULK_TASKS = 1000
+
+# The form of a taskflow definition version, a hash of the definition
+DEFINITION_VERSION_PATTERN = re.compile('^[0-9a-f]{1,64}$')
+
 
 class TaskFlows(Resource):
 
@@ -51,12 +58,19 @@ class TaskFlows(Resource):
         self.route('PUT', (':id', 'terminate'), self.terminate)
         self.route('PUT', (':id', 'start'), self.start)
         self.route('POST', (':id', 'tasks'), self.create_task)
+        self.route('POST', (':id', 'tasks', 'bulk'), self.create_tasks)
         self.route('DELETE', (':id',), self.delete)
         self.route('PUT', (':id', 'delete'), self.delete_finished)
         self.route('GET', (':id', 'tasks'), self.tasks)
         self.route('PUT', (':id', 'tasks', ':taskId', 'finished'),
                    self.task_finished)
         self.route('GET', (':id', 'log'), self.get_log)
+        self.route('PUT', (':id', 'definitions', ':version'),
+                   self.set_definition)
+        self.route('GET', (':id', 'definitions', ':version'),
+                   self.get_definition)
+        self.route('PUT', (':id', 'dag', ':node', 'complete'),
+                   self.complete_dag_node)
 
         self._model = self.model('taskflow', 'taskflow')
 
@@ -123,7 +137,8 @@ class TaskFlows(Resource):
     )
     def update(self, taskflow, params):
         user = self.getCurrentUser()
-        immutable = ['access', '_id', 'taskFlowClass', 'log', 'activeTaskCount']
+        immutable = ['access', '_id', 'taskFlowClass', 'log', 'activeTaskCount',
+                     'taskStatusCount', 'definitions', 'dagCompletedNodes']
         updates = getBodyJson()
         if not updates:
             raise RestException('A body must be provided', code=400)
@@ -193,6 +208,8 @@ class TaskFlows(Resource):
         taskflow['status'] = TaskFlowState.TERMINATING
 
         self._model.save(taskflow)
+        # Let the workers know straight away, so they stop running tasks
+        broadcast_status(str(taskflow['_id']), TaskFlowState.TERMINATING)
         constructor = load_class(taskflow['taskFlowClass'])
         token = self.model('token').createToken(user=user, days=7)
         taskflow_instance = constructor(
@@ -339,6 +356,49 @@ class TaskFlows(Resource):
 
         return task
 
+    addModel('CreateTasksParams', {
+        'id': 'CreateTasksParams',
+        'type': 'array',
+        'items': {
+            '$ref': 'CreateTaskParams'
+        }
+    }, 'taskflows')
+
+    @access.user
+    @filtermodel(model='task', plugin='taskflow')
+    @loadmodel(model='taskflow', plugin='taskflow', level=AccessType.READ)
+    @describeRoute(
+        Description('Create a batch of new tasks associated with this flow')
+        .param(
+            'id',
+            'The id of taskflow',
+            required=True, paramType='path')
+        .param(
+            'body',
+            'The tasks to create, at most %d.' % MAX_BULK_TASKS,
+            required=True, paramType='body', dataType='CreateTasksParams')
+    )
+    def create_tasks(self, taskflow, params):
+        user = getCurrentUser()
+        tasks = getBodyJson()
+
+        if not isinstance(tasks, list):
+            raise RestException('A list of tasks must be provided', code=400)
+
+        if len(tasks) > MAX_BULK_TASKS:
+            raise RestException('At most %d tasks can be created at once'
+                                % MAX_BULK_TASKS, code=400)
+
+        for task in tasks:
+            self.requireParams(['celeryTaskId'], task)
+
+        tasks = self.model('task', 'taskflow').create_many(
+            user, taskflow, tasks)
+
+        cherrypy.response.status = 201
+
+        return tasks
+
     @access.user
     @filtermodel(model='taskflow', plugin='taskflow')
     @loadmodel(model='taskflow', plugin='taskflow', level=AccessType.WRITE)
@@ -373,12 +433,86 @@ class TaskFlows(Resource):
             'The task to get log entries for.', paramType='path')
         .param(
             'offset',
-            'A offset in to the log.', required=False,
-            paramType='query')
+            'The sequence number of the entry to start at.', required=False,
+            paramType='query', dataType='integer')
+        .param(
+            'limit',
+            'The maximum number of entries to return.', required=False,
+            paramType='query', dataType='integer')
     )
     def get_log(self, taskflow, params):
-        offset = 0
-        if 'offset' in params:
-            offset = int(params['offset'])
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', 0))
+
+        return {'log': self._model.log_records(taskflow, offset, limit)}
+
+    def _check_definition_version(self, version):
+        if not DEFINITION_VERSION_PATTERN.match(version):
+            raise RestException('Invalid definition version: %s' % version,
+                                code=400)
+
+    @access.user
+    @loadmodel(model='taskflow', plugin='taskflow', level=AccessType.WRITE)
+    @describeRoute(
+        Description('Store a version of the taskflow definition, this is '
+                    'referenced by compact taskflow message headers.')
+        .param(
+            'id',
+            'The id of taskflow',
+            required=True, paramType='path')
+        .param(
+            'version',
+            'The definition version',
+            required=True, paramType='path')
+        .param(
+            'body',
+            'The taskflow definition',
+            required=True, paramType='body', dataType='object')
+    )
+    def set_definition(self, taskflow, version, params):
+        self._check_definition_version(version)
+        definition = getBodyJson()
+        if not isinstance(definition, dict):
+            raise RestException('A definition must be provided', code=400)
+
+        self._model.set_definition(taskflow, version, definition)
+
+    @access.user
+    @loadmodel(model='taskflow', plugin='taskflow', level=AccessType.READ)
+    @describeRoute(
+        Description('Get a version of the taskflow definition')
+        .param(
+            'id',
+            'The id of taskflow',
+            required=True, paramType='path')
+        .param(
+            'version',
+            'The definition version',
+            required=True, paramType='path')
+    )
+    def get_definition(self, taskflow, version, params):
+        self._check_definition_version(version)
+        definition = self._model.get_definition(taskflow, version)
+        if definition is None:
+            raise RestException('Definition version not found: %s' % version,
+                                code=404)
+
+        return definition
+
+    @access.user
+    @loadmodel(model='taskflow', plugin='taskflow', level=AccessType.WRITE)
+    @describeRoute(
+        Description('Record that a node of the taskflow\'s DAG has completed')
+        .param(
+            'id',
+            'The id of taskflow',
+            required=True, paramType='path')
+        .param(
+            'node',
+            'The name of the node',
+            required=True, paramType='path')
+    )
+    def complete_dag_node(self, taskflow, node, params):
+        completed = self._model.complete_dag_node(taskflow, node)
 
-        return {'log': taskflow['log'][offset:]}
+        return {'completedNodes': completed}
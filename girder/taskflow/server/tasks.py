@@ -27,6 +27,8 @@ from girder.api import access
 from girder.api.describe import Description, describeRoute
 from girder.constants import AccessType
 
+from cumulus.taskflow import TaskState
+
 
 class Tasks(Resource):
 
@@ -68,6 +70,9 @@ class Tasks(Resource):
                 raise RestException('\'%s\' is an immutable property' % p, 400)
 
         status = updates.get('status')
+        # The status is used as a key in the taskflow's task counts
+        if status is not None and not TaskState.is_valid(status):
+            raise RestException('Invalid task status: %s' % status, 400)
 
         return self._model.update_task(user, task, status=status)
 
@@ -109,12 +114,13 @@ class Tasks(Resource):
     @describeRoute(
         Description('Get log entries for task')
         .param('id', 'The task to get log entries for.', paramType='path')
-        .param('offset', 'A offset in to the log.', required=False,
-               paramType='query')
+        .param('offset', 'The sequence number of the entry to start at.',
+               required=False, paramType='query', dataType='integer')
+        .param('limit', 'The maximum number of entries to return.',
+               required=False, paramType='query', dataType='integer')
     )
     def get_log(self, task, params):
-        offset = 0
-        if 'offset' in params:
-            offset = int(params['offset'])
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', 0))
 
-        return {'log': task['log'][offset:]}
+        return {'log': self._model.log_records(task, offset, limit)}
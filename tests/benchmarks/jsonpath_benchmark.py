@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright 2016 Kitware Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+
+"""
+Microbenchmark comparing jsonpath_rw.parse(...) with the cached parse(...)
+from cumulus.common.jsonpath, for the sort of lookups done on a cluster when
+opening a connection. Run with:
+
+    python tests/benchmarks/jsonpath_benchmark.py
+"""
+
+import argparse
+import timeit
+
+import jsonpath_rw
+
+from cumulus.common import jsonpath
+
+cluster = {
+    '_id': '55c3a698f6571011a48f6817',
+    'type': 'trad',
+    'config': {
+        'host': 'localhost',
+        'ssh': {
+            'user': 'bob',
+            'key': '55c3a698f6571011a48f6817',
+            'passphrase': 'test'
+        },
+        'scheduler': {
+            'type': 'sge'
+        }
+    }
+}
+
+paths = ['config.ssh.user', 'config.host', 'config.ssh.passphrase',
+         'config.ssh.key']
+
+
+def lookup(parse):
+    for path in paths:
+        parse(path).find(cluster)[0].value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark jsonpath lookups')
+    parser.add_argument('-n', '--number', type=int, default=1000)
+    args = parser.parse_args()
+
+    results = [
+        ('jsonpath_rw.parse', jsonpath_rw.parse),
+        ('cached parse', jsonpath.parse)
+    ]
+
+    for (name, parse) in results:
+        elapsed = timeit.timeit(lambda: lookup(parse), number=args.number)
+        print('%-20s %10.2f us per lookup' %
+              (name, elapsed * 1e6 / (args.number * len(paths))))
+
+
+if __name__ == '__main__':
+    main()
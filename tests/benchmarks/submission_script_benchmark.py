@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright 2016 Kitware Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+
+"""
+Benchmark the generation of submission scripts for a parameter sweep,
+comparing a new environment and two full renders per job with the shared
+environment used by cumulus.tasks.job. Run with:
+
+    python tests/benchmarks/submission_script_benchmark.py
+"""
+
+import argparse
+import time
+
+from jinja2 import Environment, Template, PackageLoader
+
+import cumulus
+from cumulus.tasks.job import _generate_submission_script
+
+cluster = {
+    '_id': '55c3a698f6571011a48f6817',
+    'name': 'test',
+    'config': {
+        'scheduler': {
+            'type': 'sge'
+        }
+    }
+}
+
+commands = [
+    'mkdir -p output/{{ job._id }}',
+    'mpirun -n {{ numberOfSlots }} solver --input input.json '
+    '--output output/{{ job._id }}'
+]
+
+
+def _uncached_submission_script(job, cluster, job_params):
+    env = Environment(loader=PackageLoader('cumulus', 'templates'))
+    template = env.get_template('template.sh')
+    script = template.render(cluster=cluster, job=dict(job, commands=commands),
+                             commands=commands,
+                             baseUrl=cumulus.config.girder.baseUrl,
+                             **job_params)
+
+    return Template(script).render(cluster=cluster, job=job,
+                                   baseUrl=cumulus.config.girder.baseUrl,
+                                   **job_params)
+
+
+def _run(generate, number):
+    start = time.time()
+    for i in range(number):
+        job = {
+            '_id': 'job%d' % i,
+            'name': 'sweep',
+            'commands': commands
+        }
+        params = {
+            'numberOfSlots': i % 64 + 1,
+            'queue': 'default'
+        }
+        generate(job, cluster, params)
+
+    return number / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark submission script generation')
+    parser.add_argument('-n', '--number', type=int, default=1000)
+    args = parser.parse_args()
+
+    for (name, generate) in [('uncached', _uncached_submission_script),
+                             ('cached', _generate_submission_script)]:
+        print('%-10s %10.1f submissions per second' %
+              (name, _run(generate, args.number)))
+
+
+if __name__ == '__main__':
+    main()
@@ -18,8 +18,13 @@ def flaskProcess(requests_file):
 
     @app.route("/log", methods=["POST"])
     def test():
+        # Records may be posted in batches, write one record per line
+        records = json.loads(request.data)
+        if not isinstance(records, list):
+            records = [records]
         with open(requests_file, "a") as fh:
-            fh.write((request.data + "\n").encode('utf8'))
+            for record in records:
+                fh.write(json.dumps(record) + "\n")
         return "SUCCESS"
 
     app.run(debug=False, use_reloader=False)
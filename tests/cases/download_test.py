@@ -8,6 +8,7 @@ import stat
 import cumulus
 from cumulus.transport.files.download import download_path
 from cumulus.transport.files.download import _ensure_path
+from cumulus.transport.files.download import _import_path
 
 class DownloadTestCase(unittest.TestCase):
 
@@ -30,8 +31,13 @@ class DownloadTestCase(unittest.TestCase):
                   'size': 1234
         }
 
+        folder_file = dict(file, path='folder/test.txt')
+        file = dict(file, path='test.txt')
+        folder['path'] = 'folder'
+
         cluster_connection = mock.MagicMock()
-        cluster_connection.list.side_effect = [[file, folder], [file]]
+        cluster_connection.walk.return_value = iter([file, folder,
+                                                     folder_file])
 
         girder_token = 'dummy'
         parent = {
@@ -74,7 +80,7 @@ class DownloadTestCase(unittest.TestCase):
 
             return httmock.response(200, content, headers, request=request)
 
-        file_url = '/api/v1/sftp_assetstores/%s/files' % assetstore_id
+        file_url = '/api/v1/sftp_assetstores/%s/files/bulk' % assetstore_id
         create_file = httmock.urlmatch(
             path=r'^%s$' % file_url, method='POST')(_create_file)
 
@@ -117,9 +123,15 @@ class DownloadTestCase(unittest.TestCase):
                 'sftp_assetstores', assetstore_id, upload=False)
 
 
-        self.assertEqual(len(self._item_requests), 2)
-        self.assertEqual(len(self._file_requests), 2)
+        # The items and files should be created in a single bulk request
+        self.assertEqual(len(self._item_requests), 0)
+        self.assertEqual(len(self._file_requests), 1)
         self.assertEqual(len(self._folder_requests), 1)
+        files = json.loads(self._file_requests[0].body)
+        self.assertEqual(sorted([f['path'] for f in files]), [
+            '/my/path/folder/test.txt',
+            '/my/path/test.txt'
+        ])
 
     def test_ensure_path(self):
         girder_client = mock.MagicMock()
@@ -231,3 +243,43 @@ class DownloadTestCase(unittest.TestCase):
         }
         self.assertEqual(girder_folders, expect_girder_folders)
         self.assertEqual(folder_id, 'folderId2')
+
+    def test_import_path_concurrent(self):
+        files = [{
+            'name': 'test%d.txt' % i,
+            'path': 'folder/test%d.txt' % i,
+            'mode': 1,
+            'size': 123
+        } for i in range(1200)]
+        folder = {
+            'name': 'folder',
+            'path': 'folder',
+            'mode': stat.S_IFDIR,
+            'size': 1234
+        }
+
+        cluster_connection = mock.MagicMock()
+        cluster_connection.walk.return_value = iter([folder] + files)
+
+        girder_client = mock.MagicMock()
+        girder_client.listFolder.return_value = iter([])
+        girder_client.createFolder.return_value = {
+            '_id': 'folder_id'
+        }
+        _import_path(cluster_connection, girder_client, 'parent_id',
+                     '/my/path', 'sftp_assetstores', 'assetstore_id',
+                     concurrency=8)
+
+        # The folder should only have been created once
+        self.assertEqual(girder_client.createFolder.call_count, 1)
+        # The files should have been registered in batches
+        self.assertEqual(girder_client.post.call_count, 3)
+        registered = []
+        for args, kwargs in girder_client.post.call_args_list:
+            self.assertEqual(args[0],
+                             'sftp_assetstores/assetstore_id/files/bulk')
+            registered += json.loads(kwargs['data'])
+        self.assertEqual(len(registered), len(files))
+        for f in registered:
+            self.assertEqual(f['folderId'], 'folder_id')
+        cluster_connection.walk.assert_called_once_with('/my/path')
@@ -0,0 +1,25 @@
+#!/bin/sh
+#                             _
+#                            | |
+#   ___ _   _ _ __ ___  _   _| |_   _ ___
+#  / __| | | | '_ ` _ \| | | | | | | / __|
+# | (__| |_| | | | | | | |_| | | |_| \__ \
+#  \___|\__,_|_| |_| |_|\__,_|_|\__,_|___/
+#
+#
+#SBATCH --job-name=dummy-123432423
+#SBATCH --output=dummy-123432423.o%j
+#SBATCH --error=dummy-123432423.e%j
+#SBATCH --workdir=
+#SBATCH --array=1-2
+
+case "$SLURM_ARRAY_TASK_ID" in
+1)
+ls
+mpirun -n 1000000 parallel a.in
+;;
+2)
+ls
+mpirun -n 1000000 parallel b.in
+;;
+esac
@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright 2016 Kitware Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+
+import unittest
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import json
+import httmock
+import requests
+from requests_toolbelt.multipart.decoder import MultipartDecoder
+
+from cumulus.girderclient import InputCache, DirectoryUploader, \
+    JobInputDownloader
+
+BASE_URL = 'http://localhost/api/v1'
+
+
+def _json_response(request, content, status_code=200):
+    return httmock.response(status_code, json.dumps(content).encode('utf8'),
+                            {'content-type': 'application/json'},
+                            request=request)
+
+
+def _error_response(request):
+    return httmock.response(500, b'error', {'content-type': 'text/plain'},
+                            request=request)
+
+
+class InputCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._cache_dir = os.path.join(self._dir, 'cache')
+        self._downloads = []
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _download(self, content):
+        def download(path):
+            self._downloads.append(path)
+            with open(path, 'w') as fp:
+                fp.write(content)
+
+        return download
+
+    def test_fetch(self):
+        cache = InputCache(self._cache_dir)
+        file = {
+            '_id': 'file1',
+            'sha512': 'abc',
+            'size': 5
+        }
+
+        dest1 = os.path.join(self._dir, 'job1', 'input.txt')
+        dest2 = os.path.join(self._dir, 'job2', 'input.txt')
+        os.makedirs(os.path.dirname(dest1))
+        os.makedirs(os.path.dirname(dest2))
+
+        cache.fetch(file, dest1, self._download('hello'))
+        cache.fetch(file, dest2, self._download('hello'))
+
+        self.assertEqual(len(self._downloads), 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        for dest in [dest1, dest2]:
+            with open(dest) as fp:
+                self.assertEqual(fp.read(), 'hello')
+
+        # A new version of the file should be downloaded again
+        file['sha512'] = 'def'
+        cache.fetch(file, dest2, self._download('world'))
+        self.assertEqual(len(self._downloads), 2)
+        with open(dest2) as fp:
+            self.assertEqual(fp.read(), 'world')
+
+    def test_evict(self):
+        cache = InputCache(self._cache_dir, max_size=10)
+        dest = os.path.join(self._dir, 'input.txt')
+
+        for i in range(3):
+            file = {
+                '_id': 'file%d' % i,
+                'sha512': 'abc',
+                'size': 5
+            }
+            cache.fetch(file, dest, self._download('01234'))
+            # Make sure each file has a distinct access time
+            path = os.path.join(self._cache_dir, 'file%d-abc' % i)
+            os.utime(path, (time.time() - 10 + i, time.time() - 10 + i))
+
+        cache.evict()
+
+        # The least recently used file should have been removed
+        self.assertEqual(sorted(os.listdir(self._cache_dir)),
+                         ['file1-abc', 'file2-abc'])
+
+
+class DirectoryUploaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._files = {}
+        for name in ['a.txt', 'b.txt', 'c.txt']:
+            path = os.path.join(self._dir, name)
+            content = ('%s-0123456789' % name).encode('utf8')
+            with open(path, 'wb') as fp:
+                fp.write(content)
+            self._files[path] = content
+
+        self._lock = threading.Lock()
+        # The content received for each upload
+        self._uploads = {}
+        self._names = {}
+        # Chunks that should fail, (upload id, offset) => number of failures
+        self._fail = {}
+        self._active = 0
+        self._max_active = 0
+        self._patched = False
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _mocks(self):
+        @httmock.urlmatch(path=r'^/api/v1/jobs/job_id$', method='GET')
+        def get_job(url, request):
+            return _json_response(request, {
+                'output': [{
+                    'itemId': 'item_id',
+                    'path': self._dir
+                }]
+            })
+
+        @httmock.urlmatch(path=r'^/api/v1/jobs/job_id$', method='PATCH')
+        def patch_job(url, request):
+            self._patched = True
+            return _json_response(request, {})
+
+        @httmock.urlmatch(path=r'^/api/v1/file$', method='POST')
+        def create_upload(url, request):
+            name = re.search(r'name=([^&]+)', url.query).group(1)
+            with self._lock:
+                upload_id = 'upload%d' % len(self._names)
+                self._names[upload_id] = requests.utils.unquote(name)
+                self._uploads[upload_id] = b''
+                self._active += 1
+                self._max_active = max(self._active, self._max_active)
+
+            # Give the other threads a chance to start their upload
+            time.sleep(0.1)
+
+            with self._lock:
+                self._active -= 1
+
+            return _json_response(request, {'_id': upload_id})
+
+        @httmock.urlmatch(path=r'^/api/v1/file/chunk$', method='POST')
+        def upload_chunk(url, request):
+            decoder = MultipartDecoder(request.body.read(),
+                                       request.headers['Content-Type'])
+            fields = {}
+            for part in decoder.parts:
+                disposition = part.headers[b'Content-Disposition']
+                name = re.search(b'name="([^"]+)"', disposition).group(1)
+                fields[name.decode('utf8')] = part.content
+
+            upload_id = fields['uploadId'].decode('utf8')
+            offset = int(fields['offset'])
+            with self._lock:
+                failures = self._fail.get((upload_id, offset), 0)
+                if failures:
+                    self._fail[(upload_id, offset)] = failures - 1
+                    return _error_response(request)
+
+                if offset != len(self._uploads[upload_id]):
+                    return _error_response(request)
+                self._uploads[upload_id] += fields['chunk']
+
+            return _json_response(request, {})
+
+        @httmock.urlmatch(path=r'^/api/v1/file/offset$', method='GET')
+        def upload_offset(url, request):
+            upload_id = re.search(r'uploadId=([^&]+)', url.query).group(1)
+            with self._lock:
+                offset = len(self._uploads[upload_id])
+
+            return _json_response(request, {'offset': offset})
+
+        return [get_job, patch_job, create_upload, upload_chunk,
+                upload_offset]
+
+    def _uploaded(self):
+        return {self._names[upload_id]: content
+                for (upload_id, content) in self._uploads.items()}
+
+    def test_upload_concurrent(self):
+        uploader = DirectoryUploader('token', BASE_URL, 'job_id',
+                                     concurrency=3, chunk_size=4)
+        with httmock.HTTMock(*self._mocks()):
+            uploader.run()
+
+        self.assertEqual(self._uploaded(), self._files)
+        self.assertGreater(self._max_active, 1)
+        self.assertTrue(self._patched)
+
+    def test_upload_chunk_retry(self):
+        # The third chunk of every file fails once
+        for i in range(len(self._files)):
+            self._fail[('upload%d' % i, 8)] = 1
+
+        uploader = DirectoryUploader('token', BASE_URL, 'job_id',
+                                     concurrency=3, chunk_size=4, retries=1)
+        with httmock.HTTMock(*self._mocks()):
+            uploader.run()
+
+        self.assertEqual(self._uploaded(), self._files)
+        self.assertEqual(set(self._fail.values()), set([0]))
+
+    def test_upload_failure(self):
+        # The chunk keeps failing, so the upload should give up
+        self._fail[('upload1', 4)] = 10
+
+        uploader = DirectoryUploader('token', BASE_URL, 'job_id',
+                                     concurrency=3, chunk_size=4, retries=1)
+        with httmock.HTTMock(*self._mocks()):
+            with self.assertRaises(requests.HTTPError):
+                uploader.run()
+
+        # The job's timings shouldn't be updated
+        self.assertFalse(self._patched)
+
+
+class JobInputDownloaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._items = {
+            'item1': [('file1', 'input1.txt', b'hello')],
+            'item2': [('file2', 'input2.txt', b'world' * 1000),
+                      ('file3', 'input3.txt', b'')]
+        }
+        self._failing_files = set()
+        self._patched = False
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _mocks(self):
+        files = {}
+        for item_files in self._items.values():
+            for (file_id, _, content) in item_files:
+                files[file_id] = content
+
+        @httmock.urlmatch(path=r'^/api/v1/jobs/job_id$', method='GET')
+        def get_job(url, request):
+            return _json_response(request, {
+                'input': [{
+                    'itemId': item_id,
+                    'path': 'dir_%s' % item_id
+                } for item_id in sorted(self._items)]
+            })
+
+        @httmock.urlmatch(path=r'^/api/v1/jobs/job_id$', method='PATCH')
+        def patch_job(url, request):
+            self._patched = True
+            return _json_response(request, {})
+
+        @httmock.urlmatch(path=r'^/api/v1/item/[^/]+/files$', method='GET')
+        def item_files(url, request):
+            item_id = url.path.split('/')[-2]
+            return _json_response(request, [{
+                '_id': file_id,
+                'name': name
+            } for (file_id, name, _) in self._items[item_id]])
+
+        @httmock.urlmatch(path=r'^/api/v1/file/[^/]+/download$',
+                          method='GET')
+        def download(url, request):
+            file_id = url.path.split('/')[-2]
+            if file_id in self._failing_files:
+                return _error_response(request)
+
+            return httmock.response(
+                200, files[file_id],
+                {'content-type': 'application/octet-stream'},
+                request=request)
+
+        return [get_job, patch_job, item_files, download]
+
+    def test_download(self):
+        downloader = JobInputDownloader('token', BASE_URL, 'job_id',
+                                        self._dir, concurrency=2)
+        with httmock.HTTMock(*self._mocks()):
+            downloader.run()
+
+        for (item_id, item_files) in self._items.items():
+            for (_, name, content) in item_files:
+                path = os.path.join(self._dir, 'dir_%s' % item_id, name)
+                with open(path, 'rb') as fp:
+                    self.assertEqual(fp.read(), content)
+
+        self.assertTrue(self._patched)
+
+    def test_download_failure(self):
+        self._failing_files.add('file2')
+        downloader = JobInputDownloader('token', BASE_URL, 'job_id',
+                                        self._dir, concurrency=2)
+        with httmock.HTTMock(*self._mocks()):
+            with self.assertRaises(requests.HTTPError):
+                downloader.run()
+
+        self.assertFalse(self._patched)
@@ -27,6 +27,7 @@ import sys
 import six
 
 from cumulus.tasks import job
+from cumulus.transport.metadata import metadata_cache
 from cumulus.testing import AssertCallsMixin
 
 class MockContext(task.Context):
@@ -38,6 +39,26 @@ class MockContext(task.Context):
     def retry(self,args=None, kwargs=None, exc=None, throw=True, eta=None, countdown=None, max_retries=None, **options):
         pass
 
+def qstat_xml(jobs):
+    """
+    Returns the output of qstat -xml listing the given (job id, state) tuples.
+    """
+    output = ['<?xml version=\'1.0\'?>\n', '<job_info>\n', '<queue_info>\n']
+    for (job_id, state) in jobs:
+        output += [
+            '<job_list state="running">\n',
+            '<JB_job_number>%s</JB_job_number>\n' % job_id,
+            '<JB_name>hostname</JB_name>\n',
+            '<JB_owner>sgeadmin</JB_owner>\n',
+            '<state>%s</state>\n' % state,
+            '<slots>1</slots>\n',
+            '</job_list>\n'
+        ]
+    output += ['</queue_info>\n', '<job_info>\n', '</job_info>\n',
+               '</job_info>\n']
+
+    return output
+
 def capture_mock(func):
     pass
 
@@ -46,6 +67,7 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
     def setUp(self):
         self._get_status_called  = False
         self._set_status_called  = False
+        metadata_cache().clear()
         self._upload_job_output = cumulus.tasks.job.upload_job_output.delay = mock.Mock()
 
     @mock.patch('cumulus.tasks.job.get_connection')
@@ -71,11 +93,11 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
             'output': []
         }
 
-        conn.execute.return_value = 'qstat output'
+        conn.execute.return_value = qstat_xml([])
 
         def _get_status(url, request):
             content = {
-                'status': 'terminating'
+                job_id: 'terminating'
             }
             content = json.dumps(content).encode('utf8')
             headers = {
@@ -87,17 +109,17 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
             return httmock.response(200, content, headers, request=request)
 
         def _set_status(url, request):
-            expected = {u'status': u'terminated', u'timings': {}, u'output': []}
+            expected = [{u'_id': job_id, u'status': u'terminated', u'timings': {}}]
 
             self._set_status_called = json.loads(request.body) == expected
 
             return httmock.response(200, None, {}, request=request)
 
-        status_url = '/api/v1/jobs/%s/status' % job_id
+        status_url = '/api/v1/jobs/status'
         get_status = httmock.urlmatch(
             path=r'^%s$' % status_url, method='GET')(_get_status)
 
-        status_update_url = '/api/v1/jobs/%s' % job_id
+        status_update_url = '/api/v1/jobs'
         set_status = httmock.urlmatch(
             path=r'^%s$' % status_update_url, method='PATCH')(_set_status)
 
@@ -134,11 +156,11 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
             'dir': '/home/test/%s' % job_id
         }
 
-        conn.execute.return_value = 'qstat output'
+        conn.execute.return_value = qstat_xml([])
 
         def _get_status(url, request):
             content = {
-                'status': 'running'
+                job_id: 'running'
             }
             content = json.dumps(content).encode('utf8')
             headers = {
@@ -150,16 +172,16 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
             return httmock.response(200, content, headers, request=request)
 
         def _set_status(url, request):
-            expected = {'status': 'uploading', 'timings': {}, 'output': [{'itemId': u'dummy'}]}
+            expected = [{u'_id': job_id, 'status': 'uploading', 'timings': {}}]
             self._set_status_called = json.loads(request.body) == expected
 
             return httmock.response(200, None, {}, request=request)
 
-        status_url = '/api/v1/jobs/%s/status' % job_id
+        status_url = '/api/v1/jobs/status'
         get_status = httmock.urlmatch(
             path=r'^%s$' % status_url, method='GET')(_get_status)
 
-        status_update_url = '/api/v1/jobs/%s' % job_id
+        status_update_url = '/api/v1/jobs'
         set_status = httmock.urlmatch(
             path=r'^%s$' % status_update_url, method='PATCH')(_set_status)
 
@@ -168,6 +190,10 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
 
         self.assertTrue(self._get_status_called, 'Expect get status endpoint to be hit')
         self.assertTrue(self._set_status_called, 'Expect set status endpoint to be hit')
+        # The poll bookkeeping is time dependent so remove it before comparing
+        for (args, _) in self._upload_job_output.call_args_list:
+            args[1].pop('nextPoll', None)
+            args[1].pop('pollCount', None)
         expected_calls = [[[{u'config': {u'_id': u'dummy', u'scheduler': {u'type': u'sge'}}, u'name': u'dummy', u'type': u'ec2', u'_id': u'dummy'}, {u'status': u'uploading', u'output': [{u'itemId': u'dummy'}], u'_id': u'dummy', u'queueJobId': u'dummy', u'name': u'dummy', u'dir': u'/home/test/dummy'}], {u'girder_token': u's', u'log_write_url': 1, u'job_dir': u'/home/test/dummy'}]]
         self.assertCalls(self._upload_job_output.call_args_list, expected_calls)
 
@@ -194,13 +220,11 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
             'output': []
         }
 
-        conn.execute.return_value = [ 'job-ID  prior   name       user         state submit/start at     queue  slots ja-task-ID',
-                             '-----------------------------------------------------------------------------------------',
-                             '1 0.00000 hostname   sgeadmin     r     09/09/2009 14:58:14                1']
+        conn.execute.return_value = qstat_xml([('1', 'r')])
 
         def _get_status(url, request):
             content = {
-                'status': 'running'
+                job_id: 'running'
             }
             content = json.dumps(content).encode('utf8')
             headers = {
@@ -212,7 +236,7 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
             return httmock.response(200, content, headers, request=request)
 
         def _set_status(url, request):
-            expected = {'status': 'running', 'timings': {}, 'output': []}
+            expected = [{u'_id': job_id, 'status': 'running', 'timings': {}}]
             self._set_status_called = json.loads(request.body) == expected
 
             if not self._set_status_called:
@@ -220,11 +244,11 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
 
             return httmock.response(200, None, {}, request=request)
 
-        status_url = '/api/v1/jobs/%s/status' % job_id
+        status_url = '/api/v1/jobs/status'
         get_status = httmock.urlmatch(
             path=r'^%s$' % status_url, method='GET')(_get_status)
 
-        status_update_url = '/api/v1/jobs/%s' % job_id
+        status_update_url = '/api/v1/jobs'
         set_status = httmock.urlmatch(
             path=r'^%s$' % status_update_url, method='PATCH')(_set_status)
 
@@ -258,13 +282,11 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
             'output': []
         }
 
-        conn.execute.return_value = [ 'job-ID  prior   name       user         state submit/start at     queue  slots ja-task-ID',
-                             '-----------------------------------------------------------------------------------------',
-                             '1 0.00000 hostname   sgeadmin     q     09/09/2009 14:58:14                1']
+        conn.execute.return_value = qstat_xml([('1', 'q')])
 
         def _get_status(url, request):
             content = {
-                'status': 'queued'
+                job_id: 'queued'
             }
             content = json.dumps(content).encode('utf8')
             headers = {
@@ -276,16 +298,16 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
             return httmock.response(200, content, headers, request=request)
 
         def _set_status(url, request):
-            expected = {'status': 'queued', 'timings': {}, 'output': []}
+            expected = [{u'_id': job_id, 'status': 'queued', 'timings': {}}]
             self._set_status_called = json.loads(request.body) == expected
 
             return httmock.response(200, None, {}, request=request)
 
-        status_url = '/api/v1/jobs/%s/status' % job_id
+        status_url = '/api/v1/jobs/status'
         get_status = httmock.urlmatch(
             path=r'^%s$' % status_url, method='GET')(_get_status)
 
-        status_update_url = '/api/v1/jobs/%s' % job_id
+        status_update_url = '/api/v1/jobs'
         set_status = httmock.urlmatch(
             path=r'^%s$' % status_update_url, method='PATCH')(_set_status)
 
@@ -320,13 +342,13 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
         }
 
         conn = get_connection.return_value.__enter__.return_value
-        conn.execute.side_effect = [ 'job-ID  prior   name       user         state submit/start at     queue  slots ja-task-ID',
-                             '-----------------------------------------------------------------------------------------',
-                             '1 0.00000 hostname   sgeadmin     r     09/09/2009 14:58:14                1'], ['i have a tail', 'asdfas']
+        conn.execute.return_value = qstat_xml([('1', 'r')])
+        # The last line is incomplete so should not be sent
+        conn.read.return_value = b'i have a tail\nasdfas\npartial'
 
         def _get_status(url, request):
             content = {
-                'status': 'running'
+                job_id: 'running'
             }
             content = json.dumps(content).encode('utf8')
             headers = {
@@ -338,7 +360,7 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
             return httmock.response(200, content, headers, request=request)
 
         def _set_status(url, request):
-            expected = {u'status': u'running', u'output': [{u'content': [u'i have a tail', u'asdfas'], u'path': u'dummy/file/path', u'tail': True}], u'timings': {}}
+            expected = [{u'_id': job_id, u'status': u'running', u'timings': {}}]
             self._set_status_called = json.loads(request.body) == expected
 
             if not self._set_status_called:
@@ -346,24 +368,93 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
 
             return httmock.response(200, None, {}, request=request)
 
-        status_url = '/api/v1/jobs/%s/status' % job_id
+        self._append_output_called = False
+        def _append_output(url, request):
+            expected = [{u'path': u'dummy/file/path', u'content': [u'i have a tail\n', u'asdfas\n'], u'offset': 21}]
+            self._append_output_called = json.loads(request.body) == expected
+
+            return httmock.response(200, None, {}, request=request)
+
+        status_url = '/api/v1/jobs/status'
         get_status = httmock.urlmatch(
             path=r'^%s$' % status_url, method='GET')(_get_status)
 
-        status_update_url = '/api/v1/jobs/%s' % job_id
+        status_update_url = '/api/v1/jobs'
         set_status = httmock.urlmatch(
             path=r'^%s$' % status_update_url, method='PATCH')(_set_status)
 
-        with httmock.HTTMock(get_status, set_status):
+        append_output_url = '/api/v1/jobs/%s/output' % job_id
+        append_output = httmock.urlmatch(
+            path=r'^%s$' % append_output_url, method='POST')(_append_output)
+
+        with httmock.HTTMock(get_status, set_status, append_output):
             job.monitor_job(cluster, job_model, **{'girder_token': 's', 'log_write_url': 1})
 
         self.assertTrue(self._get_status_called, 'Expect get status endpoint to be hit')
         self.assertTrue(self._set_status_called, 'Expect set status endpoint to be hit')
+        self.assertTrue(self._append_output_called, 'Expect append output endpoint to be hit')
+        conn.read.assert_called_once_with('/home/test/dummy/file/path', 0)
+        self.assertEqual(job_model['output'][0]['tailOffset'], 21)
+
+    @mock.patch('cumulus.tasks.job.monitor_process')
+    @mock.patch('cumulus.tasks.job.get_connection')
+    def test_download_job_input_cache(self, get_connection, monitor_process):
+        cluster = {
+            '_id': 'bob',
+            'type': 'trad',
+            'name': 'dummy',
+            'config': {
+                'host': 'dummy',
+                'inputCache': {
+                    'path': 'input cache; rm -rf ~',
+                    'maxSize': '1000'
+                }
+            }
+        }
+        job_id = 'dummy'
+        job_model = {
+            '_id': job_id,
+            'name': 'dummy',
+            'commands': ['ls'],
+            'input': []
+        }
+
+        conn = get_connection.return_value.__enter__.return_value
+        conn.execute.return_value = ['1234']
+        scripts = []
+
+        def _put(fp, path):
+            if hasattr(fp, 'getvalue'):
+                scripts.append(fp.getvalue())
+
+        conn.put.side_effect = _put
+
+        def _set_status(url, request):
+            content = json.dumps({}).encode('utf8')
+            headers = {
+                'content-length': len(content),
+                'content-type': 'application/json'
+            }
+
+            return httmock.response(200, content, headers, request=request)
+
+        set_status = httmock.urlmatch(
+            path=r'^/api/v1/jobs/%s$' % job_id, method='PATCH')(_set_status)
+
+        with httmock.HTTMock(set_status):
+            job.download_job_input_items(cluster, job_model,
+                                         girder_token='girder_token')
+
+        # The cache path should be quoted and the size converted
+        self.assertEqual(len(scripts), 1)
+        self.assertIn(' --cache-dir \'input cache; rm -rf ~\' '
+                      '--cache-size 1000 ', scripts[0])
+        self.assertEqual(monitor_process.delay.call_count, 1)
 
     @mock.patch('cumulus.celery.command.Task.retry')
-    @mock.patch('cumulus.tasks.job.monitor_job')
+    @mock.patch('cumulus.tasks.job.monitor_cluster_jobs')
     @mock.patch('cumulus.tasks.job.get_connection', autospec=True)
-    def test_submit_job(self, get_connection, *args):
+    def test_submit_job(self, get_connection, monitor_cluster_jobs, *args):
 
         cluster = {
             '_id': 'bob',
@@ -401,7 +492,8 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
         qsub_output = ['Your job 74 ("test.sh") has been submitted']
 
         conn = get_connection.return_value.__enter__.return_value
-        conn.execute.side_effect = [['/home/test'], qconf_output, qsub_output]
+        conn.home_dir.return_value = '/home/test'
+        conn.execute.side_effect = [qconf_output, qsub_output]
 
         def _get_status(url, request):
             content = {
@@ -451,13 +543,32 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
         log = httmock.urlmatch(
             path=r'^%s$' % log_url, method='POST')(_log)
 
-        with httmock.HTTMock(get_status, set_status, log):
+        def _acquire_monitor(url, request):
+            content = {
+                'acquired': True
+            }
+            content = json.dumps(content).encode('utf8')
+            headers = {
+                'content-length': len(content),
+                'content-type': 'application/json'
+            }
+
+            return httmock.response(200, content, headers, request=request)
+
+        monitor_url = '/api/v1/clusters/[^/]+/monitor'
+        acquire_monitor = httmock.urlmatch(
+            path=r'^%s$' % monitor_url, method='PUT')(_acquire_monitor)
+
+        with httmock.HTTMock(get_status, set_status, log, acquire_monitor):
             job.submit_job(cluster, job_model, log_write_url='log_write_url',
                            girder_token='girder_token')
 
-        self.assertEqual(conn.execute.call_args_list[1],
+        self.assertEqual(conn.execute.call_args_list[0],
                          mock.call('qconf -sp orte'), 'Unexpected qconf command: %s' %
                          str(conn.execute.call_args_list[0]))
+        # The cluster monitor should have been started
+        self.assertEqual(
+            monitor_cluster_jobs.s.return_value.apply_async.call_count, 1)
 
         # Specifying and parallel environment
         job_model = {
@@ -484,12 +595,13 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
                         'accounting_summary FALSE']
 
         conn.reset_mock()
-        conn.execute.side_effect = [['/home/test'], qconf_output, qsub_output]
+        conn.home_dir.return_value = '/home/test'
+        conn.execute.side_effect = [qconf_output, qsub_output]
 
-        with httmock.HTTMock(get_status, set_status, log):
+        with httmock.HTTMock(get_status, set_status, log, acquire_monitor):
             job.submit_job(cluster, job_model, log_write_url='log_write_url',
                            girder_token='girder_token')
-        self.assertEqual(conn.execute.call_args_list[1],
+        self.assertEqual(conn.execute.call_args_list[0],
                          mock.call('qconf -sp mype'), 'Unexpected qconf command: %s' %
                          str(conn.execute.call_args_list[0]))
 
@@ -519,9 +631,10 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
         }
 
         conn.reset_mock()
-        conn.execute.side_effect = [['/home/test'], ['Your job 74 ("test.sh") has been submitted']]
+        conn.home_dir.return_value = '/home/test'
+        conn.execute.side_effect = [['Your job 74 ("test.sh") has been submitted']]
 
-        with httmock.HTTMock(get_status, set_status, log):
+        with httmock.HTTMock(get_status, set_status, log, acquire_monitor):
             job.submit_job(cluster, job_model, log_write_url='log_write_url',
                            girder_token='girder_token')
 
@@ -557,13 +670,14 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
         }
 
         conn.reset_mock()
-        conn.execute.side_effect = [['/home/test'], qconf_output, ['Your job 74 ("test.sh") has been submitted']]
+        conn.home_dir.return_value = '/home/test'
+        conn.execute.side_effect = [qconf_output, ['Your job 74 ("test.sh") has been submitted']]
 
-        with httmock.HTTMock(get_status, set_status, log):
+        with httmock.HTTMock(get_status, set_status, log, acquire_monitor):
             job.submit_job(cluster, job_model, log_write_url='log_write_url',
                            girder_token='girder_token')
 
-        self.assertEqual(conn.execute.call_args_list[1], mock.call('qconf -sp mype'))
+        self.assertEqual(conn.execute.call_args_list[0], mock.call('qconf -sp mype'))
         self.assertEqual(job_model['params']['numberOfSlots'], 10)
 
     @mock.patch('cumulus.tasks.job.get_connection')
@@ -598,54 +712,43 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
         }
 
 
-        conn.execute.return_value = [ 'job-ID  prior   name       user         state submit/start at     queue  slots ja-task-ID',
-                             '-----------------------------------------------------------------------------------------',
-                             '1 0.00000 hostname   sgeadmin     q     09/09/2009 14:58:14                1',
-                             '2 0.00000 hostname   sgeadmin     q     09/09/2009 14:58:14                1']
+        conn.execute.return_value = qstat_xml([('1', 'q'), ('2', 'q')])
 
         self._get_status_calls = {}
         self._set_status_calls = {}
 
         def _get_status(url, request):
             content = {
-                'status': 'queued'
+                job1_id: 'queued',
+                job2_id: 'queued'
             }
             content = json.dumps(content).encode('utf8')
             headers = {
                 'content-length': len(content),
                 'content-type': 'application/json'
             }
-            job_id = url.path.split('/')[-2]
 
-            self._get_status_calls[job_id]  = True
+            for job_id in url.query.split('=')[1].split('%2C'):
+                self._get_status_calls[job_id]  = True
             return httmock.response(200, content, headers, request=request)
 
         def _set_status(url, request):
-            expected = {'status': 'queued', 'timings': {}, 'output': []}
-            job_id = url.path.split('/')[-1]
-            self._set_status_calls[job_id] = True
-            self._set_status_called = json.loads(request.body) == expected
+            expected = {'status': 'queued', 'timings': {}}
+            for update in json.loads(request.body):
+                job_id = update.pop('_id')
+                self._set_status_calls[job_id] = update == expected
 
             return httmock.response(200, None, {}, request=request)
 
-        job1_status_url = '/api/v1/jobs/%s/status' % job1_id
+        job1_status_url = '/api/v1/jobs/status'
         job1_get_status = httmock.urlmatch(
             path=r'^%s$' % job1_status_url, method='GET')(_get_status)
 
-        job1_status_update_url = '/api/v1/jobs/%s' % job1_id
+        job1_status_update_url = '/api/v1/jobs'
         job1_set_status = httmock.urlmatch(
             path=r'^%s$' % job1_status_update_url, method='PATCH')(_set_status)
 
-        job2_status_url = '/api/v1/jobs/%s/status' % job2_id
-        job2_get_status = httmock.urlmatch(
-            path=r'^%s$' % job2_status_url, method='GET')(_get_status)
-
-        job2_status_update_url = '/api/v1/jobs/%s' % job2_id
-        job2_set_status = httmock.urlmatch(
-            path=r'^%s$' % job2_status_update_url, method='PATCH')(_set_status)
-
-        with httmock.HTTMock(job1_get_status, job1_set_status,
-                             job2_get_status, job2_set_status):
+        with httmock.HTTMock(job1_get_status, job1_set_status):
             job.monitor_jobs(cluster, [job1_model, job2_model], **{'girder_token': 's', 'log_write_url': 1})
 
         self.assertTrue(self._get_status_calls[job1_id])
@@ -687,52 +790,43 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
         }
 
 
-        conn.execute.return_value = [ 'job-ID  prior   name       user         state submit/start at     queue  slots ja-task-ID',
-                             '-----------------------------------------------------------------------------------------']
+        conn.execute.return_value = qstat_xml([])
 
         self._get_status_calls = {}
         self._set_status_calls = {}
 
         def _get_status(url, request):
             content = {
-                'status': 'complete'
+                job1_id: 'complete',
+                job2_id: 'complete'
             }
             content = json.dumps(content).encode('utf8')
             headers = {
                 'content-length': len(content),
                 'content-type': 'application/json'
             }
-            job_id = url.path.split('/')[-2]
 
-            self._get_status_calls[job_id]  = True
+            for job_id in url.query.split('=')[1].split('%2C'):
+                self._get_status_calls[job_id]  = True
             return httmock.response(200, content, headers, request=request)
 
         def _set_status(url, request):
-            expected = {'status': 'complete', 'timings': {}, 'output': []}
-            job_id = url.path.split('/')[-1]
-            self._set_status_calls[job_id] = True
-            self._set_status_called = json.loads(request.body) == expected
+            expected = {'status': 'complete', 'timings': {}}
+            for update in json.loads(request.body):
+                job_id = update.pop('_id')
+                self._set_status_calls[job_id] = update == expected
 
             return httmock.response(200, None, {}, request=request)
 
-        job1_status_url = '/api/v1/jobs/%s/status' % job1_id
+        job1_status_url = '/api/v1/jobs/status'
         job1_get_status = httmock.urlmatch(
             path=r'^%s$' % job1_status_url, method='GET')(_get_status)
 
-        job1_status_update_url = '/api/v1/jobs/%s' % job1_id
+        job1_status_update_url = '/api/v1/jobs'
         job1_set_status = httmock.urlmatch(
             path=r'^%s$' % job1_status_update_url, method='PATCH')(_set_status)
 
-        job2_status_url = '/api/v1/jobs/%s/status' % job2_id
-        job2_get_status = httmock.urlmatch(
-            path=r'^%s$' % job2_status_url, method='GET')(_get_status)
-
-        job2_status_update_url = '/api/v1/jobs/%s' % job2_id
-        job2_set_status = httmock.urlmatch(
-            path=r'^%s$' % job2_status_update_url, method='PATCH')(_set_status)
-
-        with httmock.HTTMock(job1_get_status, job1_set_status,
-                             job2_get_status, job2_set_status):
+        with httmock.HTTMock(job1_get_status, job1_set_status):
             job.monitor_jobs(cluster, [job1_model, job2_model], **{'girder_token': 's', 'log_write_url': 1})
 
         self.assertTrue(self._get_status_calls[job1_id])
@@ -744,3 +838,135 @@ class JobTestCase(AssertCallsMixin, unittest.TestCase):
 
 
 
+
+    @mock.patch('cumulus.tasks.job.get_connection')
+    @mock.patch('cumulus.celery.monitor.Task.retry')
+    def test_monitor_cluster_jobs(self, retry, get_connection):
+        conn = get_connection.return_value.__enter__.return_value
+
+        cluster = {
+            '_id': 'lost',
+            'type': 'ec2',
+            'name': 'dummy',
+            'config': {
+                '_id': 'dummy',
+                'scheduler': {
+                    'type': 'sge'
+                }
+            }
+        }
+        active_jobs = [{
+            '_id': 'dummy%d' % i,
+            'queueJobId': str(i),
+            'name': 'dummy',
+            'status': 'queued',
+            'output': []
+        } for i in range(1, 3)]
+
+        conn.execute.return_value = qstat_xml([('1', 'r'), ('2', 'q')])
+
+        self._set_status_calls = {}
+
+        def _json_response(content, request):
+            content = json.dumps(content).encode('utf8')
+            headers = {
+                'content-length': len(content),
+                'content-type': 'application/json'
+            }
+
+            return httmock.response(200, content, headers, request=request)
+
+        tokens = []
+
+        # A newer token has been handed over by a submitted job
+        def _acquire_monitor(url, request):
+            return _json_response({'acquired': True, 'token': 'new'}, request)
+
+        def _jobs(url, request):
+            tokens.append(request.headers['Girder-Token'])
+            return _json_response(active_jobs, request)
+
+        def _get_status(url, request):
+            return _json_response({
+                'dummy1': 'queued',
+                'dummy2': 'queued'
+            }, request)
+
+        def _set_status(url, request):
+            for update in json.loads(request.body):
+                self._set_status_calls[update['_id']] = update['status']
+
+            return httmock.response(200, None, {}, request=request)
+
+        acquire_monitor = httmock.urlmatch(
+            path=r'^/api/v1/clusters/lost/monitor$', method='PUT')(
+                _acquire_monitor)
+        jobs = httmock.urlmatch(
+            path=r'^/api/v1/clusters/lost/jobs$', method='GET')(_jobs)
+        get_status = httmock.urlmatch(
+            path=r'^/api/v1/jobs/status$', method='GET')(_get_status)
+        set_status = httmock.urlmatch(
+            path=r'^/api/v1/jobs$', method='PATCH')(_set_status)
+
+        monitored_jobs = []
+        with httmock.HTTMock(acquire_monitor, jobs, get_status, set_status):
+            job.monitor_cluster_jobs(cluster, 'owner', monitored_jobs,
+                                     girder_token='s')
+
+        # One scheduler query for all the jobs
+        self.assertEqual(conn.execute.call_count, 1)
+        self.assertEqual(self._set_status_calls, {
+            'dummy1': 'running',
+            'dummy2': 'queued'
+        })
+        # The monitored jobs are carried over to the next poll
+        self.assertEqual([j['_id'] for j in monitored_jobs],
+                         ['dummy1', 'dummy2'])
+        self.assertTrue(retry.call_args_list)
+        # The monitor should switch to the newer token
+        self.assertEqual(tokens, ['new'])
+        self.assertEqual(retry.call_args[1]['kwargs']['girder_token'], 'new')
+
+    def test_poll_interval(self):
+        cluster = {
+            '_id': 'dummy',
+            'type': 'ec2',
+            'config': {
+                'pollSchedule': {
+                    'maxInterval': {
+                        'running': 20
+                    }
+                }
+            }
+        }
+        job_model = {
+            '_id': 'dummy',
+            'params': {
+                'pollSchedule': {
+                    'initialInterval': 2
+                }
+            }
+        }
+
+        schedule = job._poll_schedule(cluster, job_model)
+        self.assertEqual(schedule['initialInterval'], 2)
+        self.assertEqual(schedule['maxInterval']['running'], 20)
+        self.assertEqual(schedule['maxInterval']['queued'], 120)
+
+        # Back off exponentially up to the cap for the state
+        intervals = [job._poll_interval(schedule, 'running', polls)
+                     for polls in range(0, 6)]
+        self.assertEqual(intervals, [2, 4, 8, 16, 20, 20])
+        intervals = [job._poll_interval(schedule, 'queued', polls)
+                     for polls in range(0, 8)]
+        self.assertEqual(intervals, [2, 4, 8, 16, 32, 64, 120, 120])
+
+        # Poll fast again after a state change
+        job_model['status'] = 'queued'
+        for i in range(0, 3):
+            job._schedule_next_poll(cluster, job_model, 'queued')
+        self.assertEqual(job_model['pollCount'], 3)
+        job_model['status'] = 'running'
+        job._schedule_next_poll(cluster, job_model, 'queued')
+        self.assertEqual(job_model['pollCount'], 0)
+        self.assertTrue(job._next_poll_countdown([job_model]) <= 2)
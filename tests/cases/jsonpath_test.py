@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright 2016 Kitware Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+
+import unittest
+import jsonpath_rw
+
+from cumulus.common import jsonpath
+from cumulus.common.jsonpath import parse, get_property, DottedPath
+
+
+class JsonPathTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._doc = {
+            'config': {
+                'host': 'localhost',
+                'ssh': {
+                    'user': 'bob',
+                    'passphrase': None
+                },
+                'list': [1, 2, 3],
+                'str': 'value'
+            }
+        }
+
+    def test_dotted_path(self):
+        paths = ['config', 'config.host', 'config.ssh.user',
+                 'config.ssh.passphrase', 'config.missing', 'missing.host',
+                 'config.list.host', 'config.str.host', 'config.host.x']
+
+        # The fast path should produce the same values as jsonpath_rw
+        for path in paths:
+            self.assertTrue(isinstance(parse(path), DottedPath))
+            expected = [m.value for m in jsonpath_rw.parse(path)
+                        .find(self._doc)]
+            found = [m.value for m in parse(path).find(self._doc)]
+            self.assertEqual(found, expected, path)
+
+    def test_cache(self):
+        path = 'config.list[1]'
+        expr = parse(path)
+        self.assertFalse(isinstance(expr, DottedPath))
+        self.assertTrue(parse(path) is expr)
+        self.assertEqual(expr.find(self._doc)[0].value, 2)
+        self.assertTrue(parse('config.host') is parse('config.host'))
+
+        # Make sure the cache is bounded
+        max_cache_size = jsonpath._max_cache_size
+        try:
+            jsonpath._max_cache_size = 2
+            for i in range(5):
+                parse('path%d' % i)
+            self.assertTrue(len(jsonpath._cache) <= 2)
+        finally:
+            jsonpath._max_cache_size = max_cache_size
+
+    def test_get_property(self):
+        self.assertEqual(get_property('config.ssh.user', self._doc), 'bob')
+        self.assertEqual(get_property('config.ssh.key', self._doc, 'key'),
+                         'key')
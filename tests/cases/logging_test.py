@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright 2016 Kitware Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+
+import unittest
+import httmock
+import json
+import logging
+
+from cumulus.logging import BufferedRESTfulLogHandler
+
+
+class BufferedRESTfulLogHandlerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._posted = []
+        self._status_code = 200
+
+    def _logger(self, handler):
+        logger = logging.getLogger('buffered_test.%s' % id(handler))
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(handler)
+
+        return logger
+
+    def _log_mock(self):
+        def _log(url, request):
+            if self._status_code == 200:
+                self._posted.append(json.loads(request.body))
+
+            return httmock.response(self._status_code, None, {},
+                                    request=request)
+
+        return httmock.urlmatch(path=r'^/log$', method='POST')(_log)
+
+    def test_batch(self):
+        # Use a long interval so records are only sent when we flush
+        handler = BufferedRESTfulLogHandler(
+            'token', 'http://localhost/log', capacity=10, flush_interval=60)
+        logger = self._logger(handler)
+
+        with httmock.HTTMock(self._log_mock()):
+            for i in range(3):
+                logger.info('message %d' % i)
+
+            self.assertEqual(self._posted, [])
+            handler.flush()
+            handler.close()
+
+        self.assertEqual(len(self._posted), 1)
+        self.assertEqual([r['msg'] for r in self._posted[0]],
+                         ['message 0', 'message 1', 'message 2'])
+
+    def test_bounded_when_server_down(self):
+        handler = BufferedRESTfulLogHandler(
+            'token', 'http://localhost/log', capacity=10, flush_interval=60,
+            max_records=2)
+        logger = self._logger(handler)
+
+        self._status_code = 500
+        with httmock.HTTMock(self._log_mock()):
+            for i in range(3):
+                logger.info('message %d' % i)
+            handler.flush()
+
+            # Now the server is back we should get the newest records
+            self._status_code = 200
+            handler.flush()
+            handler.close()
+
+        self.assertEqual(len(self._posted), 1)
+        self.assertEqual([r['msg'] for r in self._posted[0]],
+                         ['message 1', 'message 2'])
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+###############################################################################
+#  Copyright 2016 Kitware Inc.
+#
+#  Licensed under the Apache License, Version 2.0 ( the "License" );
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+###############################################################################
+
+import unittest
+import mock
+
+from cumulus.transport.abstract import AbstractConnection
+from cumulus.transport.metadata import ClusterMetadataCache, metadata_cache
+from cumulus.transport.metadata import cluster_key
+
+
+class DummyConnection(AbstractConnection):
+    def __init__(self, cluster, output):
+        self._cluster = cluster
+        self.execute = mock.MagicMock(return_value=output)
+
+
+class ClusterMetadataCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._cluster = {
+            '_id': 'dummy',
+            'config': {
+                'host': 'dummy',
+                'ssh': {
+                    'user': 'dummy'
+                }
+            }
+        }
+        metadata_cache().clear()
+
+    def test_get(self):
+        cache = ClusterMetadataCache(ttl=60)
+        key = cluster_key(self._cluster)
+        fetch = mock.MagicMock(return_value='/home/dummy')
+
+        self.assertEqual(cache.get(key, 'homeDir', fetch), '/home/dummy')
+        self.assertEqual(cache.get(key, 'homeDir', fetch), '/home/dummy')
+        self.assertEqual(fetch.call_count, 1)
+
+        # Each user on the cluster has their own values
+        self._cluster['config']['ssh']['user'] = 'other'
+        cache.get(cluster_key(self._cluster), 'homeDir', fetch)
+        self.assertEqual(fetch.call_count, 2)
+
+        cache.invalidate(key)
+        cache.get(key, 'homeDir', fetch)
+        self.assertEqual(fetch.call_count, 3)
+
+    def test_expired(self):
+        cache = ClusterMetadataCache(ttl=60)
+        key = cluster_key(self._cluster)
+        fetch = mock.MagicMock(return_value=10)
+
+        with mock.patch('time.time', return_value=1000):
+            cache.get(key, 'slots.orte', fetch)
+        with mock.patch('time.time', return_value=1030):
+            cache.get(key, 'slots.orte', fetch)
+        self.assertEqual(fetch.call_count, 1)
+
+        with mock.patch('time.time', return_value=1061):
+            cache.get(key, 'slots.orte', fetch)
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_home_dir(self):
+        conn = DummyConnection(self._cluster, ['/home/dummy\n'])
+        self.assertEqual(conn.home_dir(), '/home/dummy')
+        self.assertEqual(conn.home_dir(), '/home/dummy')
+        conn.execute.assert_called_once_with('pwd')
+
+        # Output from the users profile means we can't tell which line it is
+        metadata_cache().clear()
+        conn = DummyConnection(self._cluster, ['Welcome!\n', '/home/dummy\n'])
+        with self.assertRaises(Exception):
+            conn.home_dir()
@@ -1,6 +1,7 @@
 import unittest
 import mock
 import os
+import json
 
 from cumulus.queue import get_queue_adapter
 from cumulus.queue.abstract import AbstractQueueAdapter
@@ -54,6 +55,26 @@ class PbsQueueAdapterTestCase(unittest.TestCase):
         self.assertIsNotNone(cm.exception)
 
 
+    def _qstat_json(self, jobs):
+        status = {
+            'timestamp': 1447852689,
+            'pbs_version': '13.0.1',
+            'pbs_server': 'ulex',
+            'Jobs': {}
+        }
+        for (name, state, exit_status) in jobs:
+            job = {
+                'Job_Name': 'sleep.sh',
+                'Job_Owner': 'cjh@ulex',
+                'job_state': state,
+                'queue': 'batch'
+            }
+            if exit_status is not None:
+                job['Exit_status'] = exit_status
+            status['Jobs'][name] = job
+
+        return json.dumps(status, indent=4).splitlines(True)
+
     def test_job_statuses(self):
         job1_id = '1126'
         job1 = {
@@ -63,26 +84,82 @@ class PbsQueueAdapterTestCase(unittest.TestCase):
         job2 = {
             AbstractQueueAdapter.QUEUE_JOB_ID: job2_id
         }
-        job_status_output = [
-            'Job id                    Name             User            Time Use S Queue',
-            '------------------------- ---------------- --------------- -------- - -----',
-            '%s.ulex                    sleep.sh         cjh             00:00:00 C batch' % job1_id,
-            '%s.ulex                    sleep.sh         cjh             00:00:00 C batch' % job2_id
-        ]
-        expected_calls = [mock.call('qstat %s' % job1_id)]
+        job3_id = '1128'
+        job3 = {
+            AbstractQueueAdapter.QUEUE_JOB_ID: job3_id
+        }
+        job_status_output = self._qstat_json([
+            ('%s.ulex' % job1_id, 'F', 0),
+            ('%s.ulex' % job2_id, 'R', None),
+            ('%s.ulex' % job3_id, 'F', 271)
+        ])
+        expected_calls = [mock.call('qstat -x -f -F json %s' % job1_id)]
         self._cluster_connection.execute.return_value = job_status_output
         status = self._adapter.job_statuses([job1])
         self.assertEqual(self._cluster_connection.execute.call_args_list, expected_calls)
         self.assertEqual(status[0][1], 'complete')
 
-        # Now try two jobs
+        # Now try three jobs
         self._cluster_connection.reset_mock()
-        expected_calls = [mock.call('qstat %s %s' % (job1_id, job2_id))]
+        expected_calls = [mock.call('qstat -x -f -F json %s %s %s'
+                                    % (job1_id, job2_id, job3_id))]
         self._cluster_connection.execute.return_value = job_status_output
-        status = self._adapter.job_statuses([job1, job2])
+        status = self._adapter.job_statuses([job1, job2, job3])
         self.assertEqual(self._cluster_connection.execute.call_args_list, expected_calls)
         self.assertEqual(status[0][1], 'complete')
-        self.assertEqual(status[1][1], 'complete')
+        self.assertEqual(status[1][1], 'running')
+        self.assertEqual(status[2][1], 'error')
+
+    def test_job_statuses_no_json(self):
+        job1_id = '1126'
+        job1 = {
+            AbstractQueueAdapter.QUEUE_JOB_ID: job1_id
+        }
+        job2_id = '1127'
+        job2 = {
+            AbstractQueueAdapter.QUEUE_JOB_ID: job2_id
+        }
+        job_status_output = [
+            'Job id                    Name             User            Time Use S Queue',
+            '------------------------- ---------------- --------------- -------- - -----',
+            '%s.ulex                    sleep.sh         cjh             00:00:00 C batch' % job1_id,
+            '%s.ulex                    sleep.sh         cjh             00:00:00 Q batch' % job2_id
+        ]
+        # Torque doesn't support -F json
+        self._cluster_connection.execute.side_effect = [
+            ['qstat: invalid option -- \'F\'\n'],
+            job_status_output
+        ]
+        status = self._adapter.job_statuses([job1, job2])
+        self.assertEqual(self._cluster_connection.execute.call_args_list[1],
+                         mock.call('qstat %s %s' % (job1_id, job2_id)))
+        self.assertEqual(status[0][1], 'complete')
+        self.assertEqual(status[1][1], 'queued')
+
+    def test_array_job_statuses(self):
+        job_id = '1126'
+        job = {
+            AbstractQueueAdapter.QUEUE_JOB_ID: job_id,
+            'parameterSets': [{'x': i} for i in range(4)]
+        }
+        job_status_output = self._qstat_json([
+            ('%s[].ulex' % job_id, 'B', None),
+            ('%s[1].ulex' % job_id, 'X', 0),
+            ('%s[2].ulex' % job_id, 'X', 1),
+            ('%s[3].ulex' % job_id, 'R', None),
+            ('%s[4].ulex' % job_id, 'Q', None)
+        ])
+        expected_calls = [mock.call('qstat -x -f -F json -t %s[]' % job_id)]
+        self._cluster_connection.execute.return_value = job_status_output
+        status = self._adapter.job_statuses([job])
+        self.assertEqual(self._cluster_connection.execute.call_args_list, expected_calls)
+        self.assertEqual(status[0][1], 'running')
+        self.assertEqual(job['taskStates'], {
+            'queued': 1,
+            'running': 1,
+            'error': 1,
+            'complete': 1
+        })
 
     def test_submission_template_pbs(self):
         cluster = {
@@ -74,6 +74,33 @@ class SgeQueueAdapterTestCase(unittest.TestCase):
         self.assertIsNotNone(cm.exception)
 
 
+    def _qstat_xml(self, jobs):
+        job_list = []
+        for (job_id, state, tasks) in jobs:
+            job_list.append(
+                '    <job_list state="running">\n'
+                '      <JB_job_number>%s</JB_job_number>\n'
+                '      <JAT_prio>0.50000</JAT_prio>\n'
+                '      <JB_name>test.sh</JB_name>\n'
+                '      <JB_owner>cjh</JB_owner>\n'
+                '      <state>%s</state>\n'
+                '      <slots>1</slots>\n'
+                '%s'
+                '    </job_list>\n' % (
+                    job_id, state,
+                    '      <tasks>%s</tasks>\n' % tasks if tasks else ''))
+
+        return [
+            '<?xml version=\'1.0\'?>\n',
+            '<job_info  xmlns:xsd="http://gridscheduler.svn.sourceforge.net/viewvc/gridscheduler/trunk/source/dist/util/resources/schemas/qstat/qstat.xsd?revision=11">\n',
+            '  <queue_info>\n'
+        ] + job_list + [
+            '  </queue_info>\n',
+            '  <job_info>\n',
+            '  </job_info>\n',
+            '</job_info>\n'
+        ]
+
     def test_job_statuses(self):
         job1_id = '1126'
         job1 = {
@@ -83,26 +110,70 @@ class SgeQueueAdapterTestCase(unittest.TestCase):
         job2 = {
             AbstractQueueAdapter.QUEUE_JOB_ID: job2_id
         }
-        job_status_output = [
-            'job-ID  prior   name       user         state submit/start at     queue                          slots ja-task-ID',
-            '-----------------------------------------------------------------------------------------------------------------',
-            '%s 0.50000 test.sh    cjh          r     11/18/2015 13:18:09 main.q@ulmus.kitware.com           1' % job1_id,
-            '%s 0.50000 test.sh    cjh          q     11/18/2015 13:18:09 main.q@ulmus.kitware.com           1' % job2_id
-        ]
-        expected_calls = [mock.call('qstat')]
+        job3_id = '1128'
+        job3 = {
+            AbstractQueueAdapter.QUEUE_JOB_ID: job3_id
+        }
+        job_status_output = self._qstat_xml([
+            (job1_id, 'r', None),
+            (job2_id, 'hqw', None),
+            (job3_id, 'Eqw', None)
+        ])
+        expected_calls = [mock.call('qstat -xml')]
         self._cluster_connection.execute.return_value = job_status_output
         status = self._adapter.job_statuses([job1])
         self.assertEqual(self._cluster_connection.execute.call_args_list, expected_calls)
         self.assertEqual(status[0][1], 'running')
 
-        # Now try two jobs
+        # Now try three jobs
         self._cluster_connection.reset_mock()
-        expected_calls = [mock.call('qstat')]
+        expected_calls = [mock.call('qstat -xml')]
         self._cluster_connection.execute.return_value = job_status_output
-        status = self._adapter.job_statuses([job1, job2])
+        status = self._adapter.job_statuses([job1, job2, job3])
         self.assertEqual(self._cluster_connection.execute.call_args_list, expected_calls)
         self.assertEqual(status[0][1], 'running')
         self.assertEqual(status[1][1], 'queued')
+        self.assertEqual(status[2][1], 'error')
+
+        # A job that has left the queue
+        self._cluster_connection.execute.return_value = self._qstat_xml([])
+        status = self._adapter.job_statuses([job1])
+        self.assertEqual(status[0][1], None)
+
+        # Output that can't be parsed
+        self._cluster_connection.execute.return_value = [
+            'error: failed receiving gdi request\n'
+        ]
+        with self.assertRaises(Exception):
+            self._adapter.job_statuses([job1])
+
+    def test_array_job_statuses(self):
+        job_id = '1126'
+        job = {
+            AbstractQueueAdapter.QUEUE_JOB_ID: job_id,
+            'parameterSets': [{'x': i} for i in range(10)]
+        }
+        job_status_output = self._qstat_xml([
+            (job_id, 'r', '2'),
+            (job_id, 'r', '3'),
+            (job_id, 'qw', '4-10:2')
+        ])
+        self._cluster_connection.execute.return_value = job_status_output
+        status = self._adapter.job_statuses([job])
+        self.assertEqual(status[0][1], 'running')
+        # Tasks no longer listed have completed
+        self.assertEqual(job['taskStates'], {
+            'queued': 4,
+            'running': 2,
+            'error': 0,
+            'complete': 4
+        })
+
+        # Once all the tasks have left the queue the job is complete
+        self._cluster_connection.execute.return_value = self._qstat_xml([])
+        status = self._adapter.job_statuses([job])
+        self.assertEqual(status[0][1], 'complete')
+        self.assertEqual(job['taskStates']['complete'], 10)
 
     def test_unsupported(self):
         with self.assertRaises(Exception) as cm:
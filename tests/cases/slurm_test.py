@@ -64,18 +64,147 @@ class SlurmQueueAdapterTestCase(unittest.TestCase):
         job2 = {
             AbstractQueueAdapter.QUEUE_JOB_ID: job2_id
         }
+        job3_id = '1128'
+        job3 = {
+            AbstractQueueAdapter.QUEUE_JOB_ID: job3_id
+        }
 
         job_status_output = [
-              'JOBID PARTITION     NAME     USER  ST       TIME  NODES NODELIST(REASON)',
-              '%s general-c      hello_te cdc   R       0:14      2 f16n[10-11]' % job1_id,
-              '%s general-c      hello_te cdc   F       0:14      2 f16n[10-11]' % job2_id
+            'RUNNING|%s\n' % job1_id,
+            'FAILED|%s\n' % job2_id,
+            'CANCELLED by 1000|%s\n' % job3_id
         ]
-        expected_calls = [mock.call('squeue -j %s,%s' % (job1_id, job2_id))]
+        expected_calls = [mock.call('sacct --noheader --parsable2 '
+                                    '--allocations --format=State,JobID '
+                                    '--jobs=%s,%s,%s' % (job1_id, job2_id,
+                                                         job3_id))]
         self._cluster_connection.execute.return_value = job_status_output
-        status = self._adapter.job_statuses([job1, job2])
+        status = self._adapter.job_statuses([job1, job2, job3])
         self.assertEqual(self._cluster_connection.execute.call_args_list, expected_calls)
         self.assertEqual(status[0][1], 'running')
         self.assertEqual(status[1][1], 'error')
+        self.assertEqual(status[2][1], 'error')
+
+        # A job that completed successfully
+        self._cluster_connection.execute.return_value = [
+            'COMPLETED|%s\n' % job1_id
+        ]
+        status = self._adapter.job_statuses([job1])
+        self.assertEqual(status[0][1], 'complete')
+
+    def test_job_statuses_no_accounting(self):
+        job1_id = '1126'
+        job1 = {
+            AbstractQueueAdapter.QUEUE_JOB_ID: job1_id
+        }
+        job2_id = '1127'
+        job2 = {
+            AbstractQueueAdapter.QUEUE_JOB_ID: job2_id
+        }
+
+        self._cluster_connection.execute.side_effect = [
+            ['SLURM accounting storage is disabled\n'],
+            ['R,%s\n' % job1_id, 'PD,%s\n' % job2_id]
+        ]
+        status = self._adapter.job_statuses([job1, job2])
+        self.assertEqual(self._cluster_connection.execute.call_args_list[1],
+                         mock.call('squeue --noheader --format=%%t,%%i '
+                                   '--jobs=%s,%s' % (job1_id, job2_id)))
+        self.assertEqual(status[0][1], 'running')
+        self.assertEqual(status[1][1], 'queued')
+
+    def test_job_statuses_not_in_accounting(self):
+        job1_id = '1126'
+        job1 = {
+            AbstractQueueAdapter.QUEUE_JOB_ID: job1_id,
+            'status': 'queued'
+        }
+        job2_id = '1127'
+        job2 = {
+            AbstractQueueAdapter.QUEUE_JOB_ID: job2_id,
+            'status': 'running'
+        }
+
+        # sacct doesn't list the freshly submitted job yet
+        self._cluster_connection.execute.side_effect = [
+            ['RUNNING|%s\n' % job2_id],
+            ['PD,%s\n' % job1_id]
+        ]
+        status = self._adapter.job_statuses([job1, job2])
+        self.assertEqual(self._cluster_connection.execute.call_args_list[1],
+                         mock.call('squeue --noheader --format=%%t,%%i '
+                                   '--jobs=%s' % job1_id))
+        self.assertEqual(status[0][1], 'queued')
+        self.assertEqual(status[1][1], 'running')
+        self.assertIsInstance(job.Queued(None, job=job1).next(status[0][1]),
+                              job.Queued)
+
+    def test_job_statuses_held(self):
+        job1_id = '1126'
+        job1 = {
+            AbstractQueueAdapter.QUEUE_JOB_ID: job1_id,
+            'status': 'queued'
+        }
+        job2_id = '1127'
+        job2 = {
+            AbstractQueueAdapter.QUEUE_JOB_ID: job2_id,
+            'status': 'running'
+        }
+        job3_id = '1128'
+        job3 = {
+            AbstractQueueAdapter.QUEUE_JOB_ID: job3_id,
+            'status': 'running'
+        }
+
+        self._cluster_connection.execute.return_value = [
+            'REQUEUE_HOLD|%s\n' % job1_id,
+            'STOPPED|%s\n' % job2_id,
+            'SPECIAL_EXIT|%s\n' % job3_id
+        ]
+        status = self._adapter.job_statuses([job1, job2, job3])
+        self.assertEqual([s for (_, s) in status],
+                         ['queued', 'running', 'error'])
+
+        # An unrecognised state should leave the jobs where they are
+        self._cluster_connection.execute.return_value = [
+            'UNKNOWN|%s\n' % job1_id,
+            'UNKNOWN|%s\n' % job2_id
+        ]
+        status = self._adapter.job_statuses([job1, job2])
+        self.assertEqual([s for (_, s) in status], ['queued', 'running'])
+
+    def test_array_job_statuses(self):
+        job_id = '1126'
+        job = {
+            AbstractQueueAdapter.QUEUE_JOB_ID: job_id,
+            'parameterSets': [{'x': i} for i in range(10)]
+        }
+
+        job_status_output = [
+            'COMPLETED|%s_1' % job_id,
+            'COMPLETED|%s_2' % job_id,
+            'RUNNING|%s_3' % job_id,
+            'FAILED|%s_4' % job_id,
+            'PENDING|%s_[5-10%%2]' % job_id
+        ]
+        self._cluster_connection.execute.return_value = job_status_output
+        status = self._adapter.job_statuses([job])
+        self.assertEqual(status[0][1], 'running')
+        self.assertEqual(job['taskStates'], {
+            'queued': 6,
+            'running': 1,
+            'error': 1,
+            'complete': 2
+        })
+
+        # Once the other tasks have finished, the failed task is reported
+        self._cluster_connection.execute.return_value = \
+            job_status_output[:2] + [
+                'COMPLETED|%s_%d' % (job_id, i) for i in range(5, 11)
+            ] + ['FAILED|%s_4' % job_id, 'COMPLETED|%s_3' % job_id]
+        status = self._adapter.job_statuses([job])
+        self.assertEqual(status[0][1], 'error')
+        self.assertEqual(job['taskStates']['complete'], 9)
 
     def test_submission_template(self):
         cluster = {
@@ -126,6 +255,77 @@ class SlurmQueueAdapterTestCase(unittest.TestCase):
         self.assertEqual(script, expected)
 
 
+    def test_submission_template_array(self):
+        cluster = {
+            '_id': 'dummy',
+            'type': 'trad',
+            'name': 'dummy',
+            'config': {
+                'host': 'dummy',
+                'ssh': {
+                    'user': 'dummy',
+                    'passphrase': 'its a secret'
+                },
+                'scheduler': {
+                    'type': 'slurm'
+                }
+            }
+        }
+        job_id = '123432423'
+        job_model = {
+            '_id': job_id,
+            'queueJobId': '1',
+            'name': 'dummy',
+            'commands': ['ls', 'mpirun -n 1000000 parallel {{input}}'],
+            'parameterSets': [{'input': 'a.in'}, {'input': 'b.in'}],
+            'output': [{'tail': True,  'path': 'dummy/file/path'}]
+        }
+
+        path = os.path.join(os.environ["CUMULUS_SOURCE_DIRECTORY"],
+                            'tests', 'cases', 'fixtures', 'job',
+                            'slurm_submission_script_array.sh')
+
+        with open(path, 'r') as fp:
+            expected = fp.read()
+
+        script = job._generate_submission_script(job_model, cluster, {})
+        self.assertEqual(script, expected)
+
+    def test_submission_template_array_newt(self):
+        # NEWT clusters run SLURM, but the adapter needs a connection
+        cluster = {
+            '_id': 'dummy',
+            'type': 'newt',
+            'name': 'dummy',
+            'config': {
+                'host': 'dummy',
+                'scheduler': {
+                    'type': 'slurm'
+                }
+            }
+        }
+        job_id = '123432423'
+        job_model = {
+            '_id': job_id,
+            'queueJobId': '1',
+            'name': 'dummy',
+            'commands': ['ls', 'mpirun -n 1000000 parallel {{input}}'],
+            'parameterSets': [{'input': 'a.in'}, {'input': 'b.in'}],
+            'output': [{'tail': True,  'path': 'dummy/file/path'}]
+        }
+
+        path = os.path.join(os.environ["CUMULUS_SOURCE_DIRECTORY"],
+                            'tests', 'cases', 'fixtures', 'job',
+                            'slurm_submission_script_array.sh')
+
+        with open(path, 'r') as fp:
+            expected = fp.read()
+
+        conn = mock.MagicMock()
+        conn.session_id = 'dummy'
+        script = job._generate_submission_script(job_model, cluster, {}, conn)
+        self.assertEqual(script, expected)
+
     def test_submission_template_nodes(self):
         cluster = {
             '_id': 'dummy',
@@ -22,9 +22,22 @@ import os
 import tempfile
 import shutil
 import contextlib
+import json
+import mock
+import httmock
+
+from celery.canvas import Signature
 
 import cumulus
+from cumulus import taskflow
 from cumulus.taskflow.utility import find_modules
+from cumulus.celery import command
+
+
+@command.task
+def dummy_task():
+    pass
+
 
 class TaskFlowTestCase(unittest.TestCase):
 
@@ -69,7 +82,308 @@ class TaskFlowTestCase(unittest.TestCase):
             modules = find_modules([module_dir1, module_dir2, module_dir3])
             self.assertEquals(set(modules), expected)
 
+    def test_register_tasks(self):
+        taskflow_header = {
+            'id': 'taskflow_id',
+            'girder_token': 'token',
+            'girder_api_url': 'http://localhost/api/v1',
+            '_type': 'cumulus.taskflow.TaskFlow'
+        }
+        current_task = mock.MagicMock()
+        current_task.request.headers = {
+            taskflow.TASKFLOW_HEADER: taskflow_header
+        }
+        requests = []
+
+        def _create_tasks(url, request):
+            tasks = json.loads(request.body)
+            requests.append(tasks)
+            content = [{'_id': 'task_%s' % t['celeryTaskId']} for t in tasks]
+
+            return httmock.response(201, json.dumps(content).encode('utf8'),
+                                    {'content-type': 'application/json'},
+                                    request=request)
+
+        create_tasks = httmock.urlmatch(
+            path=r'^/api/v1/taskflows/taskflow_id/tasks/bulk$',
+            method='POST')(_create_tasks)
+
+        with mock.patch.object(taskflow, 'register_batch_size', 2), \
+                mock.patch.object(taskflow, 'thread_local') as thread_local, \
+                httmock.HTTMock(create_tasks):
+            thread_local.current_task = current_task
+            signatures = taskflow.register_tasks(
+                [dummy_task.s() for i in range(3)])
+
+        # The tasks are registered in batches
+        self.assertEqual([len(r) for r in requests], [2, 1])
+        for (s, r) in zip(signatures, requests[0] + requests[1]):
+            self.assertEqual(r['celeryTaskId'], s.id)
+            self.assertEqual(r['name'], dummy_task.name)
+            headers = s.options['headers']
+            self.assertEqual(headers[taskflow.TASKFLOW_TASK_ID_HEADER],
+                             'task_%s' % s.id)
+            self.assertEqual(headers[taskflow.TASKFLOW_HEADER],
+                             taskflow_header)
+
+    def test_register_tasks_failure(self):
+        taskflow_header = {
+            'id': 'taskflow_id',
+            'girder_token': 'token',
+            'girder_api_url': 'http://localhost/api/v1',
+            '_type': 'cumulus.taskflow.TaskFlow'
+        }
+        current_task = mock.MagicMock()
+        current_task.request.headers = {
+            taskflow.TASKFLOW_HEADER: taskflow_header
+        }
+        requests = []
+        finished = []
+        updated = {}
+
+        def _create_tasks(url, request):
+            tasks = json.loads(request.body)
+            requests.append(tasks)
+            # Fail the second batch
+            if len(requests) > 1:
+                return httmock.response(500, b'{"message": "error"}',
+                                        {'content-type': 'application/json'},
+                                        request=request)
+
+            content = [{'_id': 'task_%s' % t['celeryTaskId']} for t in tasks]
+
+            return httmock.response(201, json.dumps(content).encode('utf8'),
+                                    {'content-type': 'application/json'},
+                                    request=request)
+
+        def _task_finished(url, request):
+            finished.append(url.path.split('/')[-2])
+            content = {'activeTaskCount': 0}
+
+            return httmock.response(200, json.dumps(content).encode('utf8'),
+                                    {'content-type': 'application/json'},
+                                    request=request)
+
+        def _update_task(url, request):
+            updated[url.path.split('/')[-1]] = json.loads(request.body)
+
+            return httmock.response(200, b'{}',
+                                    {'content-type': 'application/json'},
+                                    request=request)
+
+        create_tasks = httmock.urlmatch(
+            path=r'^/api/v1/taskflows/taskflow_id/tasks/bulk$',
+            method='POST')(_create_tasks)
+        task_finished = httmock.urlmatch(
+            path=r'^/api/v1/taskflows/taskflow_id/tasks/[^/]+/finished$',
+            method='PUT')(_task_finished)
+        update_task = httmock.urlmatch(
+            path=r'^/api/v1/tasks/[^/]+$', method='PATCH')(_update_task)
+
+        signatures = [dummy_task.s() for i in range(3)]
+        with mock.patch.object(taskflow, 'register_batch_size', 2), \
+                mock.patch.object(taskflow, 'thread_local') as thread_local, \
+                httmock.HTTMock(create_tasks, task_finished, update_task):
+            thread_local.current_task = current_task
+            with self.assertRaises(Exception):
+                taskflow.register_tasks(signatures)
+
+        # The tasks from the first batch should be finished with an error
+        self.assertEqual(len(requests), 2)
+        expected = ['task_%s' % t['celeryTaskId'] for t in requests[0]]
+        self.assertEqual(finished, expected)
+        self.assertEqual(updated, {
+            task_id: {'status': taskflow.TaskState.ERROR}
+            for task_id in expected
+        })
+
+    def test_compact_header(self):
+        definition = {
+            'id': 'taskflow_id',
+            'girder_api_url': 'http://localhost/api/v1',
+            '_type': 'cumulus.taskflow.TaskFlow',
+            'meta': {
+                'large': 'value'
+            }
+        }
+        definitions = {}
+        fetched = []
+
+        def _set_definition(url, request):
+            version = url.path.split('/')[-1]
+            definitions[version] = json.loads(request.body)
+
+            return httmock.response(200, b'null',
+                                    {'content-type': 'application/json'},
+                                    request=request)
+
+        def _get_definition(url, request):
+            version = url.path.split('/')[-1]
+            fetched.append(version)
+            content = json.dumps(definitions[version]).encode('utf8')
+
+            return httmock.response(200, content,
+                                    {'content-type': 'application/json'},
+                                    request=request)
+
+        path = r'^/api/v1/taskflows/taskflow_id/definitions/[0-9a-f]+$'
+        set_definition = httmock.urlmatch(path=path, method='PUT')(
+            _set_definition)
+        get_definition = httmock.urlmatch(path=path, method='GET')(
+            _get_definition)
+
+        flow = taskflow.TaskFlow(girder_token='token', **definition)
+        signature = mock.MagicMock()
+        config = {
+            'taskFlowHeaders': {
+                'compact': True
+            }
+        }
+        with mock.patch.dict(cumulus.config, config), \
+                mock.patch.dict(taskflow._definitions, clear=True), \
+                httmock.HTTMock(set_definition):
+            flow.run_task(signature)
+            flow.run_task(signature)
+
+        # The definition is only stored once, without the token
+        self.assertEqual(list(definitions.values()), [definition])
+        header = signature.apply_async.call_args[1]['headers'][
+            taskflow.TASKFLOW_HEADER]
+        version = header[taskflow.TASKFLOW_DEFINITION_VERSION]
+        self.assertEqual(header, {
+            'id': 'taskflow_id',
+            'girder_token': 'token',
+            'girder_api_url': 'http://localhost/api/v1',
+            taskflow.TASKFLOW_DEFINITION_VERSION: version
+        })
+
+        # Now expand the header on a worker, the definition should only be
+        # fetched the first time.
+        with mock.patch.dict(taskflow._definitions, clear=True), \
+                httmock.HTTMock(get_definition):
+            flow = taskflow.to_taskflow(header)
+            flow['meta']['large'] = 'modified'
+            self.assertEqual(fetched, [version])
+            flow = taskflow.to_taskflow(header)
+            self.assertEqual(fetched, [version])
+
+        self.assertIsInstance(flow, taskflow.TaskFlow)
+        self.assertEqual(flow.girder_token, 'token')
+        self.assertEqual(flow['meta'], {'large': 'value'})
+
+    def test_cached_status(self):
+        flow = taskflow.TaskFlow(id='taskflow_id', girder_token='token',
+                                 girder_api_url='http://localhost/api/v1')
+        config = {
+            'taskFlowStatusCache': {
+                'ttl': 60
+            }
+        }
+        with mock.patch.dict(cumulus.config, config), \
+                mock.patch.dict(taskflow._statuses, clear=True), \
+                mock.patch.object(taskflow.TaskFlow, 'status') as status:
+            status.return_value = taskflow.TaskFlowState.RUNNING
+
+            self.assertEqual(taskflow._cached_status(flow),
+                             taskflow.TaskFlowState.RUNNING)
+            self.assertEqual(taskflow._cached_status(flow),
+                             taskflow.TaskFlowState.RUNNING)
+            self.assertEqual(status.call_count, 1)
+
+            # A broadcast status change should update the cache
+            taskflow.taskflow_status(None, taskflow_id='taskflow_id',
+                                     status=taskflow.TaskFlowState.TERMINATING)
+            self.assertEqual(taskflow._cached_status(flow),
+                             taskflow.TaskFlowState.TERMINATING)
+            self.assertEqual(status.call_count, 1)
+
+            # Now check the status is fetched once it has expired
+            config['taskFlowStatusCache']['ttl'] = 0
+            with mock.patch.dict(cumulus.config, config):
+                self.assertEqual(taskflow._cached_status(flow),
+                                 taskflow.TaskFlowState.RUNNING)
+            self.assertEqual(status.call_count, 2)
+
+    def test_cache_status_size(self):
+        config = {
+            'taskFlowStatusCache': {
+                'ttl': 60
+            }
+        }
+        running = taskflow.TaskFlowState.RUNNING
+        with mock.patch.dict(cumulus.config, config), \
+                mock.patch.object(taskflow, '_max_statuses', 2), \
+                mock.patch.dict(taskflow._statuses, clear=True):
+            taskflow._cache_status('expired', running, now=100)
+            taskflow._cache_status('live', running, now=200)
+
+            # The expired entry should be dropped to make space
+            taskflow._cache_status('new', running, now=200)
+            self.assertEqual(set(taskflow._statuses), set(['live', 'new']))
+
+            # If every entry is live the cache is cleared
+            taskflow._cache_status('another', running, now=200)
+            self.assertEqual(set(taskflow._statuses), set(['another']))
+
+    def test_dag(self):
+        flow = taskflow.TaskFlow(id='taskflow_id', girder_token='token',
+                                 girder_api_url='http://localhost/api/v1')
+        flow.add_node('job_a', dummy_task.s())
+        flow.add_node('stage_b', dummy_task.s())
+        flow.add_node('job_b', dummy_task.s(), depends_on=['stage_b'])
+        flow.add_node('report', dummy_task.s(),
+                      depends_on=['job_a', 'job_b'])
+
+        with self.assertRaises(Exception):
+            flow.add_node('job_a', dummy_task.s())
+
+        # Only the nodes without dependencies should be run to start with
+        with mock.patch.object(Signature, 'apply_async') as apply_async:
+            flow.run_dag()
+
+        nodes = [c[1]['headers'][taskflow.TASKFLOW_DAG_NODE_HEADER]
+                 for c in apply_async.call_args_list]
+        self.assertEqual(nodes, ['job_a', 'stage_b'])
+
+        completed = []
+
+        def _complete_node(url, request):
+            node = url.path.split('/')[-2]
+            content = {
+                'completedNodes': list(completed)
+            }
+            completed.append(node)
+
+            return httmock.response(200, json.dumps(content).encode('utf8'),
+                                    {'content-type': 'application/json'},
+                                    request=request)
+
+        complete_node = httmock.urlmatch(
+            path=r'^/api/v1/taskflows/taskflow_id/dag/[\w.-]+/complete$',
+            method='PUT')(_complete_node)
 
+        with httmock.HTTMock(complete_node):
+            self.assertEqual(flow._dag_node_complete('stage_b'), ['job_b'])
+            self.assertEqual(flow._dag_node_complete('job_b'), [])
+            self.assertEqual(flow._dag_node_complete('job_a'), ['report'])
+            # Completing a node again shouldn't release anything
+            self.assertEqual(flow._dag_node_complete('job_a'), [])
 
+    def test_dag_invalid(self):
+        flow = taskflow.TaskFlow(id='taskflow_id', girder_token='token',
+                                 girder_api_url='http://localhost/api/v1')
+        flow.add_node('a', dummy_task.s(), depends_on=['missing'])
+        with self.assertRaises(Exception):
+            flow.run_dag()
 
+        flow = taskflow.TaskFlow(id='taskflow_id', girder_token='token',
+                                 girder_api_url='http://localhost/api/v1')
+        flow.add_node('a', dummy_task.s(), depends_on=['c'])
+        flow.add_node('b', dummy_task.s(), depends_on=['a'])
+        flow.add_node('c', dummy_task.s(), depends_on=['b'])
+        flow.add_node('d', dummy_task.s())
+        with self.assertRaises(Exception):
+            flow.run_dag()
 
+        with self.assertRaises(Exception):
+            flow.add_node('invalid/name', dummy_task.s())
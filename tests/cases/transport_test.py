@@ -20,14 +20,38 @@
 import unittest
 import mock
 import httmock
+import io
 import os
 import json
+import stat
 from jsonpath_rw import parse
 
 import cumulus
 from cumulus.ssh.tasks import key
 from cumulus.transport import get_connection
-from cumulus.transport.ssh import SshClusterConnection
+from cumulus.transport.abstract import walk_command, parse_walk_record
+from cumulus.transport.newt import NewtClusterConnection
+from cumulus.transport.ssh import SshClusterConnection, connection_pool, \
+    SshCommandException
+
+# The output of the walk command for a small tree
+walk_output = b'd 755 4096 1000 100 1463745212.1234567890 dir\0' \
+    b'f 644 4 1000 100 1463745213.0000000000 dir/test 2.txt\0' \
+    b'f 600 10 1000 100 1463745214.5000000000 test.txt\0'
+
+
+class ChunkedReader(object):
+    """
+    File like object returning data a few bytes at a time, so records are
+    split across reads.
+    """
+    def __init__(self, data, size=7):
+        self._fp = io.BytesIO(data)
+        self._size = size
+
+    def read(self, size=-1):
+        return self._fp.read(self._size)
+
 
 class TransportTestCase(unittest.TestCase):
     def setUp(self):
@@ -37,6 +61,7 @@ class TransportTestCase(unittest.TestCase):
             fp.write('bogus')
 
     def tearDown(self):
+        connection_pool().clear()
         try:
             os.remove(self._key_path)
         except OSError:
@@ -62,3 +87,175 @@ class TransportTestCase(unittest.TestCase):
             self.assertTrue(isinstance(ssh, SshClusterConnection))
 
 
+
+    @mock.patch('cumulus.transport.ssh.paramiko.RSAKey.from_private_key_file')
+    @mock.patch('cumulus.transport.ssh.SSHClient')
+    def test_ssh_connection_pooled(self, ssh_client, from_private_key_file):
+        cluster = {
+            '_id': self._cluster_id,
+            'config': {
+                'ssh': {
+                    'user': 'bob',
+                    'key': self._cluster_id,
+                    'passphrase': 'test'
+                },
+                'host': 'localhost'
+            },
+            'type': 'trad'
+        }
+        ssh_client.side_effect = lambda: mock.MagicMock()
+
+        with get_connection('girder_token', cluster) as ssh:
+            client = ssh._client
+
+        # The second connection should reuse the warm client
+        with get_connection('girder_token', cluster) as ssh:
+            self.assertEqual(ssh._client, client)
+
+        self.assertEqual(ssh_client.call_count, 1)
+        self.assertEqual(from_private_key_file.call_count, 1)
+
+        # A dead transport should result in a new connection
+        client.get_transport.return_value.is_active.return_value = False
+        with get_connection('girder_token', cluster) as ssh:
+            pass
+
+        self.assertEqual(ssh_client.call_count, 2)
+        client.close.assert_called_once_with()
+
+        # A connection error should result in the client being discarded
+        with self.assertRaises(EOFError):
+            with get_connection('girder_token', cluster) as ssh:
+                raise EOFError()
+
+        self.assertEqual(len(connection_pool()), 0)
+
+    @mock.patch('cumulus.transport.ssh.paramiko.RSAKey.from_private_key_file')
+    @mock.patch('cumulus.transport.ssh.SSHClient')
+    def test_ssh_connection_shared_sftp(self, ssh_client,
+                                        from_private_key_file):
+        cluster = {
+            '_id': self._cluster_id,
+            'config': {
+                'ssh': {
+                    'user': 'bob',
+                    'key': self._cluster_id,
+                    'passphrase': 'test'
+                },
+                'host': 'localhost'
+            },
+            'type': 'trad'
+        }
+        transport = ssh_client.return_value.get_transport.return_value
+        sftp = transport.open_sftp_client.return_value
+        sftp.get_channel.return_value.closed = False
+
+        with get_connection('girder_token', cluster) as ssh:
+            ssh.mkdir('/tmp/a')
+            ssh.stat('/tmp/a')
+            ssh.remove('/tmp/a/b')
+            list(ssh.list('/tmp/a'))
+
+            # Only one SFTP channel should have been opened
+            self.assertEqual(transport.open_sftp_client.call_count, 1)
+
+            # A channel error should cause the channel to be reopened
+            sftp.stat.side_effect = EOFError()
+            with self.assertRaises(EOFError):
+                ssh.stat('/tmp/a')
+            sftp.stat.side_effect = None
+            ssh.stat('/tmp/a')
+
+            self.assertEqual(transport.open_sftp_client.call_count, 2)
+
+    def _check_walk(self, paths):
+        paths = {p['path']: p for p in paths}
+        self.assertEqual(sorted(paths.keys()),
+                         ['dir', 'dir/test 2.txt', 'test.txt'])
+        self.assertTrue(stat.S_ISDIR(paths['dir']['mode']))
+        self.assertTrue(stat.S_ISREG(paths['test.txt']['mode']))
+        self.assertEqual(paths['dir/test 2.txt']['name'], 'test 2.txt')
+        self.assertEqual(paths['dir/test 2.txt']['size'], 4)
+
+    def test_parse_walk_record(self):
+        record = 'f 644 4 1000 100 1463745213.5 dir/test 2.txt'
+        expected = {
+            'name': 'test 2.txt',
+            'path': 'dir/test 2.txt',
+            'user': 1000,
+            'group': 100,
+            'mode': stat.S_IFREG | 0o644,
+            'date': 1463745213,
+            'size': 4
+        }
+        self.assertEqual(parse_walk_record(record), expected)
+
+        record = 'd 755 4096 0 0 1463745213.5 a dir'
+        self.assertEqual(parse_walk_record(record)['mode'],
+                         stat.S_IFDIR | 0o755)
+
+    @mock.patch('cumulus.transport.ssh.paramiko.RSAKey.from_private_key_file')
+    @mock.patch('cumulus.transport.ssh.SSHClient')
+    def test_ssh_walk(self, ssh_client, from_private_key_file):
+        cluster = {
+            '_id': self._cluster_id,
+            'config': {
+                'ssh': {
+                    'user': 'bob',
+                    'key': self._cluster_id,
+                    'passphrase': 'test'
+                },
+                'host': 'localhost'
+            },
+            'type': 'trad'
+        }
+        transport = ssh_client.return_value.get_transport.return_value
+        chan = transport.open_session.return_value
+        chan.makefile.return_value = ChunkedReader(walk_output)
+        chan.recv_exit_status.return_value = 0
+
+        with get_connection('girder_token', cluster) as ssh:
+            self._check_walk(ssh.walk('/home/bob/test dir'))
+
+        chan.exec_command.assert_called_once_with(
+            walk_command('/home/bob/test dir'))
+        chan.close.assert_called_once_with()
+
+        # A failing find should raise an exception
+        chan.reset_mock()
+        chan.makefile.return_value = ChunkedReader(b'')
+        chan.recv_exit_status.return_value = 1
+        chan.makefile_stderr.return_value = io.StringIO(u'No such file\n')
+
+        with get_connection('girder_token', cluster) as ssh:
+            with self.assertRaises(SshCommandException):
+                list(ssh.walk('/home/bob/missing'))
+
+        chan.close.assert_called_once_with()
+
+    def test_newt_walk(self):
+        cluster = {
+            '_id': self._cluster_id,
+            'config': {
+                'host': 'cori'
+            },
+            'type': 'newt'
+        }
+        conn = NewtClusterConnection('girder_token', cluster)
+        conn._session = mock.MagicMock()
+        r = conn._session.post.return_value
+        r.status_code = 200
+        r.json.return_value = {
+            'error': None,
+            'output': walk_output.decode('utf8')
+        }
+
+        self._check_walk(conn.walk('/home/bob/test'))
+
+        # The tree should be fetched using a single command
+        self.assertEqual(conn._session.post.call_count, 1)
+        (url, ), kwargs = conn._session.post.call_args
+        self.assertTrue(url.endswith('/command/cori'))
+        self.assertEqual(kwargs['data']['executable'],
+                         walk_command('/home/bob/test', find='/usr/bin/find'))
+        self.assertFalse(kwargs['data']['loginenv'])